@@ -0,0 +1,66 @@
+// Tangled Tower - Precomputed Hitboxes
+// Physics bodies and pixel masks from assets/sprites/hitboxes.json (scripts/hitboxes.py)
+var TangledTower = TangledTower || {};
+
+TangledTower.Hitboxes = {
+  // Sidecar for a texture key, or null (procedural textures have none)
+  get: function(scene, key) {
+    var all = scene.cache.json.get('hitboxes');
+    var data = all && all[key];
+    return data && data.bbox ? data : null;
+  },
+
+  // Size a sprite's body from its sidecar. box: 'hitbox' (fair, default) or 'bbox' (tight).
+  // fw and fh scale its width and height (fh defaults to fw): below 1 keeps hazards
+  // forgiving, above 1 keeps pickups generous. The scaled box stays centered, or with
+  // bottom set keeps its bottom edge (the feet) in place.
+  // Returns false when there is no usable sidecar, so callers can fall back.
+  apply: function(sprite, box, fw, fh, bottom) {
+    var data = this.get(sprite.scene, sprite.texture.key);
+    // A sidecar for a different-sized image is stale
+    if (!data || data.width !== sprite.width || data.height !== sprite.height) return false;
+    var b = data[box || 'hitbox'];
+    fw = fw || 1;
+    fh = fh || fw;
+    var w = b[2] * fw;
+    var h = b[3] * fh;
+    sprite.body.setSize(w, h, false);
+    sprite.body.setOffset(b[0] + (b[2] - w) / 2, bottom ? b[1] + b[3] - h : b[1] + (b[3] - h) / 2);
+    return true;
+  },
+
+  // Is the texture pixel under world point (wx, wy) solid? True without mask data.
+  _solidAt: function(sprite, data, wx, wy) {
+    if (!data) return true;
+    if (!data._bits) {
+      var raw = atob(data.mask.bits);
+      data._bits = new Uint8Array(raw.length);
+      for (var i = 0; i < raw.length; i++) data._bits[i] = raw.charCodeAt(i);
+    }
+    var tx = (wx - sprite.x) / sprite.scaleX + sprite.displayOriginX;
+    var ty = (wy - sprite.y) / sprite.scaleY + sprite.displayOriginY;
+    if (sprite.flipX) tx = sprite.width - tx;
+    var mx = Math.floor(tx) - data.bbox[0];
+    var my = Math.floor(ty) - data.bbox[1];
+    if (mx < 0 || my < 0 || mx >= data.bbox[2] || my >= data.bbox[3]) return false;
+    return (data._bits[my * data.mask.stride + (mx >> 3)] & (0x80 >> (mx & 7))) !== 0;
+  },
+
+  // Overlap process callback: do the solid pixels of two sprites touch inside
+  // their overlapping bodies? Walks the overlap at screen-pixel resolution.
+  masksOverlap: function(a, b) {
+    var da = this.get(a.scene, a.texture.key);
+    var db = this.get(b.scene, b.texture.key);
+    if (!da && !db) return true;
+    var left = Math.max(a.body.left, b.body.left);
+    var right = Math.min(a.body.right, b.body.right);
+    var top = Math.max(a.body.top, b.body.top);
+    var bottom = Math.min(a.body.bottom, b.body.bottom);
+    for (var y = Math.floor(top) + 0.5; y < bottom; y++) {
+      for (var x = Math.floor(left) + 0.5; x < right; x++) {
+        if (this._solidAt(a, da, x, y) && this._solidAt(b, db, x, y)) return true;
+      }
+    }
+    return false;
+  }
+};
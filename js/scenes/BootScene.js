@@ -1,5 +1,5 @@
 // Tangled Tower - Boot Scene
-// Loads AI sprites, generates procedural textures, creates animations
+// Loads the AI sprite atlas and hitboxes, generates procedural textures, creates animations
 var TangledTower = TangledTower || {};
 
 TangledTower.BootScene = new Phaser.Class({
@@ -9,6 +9,10 @@ TangledTower.BootScene = new Phaser.Class({
     Phaser.Scene.call(this, { key: 'BootScene' });
   },
 
+  // Aliases the pipeline always writes (hero_run is identical to hero_run1 and
+  // has no PNG of its own), used when the asset manifest is missing
+  DEFAULT_ALIASES: { hero_run: 'hero_run1' },
+
   preload: function() {
     var w = TangledTower.GAME_WIDTH;
     var h = TangledTower.GAME_HEIGHT;
@@ -22,7 +26,7 @@ TangledTower.BootScene = new Phaser.Class({
       fontFamily: 'monospace', fontSize: '8px', color: '#FFFFFF'
     }).setOrigin(0.5);
 
-    // Load AI-generated sprites
+    // AI-generated sprites
     var sprites = [
       'hero_run', 'hero_run1', 'hero_run2',
       'hero_jump', 'hero_crouch', 'hero_hurt',
@@ -33,12 +37,48 @@ TangledTower.BootScene = new Phaser.Class({
       'bg_tree', 'bg_bush', 'bg_rock', 'butterfly', 'firefly'
     ];
 
-    for (var i = 0; i < sprites.length; i++) {
-      this.load.image(sprites[i], 'assets/sprites/' + sprites[i] + '.png');
-    }
+    // All of them come packed in one multiatlas (scripts/pack_atlas.py): its
+    // JSON plus one PNG per sheet. create() registers each frame under its
+    // sprite's key, so the scenes use the same keys as with loose PNGs.
+    this.load.multiatlas('sprites', 'assets/atlas/sprites.json', 'assets/atlas');
+    this.load.on('loaderror', function(file) {
+      // No atlas packed yet: load the loose PNGs instead
+      if (file.key === 'sprites') this._loadLooseSprites(sprites);
+    }, this);
+
+    // Every sprite's collision boxes and masks, aliases included (see TangledTower.Hitboxes)
+    this.load.json('hitboxes', 'assets/sprites/hitboxes.json');
+  },
+
+  _loadLooseSprites: function(sprites) {
+    // The asset manifest (scripts/asset_manifest.py) lists sprites identical to
+    // another one; those aren't downloaded but aliased in create(). Sprites are
+    // queued once it has loaded, or with DEFAULT_ALIASES if it is missing.
+    var queued = false;
+    var queueSprites = function(aliases) {
+      if (queued) return;
+      queued = true;
+      for (var i = 0; i < sprites.length; i++) {
+        if (aliases[sprites[i]]) continue;
+        this.load.image(sprites[i], 'assets/sprites/' + sprites[i] + '.png');
+      }
+    };
+    this.load.once('filecomplete-json-asset-manifest', function(key, type, data) {
+      queueSprites.call(this, (data && data.aliases) || {});
+    }, this);
+    this.load.on('loaderror', function(file) {
+      if (file.key === 'asset-manifest') queueSprites.call(this, this.DEFAULT_ALIASES);
+    }, this);
+    this.load.json('asset-manifest', 'assets/asset_manifest.json');
   },
 
   create: function() {
+    // Give every atlas frame its sprite's texture key
+    this._registerAtlasFrames();
+
+    // Loose PNGs: register aliased sprites under their own keys (same texture)
+    this._createAliases();
+
     // Generate procedural textures (ground, backgrounds, small items)
     TangledTower.SpriteGen.createAllTextures(this);
 
@@ -52,6 +92,39 @@ TangledTower.BootScene = new Phaser.Class({
     this.scene.start('TitleScene');
   },
 
+  _registerAtlasFrames: function() {
+    if (!this.textures.exists('sprites')) return;
+    var atlas = this.textures.get('sprites');
+    var names = atlas.getFrameNames();
+    for (var i = 0; i < names.length; i++) {
+      var frame = atlas.get(names[i]);
+      var source = frame.source;
+      // The new texture shares the sheet: WebGL reuses its uploaded texture
+      // rather than uploading the sheet again, canvas draws from its image
+      var tex = source.glTexture
+        ? this.textures.addGLTexture(names[i], source.glTexture, source.width, source.height)
+        : this.textures.create(names[i], source.image, source.width, source.height);
+      if (!tex) continue;
+      // Its default frame is the sprite's rect, untrimmed back to the original size
+      var copy = tex.add(names[i], 0, frame.cutX, frame.cutY, frame.cutWidth, frame.cutHeight);
+      if (frame.trimmed) {
+        copy.setTrim(frame.realWidth, frame.realHeight, frame.x, frame.y,
+                     frame.cutWidth, frame.cutHeight);
+      }
+    }
+  },
+
+  _createAliases: function() {
+    var manifest = this.cache.json.get('asset-manifest');
+    var aliases = manifest ? manifest.aliases || {} : this.DEFAULT_ALIASES;
+    for (var alias in aliases) {
+      var target = aliases[alias];
+      if (!this.textures.exists(alias) && this.textures.exists(target)) {
+        this.textures.addImage(alias, this.textures.get(target).getSourceImage());
+      }
+    }
+  },
+
   _createAnimations: function() {
     // Hero run cycle - 2-frame classic NES style (stride vs legs-together)
     var runFrames = [];
@@ -62,13 +62,15 @@ TangledTower.BossScene = new Phaser.Class({
     this.hero = this.physics.add.sprite(TangledTower.HERO_X, TangledTower.GROUND_Y - 20, heroKey);
     this.hero.setScale(heroScale);
     this.hero.body.setGravityY(TangledTower.GRAVITY);
-    var heroW = this.hero.displayWidth * 0.5;
-    var heroH = this.hero.displayHeight * 0.85;
-    this.hero.body.setSize(heroW / heroScale, heroH / heroScale);
-    this.hero.body.setOffset(
-      (this.hero.width - heroW / heroScale) / 2,
-      this.hero.height - heroH / heroScale
-    );
+    if (!TangledTower.Hitboxes.apply(this.hero, 'bbox', 0.5, 0.85, true)) {
+      var heroW = this.hero.displayWidth * 0.5;
+      var heroH = this.hero.displayHeight * 0.85;
+      this.hero.body.setSize(heroW / heroScale, heroH / heroScale);
+      this.hero.body.setOffset(
+        (this.hero.width - heroW / heroScale) / 2,
+        this.hero.height - heroH / heroScale
+      );
+    }
     this.hero.setDepth(10);
     this.hero.play('hero-run');
 
@@ -67,9 +67,9 @@ TangledTower.GameScene = new Phaser.Class({
 
     // Collision
     this.physics.add.collider(this.hero, this.groundGroup);
-    this.physics.add.overlap(this.hero, this.vines, this._hitObstacle, null, this);
-    this.physics.add.overlap(this.hero, this.goblins, this._hitEnemy, null, this);
-    this.physics.add.overlap(this.hero, this.bats, this._hitEnemy, null, this);
+    this.physics.add.overlap(this.hero, this.vines, this._hitObstacle, this._pixelsTouch, this);
+    this.physics.add.overlap(this.hero, this.goblins, this._hitEnemy, this._pixelsTouch, this);
+    this.physics.add.overlap(this.hero, this.bats, this._hitEnemy, this._pixelsTouch, this);
     this.physics.add.overlap(this.hero, this.coins, this._collectCoin, null, this);
     this.physics.add.overlap(this.hero, this.powerups, this._collectPowerup, null, this);
 
@@ -469,14 +469,17 @@ TangledTower.GameScene = new Phaser.Class({
     this.hero = this.physics.add.sprite(TangledTower.HERO_X, TangledTower.GROUND_Y - 20, heroKey);
     this.hero.setScale(scale);
     this.hero.body.setGravityY(TangledTower.GRAVITY);
-    // Hitbox sized for the scaled sprite
-    var heroW = this.hero.displayWidth * 0.5;
-    var heroH = this.hero.displayHeight * 0.85;
-    this.hero.body.setSize(heroW / scale, heroH / scale);
-    this.hero.body.setOffset(
-      (this.hero.width - heroW / scale) / 2,
-      this.hero.height - heroH / scale
-    );
+    // Forgiving hitbox: half the width and 85% of the height of the opaque pixels
+    // (from the sprite's sidecar, else of the scaled sprite), feet on the ground
+    if (!TangledTower.Hitboxes.apply(this.hero, 'bbox', 0.5, 0.85, true)) {
+      var heroW = this.hero.displayWidth * 0.5;
+      var heroH = this.hero.displayHeight * 0.85;
+      this.hero.body.setSize(heroW / scale, heroH / scale);
+      this.hero.body.setOffset(
+        (this.hero.width - heroW / scale) / 2,
+        this.hero.height - heroH / scale
+      );
+    }
     this.hero.setDepth(10);
 
     this.hero.play('hero-run');
@@ -564,12 +567,14 @@ TangledTower.GameScene = new Phaser.Class({
       if (isAI) {
         var coinScale = 0.31;
         coin.setScale(coinScale);
-        var coinSize = coin.displayWidth * 2.0;
-        coin.body.setSize(coinSize / coinScale, coinSize / coinScale);
-        coin.body.setOffset(
-          (coin.width - coinSize / coinScale) / 2,
-          (coin.height - coinSize / coinScale) / 2
-        );
+        if (!TangledTower.Hitboxes.apply(coin, 'bbox', 2.0)) {
+          var coinSize = coin.displayWidth * 2.0;
+          coin.body.setSize(coinSize / coinScale, coinSize / coinScale);
+          coin.body.setOffset(
+            (coin.width - coinSize / coinScale) / 2,
+            (coin.height - coinSize / coinScale) / 2
+          );
+        }
       } else {
         coin.body.setSize(10, 10);
       }
@@ -608,13 +613,15 @@ TangledTower.GameScene = new Phaser.Class({
         // Scale AI vine differently per size
         var sizeScales = [scale * 1.2, scale * 1.5, scale * 1.8];
         vine.setScale(sizeScales[size] || scale);
-        var vineW = vine.displayWidth * 0.25;
-        var vineH = vine.displayHeight * 0.5;
-        vine.body.setSize(vineW / vine.scaleX, vineH / vine.scaleY);
-        vine.body.setOffset(
-          (vine.width - vineW / vine.scaleX) / 2,
-          vine.height - vineH / vine.scaleY
-        );
+        if (!TangledTower.Hitboxes.apply(vine, 'bbox', 0.25, 0.5, true)) {
+          var vineW = vine.displayWidth * 0.25;
+          var vineH = vine.displayHeight * 0.5;
+          vine.body.setSize(vineW / vine.scaleX, vineH / vine.scaleY);
+          vine.body.setOffset(
+            (vine.width - vineW / vine.scaleX) / 2,
+            vine.height - vineH / vine.scaleY
+          );
+        }
         vine.y = groundY - vine.displayHeight / 2;
       } else {
         vine.body.setSize(6, h);
@@ -633,13 +640,15 @@ TangledTower.GameScene = new Phaser.Class({
       goblin._alive = true;
       if (isAI) {
         goblin.setScale(scale);
-        var gobW = goblin.displayWidth * 0.5;
-        var gobH = goblin.displayHeight * 0.85;
-        goblin.body.setSize(gobW / scale, gobH / scale);
-        goblin.body.setOffset(
-          (goblin.width - gobW / scale) / 2,
-          goblin.height - gobH / scale
-        );
+        if (!TangledTower.Hitboxes.apply(goblin, 'bbox', 0.5, 0.85, true)) {
+          var gobW = goblin.displayWidth * 0.5;
+          var gobH = goblin.displayHeight * 0.85;
+          goblin.body.setSize(gobW / scale, gobH / scale);
+          goblin.body.setOffset(
+            (goblin.width - gobW / scale) / 2,
+            goblin.height - gobH / scale
+          );
+        }
         goblin.y = TangledTower.GROUND_Y - goblin.displayHeight / 2;
       } else {
         goblin.body.setSize(10, 12);
@@ -663,13 +672,15 @@ TangledTower.GameScene = new Phaser.Class({
       bat._alive = true;
       if (isAI) {
         bat.setScale(scale);
-        var batW = bat.displayWidth * 0.6;
-        var batH = bat.displayHeight * 0.5;
-        bat.body.setSize(batW / scale, batH / scale);
-        bat.body.setOffset(
-          (bat.width - batW / scale) / 2,
-          (bat.height - batH / scale) / 2
-        );
+        if (!TangledTower.Hitboxes.apply(bat, 'bbox', 0.6, 0.5)) {
+          var batW = bat.displayWidth * 0.6;
+          var batH = bat.displayHeight * 0.5;
+          bat.body.setSize(batW / scale, batH / scale);
+          bat.body.setOffset(
+            (bat.width - batW / scale) / 2,
+            (bat.height - batH / scale) / 2
+          );
+        }
       } else {
         bat.body.setSize(14, 8);
       }
@@ -705,12 +716,14 @@ TangledTower.GameScene = new Phaser.Class({
       pu._puType = type;
       if (isAI) {
         pu.setScale(scale);
-        var puSize = pu.displayWidth * 2.0;
-        pu.body.setSize(puSize / scale, puSize / scale);
-        pu.body.setOffset(
-          (pu.width - puSize / scale) / 2,
-          (pu.height - puSize / scale) / 2
-        );
+        if (!TangledTower.Hitboxes.apply(pu, 'bbox', 2.0)) {
+          var puSize = pu.displayWidth * 2.0;
+          pu.body.setSize(puSize / scale, puSize / scale);
+          pu.body.setOffset(
+            (pu.width - puSize / scale) / 2,
+            (pu.height - puSize / scale) / 2
+          );
+        }
       } else {
         pu.body.setSize(10, 10);
         if (type === 'shield' && spriteKey) pu.play('shield-glow');
@@ -746,6 +759,11 @@ TangledTower.GameScene = new Phaser.Class({
 
   // --- Collision Handlers ---
 
+  // Bodies overlap; only count hits where solid pixels actually touch
+  _pixelsTouch: function(hero, obj) {
+    return TangledTower.Hitboxes.masksOverlap(hero, obj);
+  },
+
   _hitObstacle: function(hero, obstacle) {
     if (!obstacle.active) return;
     this._takeDamage();
@@ -26,7 +26,7 @@ TangledTower.UIScene = new Phaser.Class({
       var heart;
       if (heartKey) {
         var heartTex = this.textures.get('heart');
-        var isAIHeart = heartTex.source[0].width > 32;
+        var isAIHeart = heartTex.get().realWidth > 32;
         var heartScale = isAIHeart ? 0.33 : 1.2;
         heart = this.add.sprite(12 + i * 13, 12, 'heart').setScale(heartScale);
       } else {
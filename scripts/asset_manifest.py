@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Asset manifest read by the game at boot
+
+assets/asset_manifest.json tells BootScene which sprites not to download:
+    {"version": 1, "aliases": {"hero_run": "hero_run1"}}
+An alias is a sprite whose PNG and hitbox would be identical to another
+sprite's; the game registers the other sprite's texture and hitbox under
+the alias's key instead of fetching a copy. pack_atlas.py packs an
+aliased sprite once and lists its frame under both names.
+
+regenerate_sprites.py writes the manifest after every build (hero_run is
+always an alias of hero_run1; other outputs are aliased when their pixels
+turn out identical, see phash_index.py).
+
+Usage:
+    python scripts/asset_manifest.py    # show the aliases
+"""
+
+import json
+from pathlib import Path
+
+ASSET_MANIFEST_PATH = Path(__file__).parent.parent / "assets" / "asset_manifest.json"
+ASSET_MANIFEST_VERSION = 1
+
+
+def read_aliases(path=ASSET_MANIFEST_PATH):
+    """{alias: sprite} from the asset manifest ({} if there is none)."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    data = json.loads(path.read_text())
+    if data.get("version") != ASSET_MANIFEST_VERSION:
+        return {}
+    return data.get("aliases", {})
+
+
+def write_aliases(aliases, path=ASSET_MANIFEST_PATH):
+    """Replace the manifest's aliases (written atomically)."""
+    path = Path(path)
+    data = {"version": ASSET_MANIFEST_VERSION, "aliases": dict(sorted(aliases.items()))}
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2) + "\n")
+    tmp.replace(path)
+
+
+def main():
+    aliases = read_aliases()
+    print(f"{len(aliases)} aliases in {ASSET_MANIFEST_PATH}")
+    for alias, sprite in aliases.items():
+        print(f"  {alias:16s} -> {sprite}")
+
+
+if __name__ == "__main__":
+    main()
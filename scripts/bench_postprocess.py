@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Benchmark the sprite post-processing stages
+
+Times remove_background (global and flood modes), crop_to_content,
+resize_to_height, the hero uniform-canvas pass and hero normalization (in
+memory with normalize_frames, and through disk with normalize_heroes) over a
+fixed corpus:
+- shipped:        the assets/sprites/*.png files flattened back onto their
+                  chroma color with a margin, so they key like small raws
+- synthetic-1024: 1024x1024 magenta and green chroma raws
+- synthetic-2048: 2048x2048 magenta and green chroma raws
+
+Reports per-stage wall time (best of --repeat runs), pixels per second and
+peak memory, and can save the results as a JSON baseline or compare against
+one. Peak memory comes from tracemalloc, which sees NumPy buffers but not
+Pillow's internal image allocations, so pure-PIL stages read near zero.
+
+Usage:
+    python scripts/bench_postprocess.py
+    python scripts/bench_postprocess.py --save bench_baseline.json
+    python scripts/bench_postprocess.py --compare bench_baseline.json --threshold 0.15
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import PIL
+from PIL import Image
+
+from chroma_key import remove_background, synthetic_raw
+from normalize_hero import normalize_heroes
+from sprite_ops import crop_to_content, normalize_frames, resize_to_height, uniform_canvas
+
+SPRITE_DIR = Path(__file__).parent.parent / "assets" / "sprites"
+GREEN_CHROMA = {"powerup_sword", "heart"}  # plus every hero_* frame
+MAGENTA = (255, 0, 255)
+GREEN = (0, 255, 0)
+SYNTHETIC_TARGET = 300
+
+
+# ============================================================
+# CORPUS
+# ============================================================
+
+def flatten_on_chroma(img, chroma, margin=16):
+    """Composite a keyed sprite onto a solid chroma background, like an Imagen raw."""
+    w, h = img.size
+    raw = Image.new("RGB", (w + 2 * margin, h + 2 * margin), chroma)
+    raw.paste(img, (margin, margin), img)
+    return raw
+
+
+def load_corpus():
+    """Return {group: [(name, raw_image, target_height)]}."""
+    shipped = []
+    for path in sorted(SPRITE_DIR.glob("*.png")):
+        name = path.stem
+        img = Image.open(path).convert("RGBA")
+        chroma = GREEN if name.startswith("hero_") or name in GREEN_CHROMA else MAGENTA
+        shipped.append((name, flatten_on_chroma(img, chroma), img.size[1]))
+
+    corpus = {"shipped": shipped}
+    for size in (1024, 2048):
+        corpus[f"synthetic-{size}"] = [
+            (f"magenta-{size}", synthetic_raw(size, MAGENTA, seed=size), SYNTHETIC_TARGET),
+            (f"green-{size}", synthetic_raw(size, GREEN, seed=size + 1), SYNTHETIC_TARGET),
+        ]
+    return corpus
+
+
+# ============================================================
+# MEASUREMENT
+# ============================================================
+
+def best_time(fn, repeat):
+    """Best-of-`repeat` wall time of fn(), plus its last result."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def traced_peak(fn):
+    """Peak bytes allocated (as seen by tracemalloc) while running fn()."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class StageStats:
+    """Accumulated wall time, pixel count and peak memory for one stage."""
+
+    def __init__(self):
+        self.wall = 0.0
+        self.pixels = 0
+        self.peak = 0
+        self.items = 0
+
+    def add(self, wall, pixels, peak):
+        self.wall += wall
+        self.pixels += pixels
+        self.peak = max(self.peak, peak)
+        self.items += 1
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "wall_s": self.wall,
+            "pixels": self.pixels,
+            "px_per_s": self.pixels / self.wall if self.wall else 0.0,
+            "peak_bytes": self.peak,
+        }
+
+
+def measure(stats, stage, fn, pixels, repeat):
+    wall, result = best_time(fn, repeat)
+    stats.setdefault(stage, StageStats()).add(wall, pixels, traced_peak(fn))
+    return result
+
+
+def run(repeat):
+    corpus = load_corpus()
+    stats = {}
+    hero_frames = {}
+
+    for group, items in corpus.items():
+        for name, raw, target in items:
+            w, h = raw.size
+            keyed, _ = measure(stats, f"remove_background[{group}]",
+                               lambda: remove_background(raw), w * h, repeat)
+            measure(stats, f"remove_background_flood[{group}]",
+                    lambda: remove_background(raw, mode="flood"), w * h, repeat)
+            cropped = measure(stats, f"crop_to_content[{group}]",
+                              lambda: crop_to_content(keyed), w * h, repeat)
+            cw, ch = cropped.size
+            resized = measure(stats, f"resize_to_height[{group}]",
+                              lambda: resize_to_height(cropped, target), cw * ch, repeat)
+            if group == "shipped" and name.startswith("hero_"):
+                hero_frames[name] = resized
+
+    hero_px = sum(img.size[0] * img.size[1] for img in hero_frames.values())
+    measure(stats, "uniform_canvas[hero]", lambda: uniform_canvas(hero_frames), hero_px, repeat)
+    measure(stats, "normalize_frames[hero]", lambda: normalize_frames(hero_frames), hero_px, repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def normalize():
+            for path in SPRITE_DIR.glob("hero_*.png"):
+                shutil.copy2(path, tmp)
+            with contextlib.redirect_stdout(io.StringIO()):
+                normalize_heroes(tmp)
+
+        measure(stats, "normalize_heroes[hero]", normalize, hero_px, repeat)
+
+    return {stage: s.as_dict() for stage, s in stats.items()}
+
+
+# ============================================================
+# REPORTING
+# ============================================================
+
+def print_table(stages, baseline=None, threshold=0.10, min_ms=1.0):
+    """Print per-stage results, with deltas against `baseline` if given. Returns regressions."""
+    print(f"  {'stage':40s} {'items':>5s} {'Mpx':>8s} {'wall ms':>9s} {'Mpx/s':>8s} {'peak MB':>8s}"
+          + ("   vs base" if baseline else ""))
+    regressions = []
+    for stage, s in stages.items():
+        line = (f"  {stage:40s} {s['items']:5d} {s['pixels'] / 1e6:8.2f} {s['wall_s'] * 1000:9.1f} "
+                f"{s['px_per_s'] / 1e6:8.1f} {s['peak_bytes'] / 1024 / 1024:8.1f}")
+        base = (baseline or {}).get(stage)
+        if base and base["wall_s"]:
+            delta = s["wall_s"] / base["wall_s"] - 1
+            line += f"   {delta * 100:+7.1f}%"
+            slower_ms = (s["wall_s"] - base["wall_s"]) * 1000
+            # Sub-millisecond stages jitter by more than any sane threshold
+            if delta > threshold and slower_ms > min_ms:
+                line += "  REGRESSION"
+                regressions.append(stage)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sprite post-processing stages.")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is kept)")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown fraction that counts as a regression (default 0.10)")
+    parser.add_argument("--min-ms", type=float, default=1.0,
+                        help="ignore slowdowns smaller than this many ms (default 1.0)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("POST-PROCESSING BENCHMARK")
+    print("=" * 60)
+
+    stages = run(args.repeat)
+    baseline = json.loads(Path(args.compare).read_text())["stages"] if args.compare else None
+    regressions = print_table(stages, baseline, args.threshold, args.min_ms)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"\n  Process peak RSS: {max_rss / 1024:.0f} MB")
+
+    if args.save:
+        result = {
+            "meta": {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "pillow": PIL.__version__,
+                "machine": platform.machine(),
+                "repeat": args.repeat,
+                "max_rss_kb": max_rss,
+            },
+            "stages": stages,
+        }
+        Path(args.save).write_text(json.dumps(result, indent=2) + "\n")
+        print(f"  Saved baseline: {args.save}")
+
+    if regressions:
+        print(f"\n  {len(regressions)} stage(s) slower than baseline by more than "
+              f"{args.threshold * 100:.0f}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
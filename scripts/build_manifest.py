@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Incremental sprite build manifest
+
+Records, for every output PNG, the fingerprint of what produced it: the Imagen
+request key (model + prompt + chroma suffix + config), target height, a hash
+of the post-processing code, and the SHA-256 of the raw pixels it was keyed
+from. A later run compares each sprite's current fingerprint with the stored
+one and only rebuilds the entries that differ or whose output is missing.
+Tools that rewrite an output some other way (watch_sprites.py) invalidate
+its entry, so the next run rebuilds it.
+
+Usage:
+    python scripts/build_manifest.py    # show recorded entries
+"""
+
+import hashlib
+import inspect
+import json
+import threading
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+MANIFEST_PATH = SCRIPT_DIR.parent / "assets" / "build_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def source_version(*objs):
+    """Short hash of the source code of modules/functions, so code edits invalidate outputs.
+
+    A sibling script module may be given by name ("chroma_key"); its file is
+    hashed without importing it (same hash as passing the module).
+    """
+    digest = hashlib.sha256()
+    for obj in objs:
+        if isinstance(obj, str):
+            source = (SCRIPT_DIR / f"{obj}.py").read_text(encoding="utf-8")
+        else:
+            source = inspect.getsource(obj)
+        digest.update(source.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def pixel_hash(img):
+    """SHA-256 of an image's mode, size and raw pixel bytes."""
+    digest = hashlib.sha256(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode("ascii"))
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """JSON record of how each output sprite was built, safe to update from several threads."""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = Path(path)
+        self.entries = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("sprites", {})
+
+    def is_stale(self, name, fingerprint, output_path):
+        """True if `name` has no output, no record, or was built from different inputs."""
+        if not Path(output_path).exists():
+            return True
+        entry = self.entries.get(name)
+        if entry is None:
+            return True
+        return any(entry.get(k) != v for k, v in fingerprint.items())
+
+    def record(self, name, fingerprint, **extra):
+        """Store the fingerprint an output was just built from and write the manifest."""
+        with self._lock:
+            self.entries[name] = dict(fingerprint, built=time.time(), **extra)
+            self._save()
+
+    def invalidate(self, names):
+        """Mark outputs as rewritten outside a build, so the next build redoes them.
+
+        Only the raw each was keyed from is kept (watch_sprites.py reads it back).
+        """
+        with self._lock:
+            for name in names:
+                entry = self.entries.get(name)
+                if entry is not None:
+                    kept = {"raw": entry["raw"]} if "raw" in entry else {}
+                    self.entries[name] = dict(kept, edited=time.time())
+            self._save()
+
+    def _save(self):
+        data = {"version": MANIFEST_VERSION, "sprites": dict(sorted(self.entries.items()))}
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=2) + "\n")
+        tmp.replace(self.path)
+
+
+def main():
+    manifest = BuildManifest()
+    print(f"{len(manifest.entries)} sprites recorded in {manifest.path}")
+    for name, entry in sorted(manifest.entries.items()):
+        stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.get("built", 0)))
+        if "copy_of" in entry:
+            source = f"copy of {entry['copy_of']}"
+        else:
+            # raw is None for an image recorded without a raw_sha256
+            source = f"raw {(entry.get('raw') or '?')[:12]}"
+        if "edited" in entry:
+            stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["edited"]))
+            source += "  (edited, rebuilt next run)"
+        print(f"  {name:16s} {stamp}  target {entry.get('target', '-')!s:>4}  {source}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,59 +4,19 @@ Generate ALL hero sprites from scratch with consistent character design.
 Uses a 2-frame run cycle (classic NES style) for maximum contrast between poses.
 Each sprite is generated individually with very specific pose descriptions.
 """
-import os
-import sys
 import io
 from pathlib import Path
 
-# Load API key from .env
-env_path = Path(__file__).parent.parent / ".env"
-if env_path.exists():
-    for line in env_path.read_text().splitlines():
-        if "=" in line and not line.startswith("#"):
-            key, val = line.strip().split("=", 1)
-            os.environ[key] = val
-
-api_key = os.environ.get("GEMINI_API_KEY")
-if not api_key:
-    print("ERROR: GEMINI_API_KEY not found in .env")
-    sys.exit(1)
-
-from google import genai
-from google.genai import types
 from PIL import Image
 
-client = genai.Client(api_key=api_key)
+from chroma_key import remove_background
+from imagen_backend import create_backend
+
+backend = create_backend()
 output_dir = Path(__file__).parent.parent / "assets" / "sprites"
 output_dir.mkdir(parents=True, exist_ok=True)
 
 
-def remove_background(img, tolerance=90):
-    """Remove background by global color match against corner-sampled color."""
-    img_rgba = img.convert("RGBA")
-    pixels = img_rgba.load()
-    w, h = img_rgba.size
-
-    corners = [(2, 2), (w - 3, 2), (2, h - 3), (w - 3, h - 3)]
-    bg_r = sum(pixels[x, y][0] for x, y in corners) // 4
-    bg_g = sum(pixels[x, y][1] for x, y in corners) // 4
-    bg_b = sum(pixels[x, y][2] for x, y in corners) // 4
-
-    removed = 0
-    for y in range(h):
-        for x in range(w):
-            r, g, b, a = pixels[x, y]
-            dist = ((r - bg_r) ** 2 + (g - bg_g) ** 2 + (b - bg_b) ** 2) ** 0.5
-            if dist < tolerance:
-                pixels[x, y] = (0, 0, 0, 0)
-                removed += 1
-            elif dist < tolerance + 30:
-                af = (dist - tolerance) / 30.0
-                pixels[x, y] = (r, g, b, int(a * max(0, min(1, af))))
-
-    return img_rgba, removed
-
-
 def generate_and_save(prompt, name):
     full_prompt = (
         prompt + " "
@@ -65,10 +25,10 @@ def generate_and_save(prompt, name):
     )
     print(f"\n  Generating: {name}...")
     try:
-        response = client.models.generate_images(
+        response = backend.generate_images(
             model="imagen-4.0-generate-001",
             prompt=full_prompt,
-            config=types.GenerateImagesConfig(number_of_images=1),
+            config=backend.config(number_of_images=1),
         )
         if not response.generated_images:
             print(f"  ERROR: No images generated for {name}")
@@ -3,60 +3,24 @@
 Generate 3-frame hero run cycle as a SINGLE SPRITE SHEET for visual consistency.
 All 3 poses are generated in one image, then split into individual frames.
 This ensures the knight's colors, proportions, and style remain identical across frames.
+Frames are found as connected components (see sheet_split.py), so uneven
+spacing on the sheet doesn't clip or mix frames.
 """
-import os
 import sys
 import io
 from pathlib import Path
 
-# Load API key from .env
-env_path = Path(__file__).parent.parent / ".env"
-if env_path.exists():
-    for line in env_path.read_text().splitlines():
-        if "=" in line and not line.startswith("#"):
-            key, val = line.strip().split("=", 1)
-            os.environ[key] = val
-
-api_key = os.environ.get("GEMINI_API_KEY")
-if not api_key:
-    print("ERROR: GEMINI_API_KEY not found in .env")
-    sys.exit(1)
-
-from google import genai
-from google.genai import types
 from PIL import Image
 
-client = genai.Client(api_key=api_key)
+from chroma_key import remove_background
+from imagen_backend import create_backend
+from sheet_split import split_sheet
+
+backend = create_backend()
 output_dir = Path(__file__).parent.parent / "assets" / "sprites"
 output_dir.mkdir(parents=True, exist_ok=True)
 
 
-def remove_background(img, tolerance=90):
-    """Remove background by global color match against corner-sampled color."""
-    img_rgba = img.convert("RGBA")
-    pixels = img_rgba.load()
-    w, h = img_rgba.size
-
-    corners = [(2, 2), (w - 3, 2), (2, h - 3), (w - 3, h - 3)]
-    bg_r = sum(pixels[x, y][0] for x, y in corners) // 4
-    bg_g = sum(pixels[x, y][1] for x, y in corners) // 4
-    bg_b = sum(pixels[x, y][2] for x, y in corners) // 4
-
-    removed = 0
-    for y in range(h):
-        for x in range(w):
-            r, g, b, a = pixels[x, y]
-            dist = ((r - bg_r) ** 2 + (g - bg_g) ** 2 + (b - bg_b) ** 2) ** 0.5
-            if dist < tolerance:
-                pixels[x, y] = (0, 0, 0, 0)
-                removed += 1
-            elif dist < tolerance + 30:
-                af = (dist - tolerance) / 30.0
-                pixels[x, y] = (r, g, b, int(a * max(0, min(1, af))))
-
-    return img_rgba, removed
-
-
 def center_crop_frame(img, target_w, target_h):
     """Crop a frame to center on its non-transparent content, padded to target size."""
     # Find bounding box of non-transparent pixels
@@ -112,10 +76,10 @@ prompt = (
 
 print("\n  Generating sprite sheet with 3 run cycle frames...")
 try:
-    response = client.models.generate_images(
+    response = backend.generate_images(
         model="imagen-4.0-generate-001",
         prompt=prompt,
-        config=types.GenerateImagesConfig(number_of_images=1),
+        config=backend.config(number_of_images=1),
     )
 
     if not response.generated_images:
@@ -136,16 +100,16 @@ try:
     keyed_sheet.save(str(sheet_path))
     print(f"  Background removed: {removed} pixels")
 
-    # Split into 3 equal frames
-    w, h = keyed_sheet.size
-    frame_w = w // 3
-
+    # Split into frames by connected components, ordered left to right
     frame_names = ["hero_run1", "hero_run2", "hero_run3"]
-    for i, name in enumerate(frame_names):
-        left = i * frame_w
-        right = left + frame_w
-        frame = keyed_sheet.crop((left, 0, right, h))
+    frames = split_sheet(keyed_sheet, len(frame_names))
+    if len(frames) != len(frame_names):
+        raise ValueError(f"found {len(frames)} characters on the sheet, "
+                         f"expected {len(frame_names)}")
 
+    w, h = keyed_sheet.size
+    frame_w = w // len(frame_names)
+    for name, frame in zip(frame_names, frames):
         # Center-crop each frame to consistent size, feet aligned
         frame = center_crop_frame(frame, frame_w, h)
 
@@ -185,10 +149,10 @@ except Exception as e:
         full_prompt = char_desc + pose_desc
         print(f"\n  Generating: {name}...")
         try:
-            resp = client.models.generate_images(
+            resp = backend.generate_images(
                 model="imagen-4.0-generate-001",
                 prompt=full_prompt,
-                config=types.GenerateImagesConfig(number_of_images=1),
+                config=backend.config(number_of_images=1),
             )
             if not resp.generated_images:
                 print(f"  ERROR: No image for {name}")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Hitbox and collision-mask export
+
+Writes a {name}.hitbox.json sidecar next to each sprite PNG, so the game can
+set up physics bodies by table lookup instead of guessing from texture size
+(which counts the transparent margins of the hero canvas and padding):
+- bbox:   tight box around the opaque pixels, [x, y, w, h] in texture pixels
+- hitbox: the "fair" box: bbox with the outermost FAIR_TRIM of opaque pixels
+          trimmed from the left, right and top (stray hair, capes, sword
+          tips); the bottom stays on the feet so sprites stand on the ground
+- mask:   1-bit opacity of every pixel inside bbox, rows packed MSB first
+          into `stride` bytes each, base64 encoded
+
+Every sidecar is also folded into assets/sprites/hitboxes.json, {name: data}
+with aliased sprites (see asset_manifest.py) under their own names too, so
+BootScene loads all of them in one request; js/hitboxes.js applies them to
+bodies and does the per-pixel overlap test. Only hitboxes.json is shipped;
+the sidecars are build intermediates (ignored by git) that let a rebuild
+refresh one sprite's entry without recomputing the others.
+
+Usage:
+    python scripts/hitboxes.py                      # every sprite in assets/sprites/
+    python scripts/hitboxes.py assets/sprites/goblin.png
+"""
+
+import argparse
+import base64
+import json
+from pathlib import Path
+
+# NumPy and Pillow are imported where they are used, so importing this
+# module for its paths and write_combined() stays cheap
+
+SPRITE_DIR = Path(__file__).parent.parent / "assets" / "sprites"
+SIDECAR_SUFFIX = ".hitbox.json"
+COMBINED_NAME = "hitboxes.json"
+ALPHA_MIN = 128      # pixels at least this opaque are solid
+FAIR_TRIM = 0.06     # share of opaque pixels trimmed from each of left, right and top
+
+
+def sidecar_path(png_path):
+    png_path = Path(png_path)
+    return png_path.with_name(png_path.stem + SIDECAR_SUFFIX)
+
+
+# ============================================================
+# BOXES AND MASKS
+# ============================================================
+
+def tight_bbox(solid):
+    """[x, y, w, h] of the True pixels of an (h, w) bool mask, or None if there are none."""
+    import numpy as np
+
+    cols = np.flatnonzero(solid.any(axis=0))
+    rows = np.flatnonzero(solid.any(axis=1))
+    if len(cols) == 0:
+        return None
+    return [int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)]
+
+
+def fair_hitbox(solid, trim=FAIR_TRIM):
+    """Box keeping all but the outer `trim` of solid pixels on the left, right and top."""
+    import numpy as np
+
+    col_mass = np.cumsum(solid.sum(axis=0))
+    row_mass = np.cumsum(solid.sum(axis=1))
+    total = col_mass[-1]
+    x0 = int(np.searchsorted(col_mass, trim * total, side="right"))
+    x1 = int(np.searchsorted(col_mass, (1 - trim) * total, side="left")) + 1
+    y0 = int(np.searchsorted(row_mass, trim * total, side="right"))
+    y1 = int(np.flatnonzero(solid.any(axis=1))[-1]) + 1
+    return [x0, y0, max(1, x1 - x0), max(1, y1 - y0)]
+
+
+def pack_mask(solid):
+    """Pack an (h, w) bool mask into {"stride", "bits"} (rows MSB first, base64)."""
+    import numpy as np
+
+    packed = np.packbits(solid, axis=1)
+    return {"stride": int(packed.shape[1]), "bits": base64.b64encode(packed.tobytes()).decode("ascii")}
+
+
+def unpack_mask(mask, width, height):
+    """Inverse of pack_mask: the (height, width) bool mask."""
+    import numpy as np
+
+    packed = np.frombuffer(base64.b64decode(mask["bits"]), dtype=np.uint8)
+    return np.unpackbits(packed.reshape(height, mask["stride"]), axis=1, count=width).astype(bool)
+
+
+def collision_data(img):
+    """Sidecar contents for an RGBA image; bbox, hitbox and mask are None when it is empty."""
+    import numpy as np
+
+    solid = np.asarray(img.convert("RGBA"))[..., 3] >= ALPHA_MIN
+    data = {"width": img.size[0], "height": img.size[1], "alpha_min": ALPHA_MIN,
+            "bbox": None, "hitbox": None, "mask": None}
+    bbox = tight_bbox(solid)
+    if bbox:
+        x, y, w, h = bbox
+        data["bbox"] = bbox
+        data["hitbox"] = fair_hitbox(solid)
+        data["mask"] = pack_mask(solid[y:y + h, x:x + w])
+    return data
+
+
+def write_sidecar(img, png_path):
+    """Write the hitbox sidecar for `img`, which was saved as `png_path`. Returns the data."""
+    data = collision_data(img)
+    sidecar_path(png_path).write_text(json.dumps(data, separators=(",", ":")) + "\n")
+    return data
+
+
+def write_combined(sprite_dir=SPRITE_DIR, aliases=None):
+    """Fold every sidecar in `sprite_dir` into one hitboxes.json. Returns its path.
+
+    `aliases` ({alias: sprite}) get a copy of their sprite's entry.
+    """
+    sprite_dir = Path(sprite_dir)
+    combined = {}
+    for path in sorted(sprite_dir.glob("*" + SIDECAR_SUFFIX)):
+        combined[path.name[:-len(SIDECAR_SUFFIX)]] = json.loads(path.read_text())
+    for alias, sprite in (aliases or {}).items():
+        if sprite in combined:
+            combined[alias] = combined[sprite]
+    out = sprite_dir / COMBINED_NAME
+    tmp = out.with_suffix(".tmp")
+    tmp.write_text(json.dumps(dict(sorted(combined.items())), separators=(",", ":")) + "\n")
+    tmp.replace(out)
+    return out
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Write hitbox/collision-mask sidecars for sprites.")
+    parser.add_argument("paths", nargs="*", help="sprite PNGs (default: all of assets/sprites/)")
+    args = parser.parse_args()
+
+    from PIL import Image
+
+    paths = [Path(p) for p in args.paths] or sorted(
+        p for p in SPRITE_DIR.glob("*.png") if not p.stem.endswith("_raw"))
+    for path in paths:
+        data = write_sidecar(Image.open(path), path)
+        if data["bbox"] is None:
+            print(f"  {path.name:24s} empty")
+            continue
+        print(f"  {path.name:24s} {data['width']}x{data['height']}  bbox {data['bbox']}  "
+              f"hitbox {data['hitbox']}")
+    from asset_manifest import read_aliases
+
+    combined = write_combined(aliases=read_aliases())
+    print(f"\n  Wrote {len(paths)} sidecars and {combined}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Pluggable Imagen backends
+
+Generator scripts talk to a backend instead of building genai.Client
+directly, so the pipeline can run, be profiled or be load-tested without
+network access or an API key:
+
+- gemini: the real Imagen API via google-genai (needs GEMINI_API_KEY in .env).
+          The SDK is imported, the key checked and the client built on the
+          first generate_images call, so cached and offline runs work on
+          machines without either
+- fake:   a local stand-in that renders deterministic chunky pixel-art sprites
+          on the chroma background named in the prompt (#00FF00 / #FF00FF),
+          at Imagen's 1024x1024 size, with configurable latency, jitter and
+          failure injection
+
+Pick one with the IMAGEN_BACKEND environment variable or a script's
+--backend flag. Fake options follow a colon, comma separated:
+    IMAGEN_BACKEND=fake
+    IMAGEN_BACKEND=fake:latency=3,jitter=1.5,fail=0.1,seed=7
+
+Both take a plain dict from config() and return responses shaped like the
+SDK's: response.generated_images[i].image.image_bytes
+
+Run directly to render a few fake sprites into /tmp for a quick look:
+    python scripts/imagen_backend.py
+"""
+
+import hashlib
+import io
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ENV_PATH = Path(__file__).parent.parent / ".env"
+DEFAULT_BACKEND = "gemini"
+
+
+def load_env(path=ENV_PATH):
+    """Load KEY=value lines from .env into os.environ."""
+    if path.exists():
+        for line in path.read_text().splitlines():
+            if "=" in line and not line.startswith("#"):
+                key, val = line.strip().split("=", 1)
+                os.environ[key] = val
+
+
+# ============================================================
+# GEMINI
+# ============================================================
+
+class BackendUnavailable(RuntimeError):
+    """The backend can't make calls here (SDK not installed, no API key)."""
+
+
+class GeminiBackend:
+    """The real Imagen API, connected on first use."""
+
+    name = "gemini"
+
+    def __init__(self, api_key=None):
+        self._api_key = api_key
+        self._client = None
+        self._types = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """Import the SDK and build the client, once. Raises BackendUnavailable."""
+        with self._lock:
+            if self._client is None:
+                api_key = self._api_key or os.environ.get("GEMINI_API_KEY")
+                if not api_key:
+                    raise BackendUnavailable("GEMINI_API_KEY not found in .env")
+                try:
+                    from google import genai
+                    from google.genai import types
+                except ImportError as e:
+                    raise BackendUnavailable(f"google-genai is not installed ({e})") from e
+                self._types = types
+                self._client = genai.Client(api_key=api_key)
+        return self._client
+
+    def config(self, **kwargs):
+        # A plain dict: cache keys match GenerateImagesConfig.model_dump() without the SDK
+        return dict(kwargs)
+
+    def generate_images(self, model, prompt, config):
+        client = self.connect()
+        return client.models.generate_images(
+            model=model, prompt=prompt, config=self._types.GenerateImagesConfig(**config))
+
+
+# ============================================================
+# FAKE
+# ============================================================
+
+class FakeBackendError(RuntimeError):
+    """An injected failure from the fake backend."""
+
+
+class FakeBackend:
+    """Offline stand-in for Imagen.
+
+    Image content depends only on (seed, prompt, candidate index). Latency
+    and failures are drawn from (seed, prompt, attempt number), so a run
+    behaves the same regardless of thread scheduling.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=0.0, jitter=0.0, fail=0.0, empty=0.0, seed=0, size=1024):
+        self.latency = float(latency)
+        self.jitter = float(jitter)
+        self.fail = float(fail)
+        self.empty = float(empty)
+        self.seed = int(seed)
+        self.size = int(size)
+        self.calls = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def config(self, **kwargs):
+        return dict(kwargs)
+
+    def _rng(self, *parts):
+        import numpy as np
+
+        digest = hashlib.sha256(repr((self.seed,) + parts).encode("utf-8")).digest()
+        return np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+    def generate_images(self, model, prompt, config):
+        with self._lock:
+            attempt = self._attempts.get(prompt, 0)
+            self._attempts[prompt] = attempt + 1
+            self.calls += 1
+
+        rng = self._rng("call", prompt, attempt)
+        delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+        roll = rng.random()
+        time.sleep(delay)
+
+        if roll < self.fail:
+            raise FakeBackendError(f"503 UNAVAILABLE (injected, attempt {attempt + 1})")
+        if roll < self.fail + self.empty:
+            return SimpleNamespace(generated_images=[])
+
+        count = int(dict(config or {}).get("number_of_images") or 1)
+        images = [
+            SimpleNamespace(image=SimpleNamespace(image_bytes=self.render(prompt, i)))
+            for i in range(count)
+        ]
+        return SimpleNamespace(generated_images=images)
+
+    def render(self, prompt, index=0):
+        """Render one deterministic sprite as PNG bytes."""
+        import numpy as np
+        from PIL import Image
+
+        rng = self._rng("image", prompt, index)
+        match = re.search(r"#([0-9A-Fa-f]{6})", prompt)
+        chroma = tuple(bytes.fromhex(match.group(1) if match else "FF00FF"))
+
+        # Low-res mirrored silhouette with a dark outline, like a pixel-art sprite
+        grid = int(rng.integers(16, 33))
+        half = rng.random((grid, (grid + 1) // 2)) < 0.55
+        mask = np.concatenate([half, half[:, ::-1][:, grid % 2:]], axis=1)
+        yy, xx = np.mgrid[:grid, :grid]
+        mask &= np.hypot(yy - grid / 2, xx - grid / 2) < grid / 2
+        grown = mask.copy()
+        grown[1:] |= mask[:-1]
+        grown[:-1] |= mask[1:]
+        grown[:, 1:] |= mask[:, :-1]
+        grown[:, :-1] |= mask[:, 1:]
+
+        palette = rng.integers(40, 200, size=(4, 3))
+        # Keep sprite colors away from the chroma key, as the prompts demand
+        palette[:, 1 if chroma[1] > 128 else 0] //= 2
+        cells = np.zeros((grid, grid, 3), dtype=np.uint8)
+        cells[:] = chroma
+        cells[grown] = (20, 16, 24)
+        cells[mask] = palette[rng.integers(0, 4, size=(grid, grid))][mask]
+
+        # Upscale each cell to a block of screen pixels, then add Imagen-style noise
+        block = int(self.size * rng.uniform(0.55, 0.8)) // grid
+        sprite = np.repeat(np.repeat(cells, block, axis=0), block, axis=1)
+        canvas = np.empty((self.size, self.size, 3), dtype=np.int16)
+        canvas[:] = chroma
+        sh, sw = sprite.shape[:2]
+        top = int(rng.integers(0, self.size - sh + 1))
+        left = int(rng.integers(0, self.size - sw + 1))
+        canvas[top:top + sh, left:left + sw] = sprite
+        canvas += rng.integers(-6, 7, size=canvas.shape, dtype=np.int16)
+
+        img = Image.fromarray(np.clip(canvas, 0, 255).astype(np.uint8), "RGB")
+        buf = io.BytesIO()
+        # Fast compression keeps the fake's own CPU cost out of pipeline benchmarks
+        img.save(buf, "PNG", compress_level=1)
+        return buf.getvalue()
+
+
+# ============================================================
+# SELECTION
+# ============================================================
+
+def parse_spec(spec):
+    """Split 'fake:latency=2,fail=0.1' into ('fake', {'latency': '2', 'fail': '0.1'})."""
+    name, _, opts = spec.partition(":")
+    options = {}
+    for opt in filter(None, opts.split(",")):
+        key, _, val = opt.partition("=")
+        options[key.strip()] = val.strip()
+    return name.strip().lower(), options
+
+
+def create_backend(spec=None):
+    """Build the backend named by `spec`, IMAGEN_BACKEND, or the default (gemini)."""
+    load_env()
+    name, options = parse_spec(spec or os.environ.get("IMAGEN_BACKEND") or DEFAULT_BACKEND)
+
+    if name == "fake":
+        return FakeBackend(**options)
+    if name == "gemini":
+        return GeminiBackend()
+
+    print(f"ERROR: unknown Imagen backend '{name}' (expected gemini or fake)")
+    sys.exit(1)
+
+
+def main():
+    backend = FakeBackend(seed=int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    for i, chroma in enumerate(["#FF00FF", "#00FF00", "#FF00FF"]):
+        t0 = time.perf_counter()
+        data = backend.render(f"fake sprite {i}. Solid background ({chroma}).")
+        path = Path("/tmp") / f"fake_sprite_{i}.png"
+        path.write_bytes(data)
+        print(f"  {path} ({len(data) / 1024:.0f} KB, {(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
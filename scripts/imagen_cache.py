@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Content-addressed on-disk cache for Imagen responses
+
+Each entry is keyed by a SHA-256 of the backend, the model name, the full
+prompt and the GenerateImagesConfig, so rerunning a script with unchanged prompts skips the
+generate_images round trip. The returned image_bytes are stored once per key
+as {key}.png with a small {key}.json sidecar describing where they came from.
+
+The cache is capped in bytes. Hits refresh an entry's mtime, and when a write
+pushes the cache over the cap the least recently used entries are evicted.
+
+Usage:
+    python scripts/imagen_cache.py            # list entries
+    python scripts/imagen_cache.py --clear    # delete everything
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).parent.parent / ".imagen_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def config_dict(config):
+    """Plain-dict view of a GenerateImagesConfig (pydantic model or dict)."""
+    if config is None:
+        return {}
+    if hasattr(config, "model_dump"):
+        return config.model_dump(mode="json", exclude_none=True)
+    return dict(config)
+
+
+def cache_key(model, prompt, config, backend="gemini"):
+    """Stable hex digest of everything that determines an Imagen response."""
+    payload = json.dumps(
+        {"backend": backend, "model": model, "prompt": prompt, "config": config_dict(config)},
+        sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ImagenCache:
+    """Byte-capped LRU cache of Imagen image_bytes, safe to share between threads."""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _blob_path(self, key):
+        return self.root / f"{key}.png"
+
+    def _meta_path(self, key):
+        return self.root / f"{key}.json"
+
+    def get(self, key):
+        """Return cached image_bytes for `key`, or None on a miss."""
+        path = self._blob_path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        # Touch so eviction treats this entry as recently used. A concurrent put
+        # may have evicted it since the read; the bytes we hold are still good.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def digest(self, key):
+        """SHA-256 of the cached image_bytes for `key`, or None if not cached."""
+        try:
+            return hashlib.sha256(self._blob_path(key).read_bytes()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data, **meta):
+        """Store image_bytes for `key` and evict old entries if over the cap."""
+        meta.update(key=key, size=len(data), created=time.time())
+        self._write_atomic(self._meta_path(key), json.dumps(meta, indent=2).encode("utf-8"))
+        self._write_atomic(self._blob_path(key), data)
+        with self._lock:
+            self.stores += 1
+        self.evict()
+
+    def _write_atomic(self, path, data):
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _read_meta(self, key):
+        try:
+            return json.loads(self._meta_path(key).read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def entries(self, with_meta=True):
+        """List (key, size, mtime, meta) for every cached response, newest first."""
+        result = []
+        for path in self.root.glob("*.png"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            meta = self._read_meta(path.stem) if with_meta else {}
+            result.append((path.stem, st.st_size, st.st_mtime, meta))
+        result.sort(key=lambda e: e[2], reverse=True)
+        return result
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = self.entries(with_meta=False)
+            total = sum(e[1] for e in entries)
+            while entries and total > self.max_bytes:
+                key, size, _, _ = entries.pop()
+                self._blob_path(key).unlink(missing_ok=True)
+                self._meta_path(key).unlink(missing_ok=True)
+                total -= size
+
+    def clear(self):
+        """Delete every entry."""
+        with self._lock:
+            for path in list(self.root.glob("*.png")) + list(self.root.glob("*.json")):
+                path.unlink(missing_ok=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the Imagen response cache.")
+    parser.add_argument("--clear", action="store_true", help="delete all cached responses")
+    args = parser.parse_args()
+
+    cache = ImagenCache()
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {cache.root}")
+        return
+
+    entries = cache.entries()
+    total = sum(e[1] for e in entries)
+    print(f"{len(entries)} cached responses, {total / 1024 / 1024:.1f} MB "
+          f"(cap {cache.max_bytes / 1024 / 1024:.0f} MB) in {cache.root}")
+    for key, size, mtime, meta in entries:
+        stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime))
+        print(f"  {key[:12]}  {size / 1024:7.1f} KB  {stamp}  {meta.get('name', '?')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Rate-limited, retrying Imagen client
+
+Wraps any backend from imagen_backend.py with the same interface (name,
+config, generate_images) and adds:
+1. Token bucket: at most `rpm` calls per minute, with bursts up to `burst`,
+   shared by every thread
+2. Retries: retryable errors (429, 5xx, timeouts, connection resets, empty
+   responses) are retried with jittered exponential backoff; anything else
+   (bad prompt, bad key) fails straight away
+3. Circuit breaker: when at least half of the recent attempts failed, new
+   calls wait out a cooldown instead of hammering the API. One probe call
+   then decides whether to resume (success) or wait again, with a longer
+   cooldown (failure)
+4. Stats: attempts, retries, failures, breaker trips, time spent waiting
+   for tokens, and latency percentiles, printed by summary()
+
+Defaults come from IMAGEN_RPM / IMAGEN_RETRIES (or .env) when set. The
+fake backend is not rate limited unless an rpm is given explicitly.
+
+Run directly to push a burst of requests through a flaky fake backend:
+    python scripts/imagen_client.py --requests 40 --rpm 120 --fail 0.3
+"""
+
+import argparse
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from imagen_backend import create_backend, load_env
+
+DEFAULT_RPM = 20
+DEFAULT_RETRIES = 4
+BACKOFF_BASE = 2.0       # seconds before the first retry
+BACKOFF_MAX = 60.0
+BREAKER_WINDOW = 20      # recent attempts considered
+BREAKER_MIN_SAMPLES = 10
+BREAKER_THRESHOLD = 0.5  # failure share that opens the breaker
+BREAKER_COOLDOWN = 30.0
+BREAKER_MAX_COOLDOWN = 300.0
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_TEXT = re.compile(
+    r"\b(408|429|500|502|503|504)\b|UNAVAILABLE|RESOURCE_EXHAUSTED|DEADLINE_EXCEEDED|"
+    r"timed? ?out|temporarily", re.IGNORECASE)
+
+
+class EmptyResponseError(RuntimeError):
+    """generate_images returned no images (usually a transient safety/quota hiccup)."""
+
+
+def is_retryable(exc):
+    """True for errors worth retrying: rate limits, server errors, timeouts, dropped connections."""
+    if isinstance(exc, (EmptyResponseError, ConnectionError, TimeoutError)):
+        return True
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_CODES
+    return bool(RETRYABLE_TEXT.search(str(exc)))
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) of a list, by linear interpolation; 0.0 when empty."""
+    if not values:
+        return 0.0
+    s = sorted(values)
+    pos = (len(s) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (pos - lo)
+
+
+# ============================================================
+# RATE LIMITING
+# ============================================================
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available. Returns seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class CircuitBreaker:
+    """Pauses callers while the recent failure rate is too high.
+
+    closed:    calls flow freely
+    open:      calls wait until the cooldown ends
+    half-open: one probe call goes through; the rest keep waiting on it
+
+    wait() hands the probe a token, and in half-open only the result
+    recorded with that token counts: calls that started before the trip
+    and finish late must not close or re-trip the breaker.
+    """
+
+    def __init__(self, window=BREAKER_WINDOW, threshold=BREAKER_THRESHOLD,
+                 cooldown=BREAKER_COOLDOWN, max_cooldown=BREAKER_MAX_COOLDOWN):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.recent = deque(maxlen=window)
+        self.state = "closed"
+        self.reopen_at = 0.0
+        self.trips = 0
+        self._probes = 0
+        self._probe = None
+        self._cond = threading.Condition()
+
+    def wait(self):
+        """Block until a call may proceed.
+
+        Returns (seconds spent waiting, token): the token is not None for the
+        half-open probe and must be passed back to record().
+        """
+        t0 = time.monotonic()
+        token = None
+        with self._cond:
+            while True:
+                if self.state == "closed":
+                    break
+                now = time.monotonic()
+                if self.state == "open" and now >= self.reopen_at:
+                    self.state = "half-open"
+                    self._probes += 1
+                    token = self._probe = self._probes
+                    break
+                timeout = self.reopen_at - now if self.state == "open" else None
+                self._cond.wait(timeout)
+        return time.monotonic() - t0, token
+
+    def record(self, ok, token=None):
+        with self._cond:
+            if self.state == "half-open":
+                if token != self._probe:
+                    return  # a straggler from before the trip, not the probe
+                self._probe = None
+                if ok:
+                    self.state = "closed"
+                    self.cooldown = self.base_cooldown
+                    self.recent.clear()
+                else:
+                    self._trip(longer=True)
+                self._cond.notify_all()
+                return
+            self.recent.append(ok)
+            failures = self.recent.count(False)
+            if (self.state == "closed" and len(self.recent) >= BREAKER_MIN_SAMPLES
+                    and failures / len(self.recent) >= self.threshold):
+                self._trip()
+
+    def _trip(self, longer=False):
+        if longer:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+        self.state = "open"
+        self.reopen_at = time.monotonic() + self.cooldown
+        self.trips += 1
+        self.recent.clear()
+        print(f"  Circuit breaker open: pausing Imagen calls for {self.cooldown:.0f}s")
+
+
+# ============================================================
+# CLIENT
+# ============================================================
+
+class ResilientBackend:
+    """A backend wrapper adding rate limiting, retries and a circuit breaker."""
+
+    def __init__(self, backend, rpm=None, burst=None, retries=None,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, breaker=None):
+        load_env()
+        if rpm is None:
+            rpm = os.environ.get("IMAGEN_RPM") or (DEFAULT_RPM if backend.name != "fake" else 0)
+        rpm = float(rpm)
+        self.backend = backend
+        self.name = backend.name
+        self.rpm = rpm
+        self.bucket = TokenBucket(rpm / 60.0, burst or max(1, int(rpm // 10))) if rpm else None
+        self.retries = int(retries if retries is not None
+                           else os.environ.get("IMAGEN_RETRIES") or DEFAULT_RETRIES)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self.calls = 0
+        self.attempts = 0
+        self.retried = 0
+        self.failed = 0
+        self.errors = {}
+        self.latencies = []
+        self.throttled = 0.0
+        self.paused = 0.0
+        self._lock = threading.Lock()
+
+    def config(self, **kwargs):
+        return self.backend.config(**kwargs)
+
+    def backoff(self, retry):
+        """Full-jitter exponential backoff delay before retry number `retry` (1-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (retry - 1)))
+
+    def generate_images(self, model, prompt, config):
+        with self._lock:
+            self.calls += 1
+        # Fail fast, before waiting on the rate limit, if the backend can't connect
+        if hasattr(self.backend, "connect"):
+            self.backend.connect()
+        for attempt in range(self.retries + 1):
+            paused, probe = self.breaker.wait()
+            throttled = self.bucket.acquire() if self.bucket else 0.0
+            t0 = time.perf_counter()
+            try:
+                response = self.backend.generate_images(model=model, prompt=prompt, config=config)
+                if not response.generated_images:
+                    raise EmptyResponseError("no images in response")
+            except Exception as e:
+                elapsed = time.perf_counter() - t0
+                retry = is_retryable(e) and attempt < self.retries
+                self._count(paused, throttled, None, e, retry)
+                self.breaker.record(False, probe)
+                if not retry:
+                    raise
+                delay = self.backoff(attempt + 1)
+                print(f"  Retrying in {delay:.1f}s after {type(e).__name__} "
+                      f"({elapsed:.1f}s): {str(e)[:80]}")
+                time.sleep(delay)
+                continue
+            self._count(paused, throttled, time.perf_counter() - t0, None, False)
+            self.breaker.record(True, probe)
+            return response
+
+    def _count(self, paused, throttled, latency, error, retry):
+        with self._lock:
+            self.attempts += 1
+            self.paused += paused
+            self.throttled += throttled
+            if latency is not None:
+                self.latencies.append(latency)
+            if error is not None:
+                kind = type(error).__name__
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+                if retry:
+                    self.retried += 1
+                else:
+                    self.failed += 1
+
+    def stats(self):
+        with self._lock:
+            lat = list(self.latencies)
+            return {
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retries": self.retried,
+                "failed": self.failed,
+                "errors": dict(self.errors),
+                "breaker_trips": self.breaker.trips,
+                "throttled_s": self.throttled,
+                "paused_s": self.paused,
+                "latency_p50": percentile(lat, 50),
+                "latency_p90": percentile(lat, 90),
+                "latency_p99": percentile(lat, 99),
+                "latency_max": max(lat) if lat else 0.0,
+            }
+
+    def summary(self):
+        """Print an end-of-run summary of calls, retries, waits and latency percentiles."""
+        s = self.stats()
+        if not s["calls"]:
+            return s
+        print(f"\n  Imagen API: {s['calls']} calls, {s['attempts']} attempts, "
+              f"{s['retries']} retries, {s['failed']} failed, "
+              f"{s['breaker_trips']} breaker trips")
+        if s["errors"]:
+            print("  Errors: " + ", ".join(f"{k} x{v}" for k, v in sorted(s["errors"].items())))
+        print(f"  Latency: p50 {s['latency_p50']:.2f}s  p90 {s['latency_p90']:.2f}s  "
+              f"p99 {s['latency_p99']:.2f}s  max {s['latency_max']:.2f}s")
+        limit = f"{self.rpm:g} rpm" if self.rpm else "unlimited"
+        print(f"  Waiting (thread-seconds): {s['throttled_s']:.1f}s for rate limit ({limit}), "
+              f"{s['paused_s']:.1f}s for circuit breaker")
+        return s
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the resilient client on a fake backend.")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=120)
+    parser.add_argument("--fail", type=float, default=0.3, help="fake backend failure rate")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake backend latency (s)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("IMAGEN CLIENT - load test against the fake backend")
+    print("=" * 60)
+
+    fake = create_backend(f"fake:latency={args.latency},jitter={args.latency / 2},fail={args.fail}")
+    client = ResilientBackend(fake, rpm=args.rpm, backoff_base=0.2,
+                              breaker=CircuitBreaker(cooldown=2.0, max_cooldown=8.0))
+    config = client.config(number_of_images=1)
+
+    def one(i):
+        try:
+            client.generate_images(model="fake", prompt=f"load test {i} #FF00FF", config=config)
+            return True
+        except Exception:
+            return False
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        ok = sum(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - t0
+    print(f"\n  {ok}/{args.requests} succeeded in {elapsed:.1f}s "
+          f"({args.requests / elapsed * 60:.0f} calls/min, limit {args.rpm:g})")
+    client.summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Per-stage timing, size and memory instrumentation
+
+Wrap each stage of the sprite pipeline in a span:
+
+    from instrument import stage
+
+    with stage("key", name, pixels=w * h) as span:
+        ...
+        span["bytes_out"] = path.stat().st_size
+
+A span records wall time, CPU time of the calling thread (work a stage
+hands to a thread pool, like candidate scoring, shows up as wall time
+only), the counters given or set on it (bytes_in, bytes_out, pixels), and
+the process's resident memory when it ends. At the end of a run:
+- summary() prints totals per stage and the slowest sprites
+- write_trace() saves a Chrome trace-event JSON (chrome://tracing or
+  https://ui.perfetto.dev), one lane per process and thread
+- with profile_stage set, every span of that stage also runs under
+  cProfile, and report_profile() prints and saves the merged stats
+
+Process pool workers record into their own copy of the recorder; drain()
+hands their spans (and profile dump) back to the parent, which absorb()s
+them. perf_counter is a system-wide monotonic clock on the platforms we
+build on, so worker and parent spans share one timeline.
+
+Usage:
+    python scripts/instrument.py build_trace.json   # summarize a saved trace
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+COUNTERS = ("bytes_in", "bytes_out", "pixels")
+
+
+def rss():
+    """Resident set size of this process in bytes (the peak so far where the current one is unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return peak_rss()
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or 0 if unknown."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Recorder:
+    """Collects spans from any thread of this process (and absorbed worker spans)."""
+
+    def __init__(self):
+        self.events = []
+        self.profile_stage = None
+        self.worker_profiles = set()
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, sprite=None, **counters):
+        span = dict(counters)
+        profile = self._profile() if name == self.profile_stage else None
+        cpu0 = time.thread_time()
+        t0 = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield span
+        finally:
+            if profile:
+                profile.disable()
+            wall = time.perf_counter() - t0
+            cpu = time.thread_time() - cpu0
+            thread = threading.current_thread()
+            event = dict(span, stage=name, sprite=sprite, start=t0, wall=wall, cpu=cpu,
+                         rss=rss(), pid=os.getpid(), tid=thread.ident, thread=thread.name)
+            with self._lock:
+                self.events.append(event)
+
+    def _profile(self):
+        """This thread's profiler (cProfile only follows the thread that enabled it)."""
+        with self._lock:
+            return self._profiles.setdefault((os.getpid(), threading.get_ident()),
+                                             cProfile.Profile())
+
+    def _own_profiles(self):
+        """Profilers of this process (a forked worker also holds copies of its parent's)."""
+        pid = os.getpid()
+        return [p for (owner, _), p in self._profiles.items() if owner == pid]
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+
+    # --- Process pool workers ---
+
+    def drain(self):
+        """Take this process's spans (and dump its profile). Returns data for absorb()."""
+        pid = os.getpid()
+        with self._lock:
+            # A forked worker inherits the parent's spans; only hand back its own
+            mine = [e for e in self.events if e["pid"] == pid]
+            self.events = [e for e in self.events if e["pid"] != pid]
+        path = None
+        profiles = self._own_profiles()
+        if profiles:
+            path = str(Path(tempfile.gettempdir()) / f"tangled-profile-{pid}.prof")
+            pstats.Stats(*profiles).dump_stats(path)
+        return mine, path
+
+    def absorb(self, drained):
+        """Add spans (and a profile dump) returned by a worker's drain()."""
+        events, path = drained
+        with self._lock:
+            self.events.extend(events)
+            if path:
+                self.worker_profiles.add(path)
+
+    # --- Reports ---
+
+    def summary(self, top=8, live=True):
+        """Print totals per stage, the slowest sprites, and peak memory.
+
+        `live=False` for spans loaded from a trace (this process's peak means nothing then).
+        """
+        if not self.events:
+            return
+        stages = {}
+        sprites = {}
+        for e in self.events:
+            s = stages.setdefault(e["stage"], dict.fromkeys(("n", "wall", "cpu") + COUNTERS, 0))
+            s["n"] += 1
+            for k in ("wall", "cpu") + COUNTERS:
+                s[k] += e.get(k, 0)
+            if e["sprite"]:
+                p = sprites.setdefault(e["sprite"], {"wall": 0.0, "cpu": 0.0, "rss": 0})
+                p["wall"] += e["wall"]
+                p["cpu"] += e["cpu"]
+                p["rss"] = max(p["rss"], e["rss"])
+
+        print(f"\n  {'Stage':10s} {'calls':>5s} {'wall s':>8s} {'cpu s':>8s} "
+              f"{'MB in':>8s} {'MB out':>8s} {'Mpx':>8s}")
+        for name, s in sorted(stages.items(), key=lambda kv: -kv[1]["wall"]):
+            print(f"  {name:10s} {s['n']:5d} {s['wall']:8.2f} {s['cpu']:8.2f} "
+                  f"{s['bytes_in'] / 1e6:8.1f} {s['bytes_out'] / 1e6:8.1f} {s['pixels'] / 1e6:8.1f}")
+        if sprites:
+            slowest = sorted(sprites.items(), key=lambda kv: -kv[1]["wall"])[:top]
+            print("  Slowest sprites: " + ", ".join(
+                f"{n} {p['wall']:.2f}s ({p['cpu']:.2f}s cpu, {p['rss'] / 2**20:.0f} MB)"
+                for n, p in slowest))
+        seen = max(e["rss"] for e in self.events)
+        peak = f", peak {peak_rss() / 2**20:.0f} MB in this process" if live else ""
+        print(f"  RSS: up to {seen / 2**20:.0f} MB at the end of a stage{peak}")
+
+    def write_trace(self, path):
+        """Save every span as a Chrome trace-event JSON."""
+        origin = min(e["start"] for e in self.events) if self.events else 0.0
+        events = []
+        threads = {}
+        for e in self.events:
+            threads[(e["pid"], e["tid"])] = e["thread"]
+            args = {k: e[k] for k in COUNTERS if k in e}
+            args.update(sprite=e["sprite"], cpu_ms=round(e["cpu"] * 1000, 3),
+                        rss_mb=round(e["rss"] / 2**20, 1))
+            events.append({
+                "name": e["stage"] if not e["sprite"] else f"{e['stage']} {e['sprite']}",
+                "cat": e["stage"],
+                "ph": "X",
+                "ts": round((e["start"] - origin) * 1e6, 1),
+                "dur": round(e["wall"] * 1e6, 1),
+                "pid": e["pid"],
+                "tid": e["tid"],
+                "args": args,
+            })
+        for (pid, tid), name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": name}})
+        Path(path).write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}) + "\n")
+
+    def report_profile(self, path, limit=25):
+        """Print the merged cProfile stats of profile_stage and save them to `path`."""
+        sources = self._own_profiles() + sorted(self.worker_profiles)
+        if not sources:
+            print(f"\n  Profile: no '{self.profile_stage}' spans ran")
+            return
+        stats = pstats.Stats(*sources)
+        stats.dump_stats(str(path))
+        print(f"\n  Profile of '{self.profile_stage}' (saved to {path}):")
+        stats.sort_stats("cumulative").print_stats(limit)
+        for worker in self.worker_profiles:
+            Path(worker).unlink(missing_ok=True)
+
+
+recorder = Recorder()
+stage = recorder.stage
+
+
+def load_trace(path):
+    """Spans back from a trace written by write_trace(), for summary()."""
+    events = []
+    for e in json.loads(Path(path).read_text())["traceEvents"]:
+        if e["ph"] != "X":
+            continue
+        args = e["args"]
+        events.append(dict({k: args[k] for k in COUNTERS if k in args},
+                           stage=e["cat"], sprite=args.get("sprite"), start=e["ts"] / 1e6,
+                           wall=e["dur"] / 1e6, cpu=args["cpu_ms"] / 1000,
+                           rss=args["rss_mb"] * 2**20, pid=e["pid"], tid=e["tid"], thread=""))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a saved build trace.")
+    parser.add_argument("trace", help="trace JSON written by regenerate_sprites.py --trace")
+    parser.add_argument("--top", type=int, default=8, help="slowest sprites to list")
+    args = parser.parse_args()
+
+    saved = Recorder()
+    saved.events = load_trace(args.trace)
+    print(f"{len(saved.events)} spans in {args.trace}")
+    saved.summary(args.top, live=False)
+
+
+if __name__ == "__main__":
+    main()
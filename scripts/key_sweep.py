@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Sweep chroma-key tolerance and fade over existing raws
+
+Finds good "tolerance" / "fade" values for a sprite without new
+generations. For each raw, the background color and color-distance field
+are computed once (as remove_background does), then every setting of the
+grid is evaluated from that field:
+- removed: share of the image's alpha the setting takes away. Read off a
+  histogram of squared distances, so each extra setting costs a dot
+  product, not another pass over the pixels.
+- holes:   fully removed regions not connected to the image border, i.e.
+  holes punched into the sprite.
+- fringe:  mean width in pixels of the rim of kept, still chroma-tinted
+  pixels (closer than tolerance + fade + sprite_score.LEAK_MARGIN to the
+  background) hanging off the cut edge.
+The masks behind the last two nest as the threshold grows, so each
+connectivity flood resumes from the previous setting's instead of
+starting over.
+
+The suggested setting has the fewest holes, then the thinnest fringe, then
+removes the most. A contact sheet per sprite (rows: tolerance, columns:
+fade, keyed thumbnails on a checkerboard, suggestion outlined) goes to
+assets/candidates/sweeps/.
+
+Raws come from assets/sprites/{name}_raw.png where one exists, otherwise
+from .raw_archive/ (the raw the build manifest says the sprite was built
+from).
+
+Usage:
+    python scripts/key_sweep.py                          # every raw
+    python scripts/key_sweep.py goblin vine --mode flood
+    python scripts/key_sweep.py path/to/raw.png --tolerances 40:160:10 --fades 0,20,40
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from build_manifest import BuildManifest
+from chroma_key import (KEY_MODES, apply_key, border_connected, color_distance,
+                        connected_from, sample_background)
+from raw_archive import RawArchive
+from sprite_score import LEAK_MARGIN
+
+SPRITE_DIR = Path(__file__).parent.parent / "assets" / "sprites"
+SHEET_DIR = SPRITE_DIR.parent / "candidates" / "sweeps"
+TOLERANCES = tuple(range(30, 151, 15))
+FADES = (0, 15, 30, 45)
+THUMB = 112           # contact sheet cell size (px)
+LABEL_H = 14
+MAX_D2 = 3 * 255 ** 2
+
+
+# ============================================================
+# NESTED MASKS
+# ============================================================
+# The masks of a sweep nest (dist < 60 lies inside dist < 75), so every
+# connectivity flood starts from the previous threshold's result and only
+# spreads into what the larger threshold added.
+
+def border_seeds(shape):
+    seeds = np.zeros(shape, dtype=bool)
+    seeds[[0, -1], :] = True
+    seeds[:, [0, -1]] = True
+    return seeds
+
+
+def border_levels(dist, levels):
+    """{level: pixels with dist < level that are 4-connected to the border through such pixels}."""
+    border = border_seeds(dist.shape)
+    reached = border
+    out = {}
+    for level in sorted(set(levels)):
+        reached = connected_from(reached | border, dist < level)
+        out[level] = reached
+    return out
+
+
+def touching(mask):
+    """Pixels 4-adjacent to a `mask` pixel."""
+    near = np.zeros_like(mask)
+    near[1:] |= mask[:-1]
+    near[:-1] |= mask[1:]
+    near[:, 1:] |= mask[:, :-1]
+    near[:, :-1] |= mask[:, 1:]
+    return near
+
+
+def _min_runs(labels, mask):
+    """Give every horizontal run of `mask` the smallest label in it."""
+    w = mask.shape[1]
+    flat = mask.ravel()
+    starts = flat.copy()
+    starts[1:] &= ~flat[:-1]
+    starts[::w] = flat[::w]
+    idx = np.flatnonzero(flat)
+    run_starts = starts[idx]
+    out = labels.ravel().copy()
+    mins = np.minimum.reduceat(out[idx], np.flatnonzero(run_starts))
+    out[idx] = mins[np.cumsum(run_starts) - 1]
+    return out.reshape(mask.shape)
+
+
+def count_components(mask):
+    """Number of 4-connected components of `mask`.
+
+    Labels start as pixel indices and each run takes its minimum, alternating
+    rows and columns like chroma_key.border_connected, until nothing changes;
+    each component is then left with one pixel that kept its own index.
+    """
+    if not mask.any():
+        return 0
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    mask = mask[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    index = np.arange(mask.size, dtype=np.int64).reshape(mask.shape)
+    labels = index
+    mask_t = np.ascontiguousarray(mask.T)
+    while True:
+        new = _min_runs(labels, mask)
+        new = np.ascontiguousarray(_min_runs(np.ascontiguousarray(new.T), mask_t).T)
+        if np.array_equal(new[mask], labels[mask]):
+            return int(np.count_nonzero(mask & (labels == index)))
+        labels = new
+
+
+# ============================================================
+# SWEEP
+# ============================================================
+
+def removed_share(hist, roots, tolerance, fade, total):
+    """Share of `total` pixels' alpha a setting removes, from a histogram of squared distances."""
+    if fade:
+        weight = np.clip((tolerance + fade - roots) / fade, 0, 1)
+    else:
+        weight = (roots < tolerance).astype(np.float64)
+    return float(hist @ weight) / total
+
+
+def sweep(img, tolerances=TOLERANCES, fades=FADES, mode="global"):
+    """Evaluate every (tolerance, fade) on one raw. Returns (bg, results) with
+    results a list of {"tolerance", "fade", "removed", "holes", "fringe"},
+    by ascending tolerance, then fade."""
+    if mode not in KEY_MODES:
+        raise ValueError(f"Unknown key mode {mode!r} (expected one of {', '.join(KEY_MODES)})")
+    tolerances, fades = sorted(set(tolerances)), sorted(set(fades))
+    arr = np.asarray(img.convert("RGBA"))
+    bg = sample_background(arr)
+    dist = color_distance(arr, bg)
+    d2 = np.rint(dist * dist).astype(np.int64)
+    roots = np.arange(MAX_D2 + 1) ** 0.5
+    full_hist = np.bincount(d2.ravel(), minlength=MAX_D2 + 1).astype(np.float64)
+
+    reachable = border_levels(dist, tolerances)
+    if mode == "flood":
+        regions = border_levels(dist, [t + f for t in tolerances for f in fades])
+
+    results = []
+    for t in tolerances:
+        cut = dist < t
+        # Removed pixels the border can't reach are holes; flood never removes those
+        holes = count_components(cut & ~reachable[t]) if mode == "global" else 0
+        rim = None
+        for f in fades:
+            if mode == "flood":
+                removed = cut & regions[t + f]
+                hist = np.bincount(d2[regions[t + f]], minlength=MAX_D2 + 1).astype(np.float64)
+            else:
+                removed, hist = cut, full_hist
+            kept = ~removed
+            edge = kept & touching(removed)
+            tinted = kept & (dist < t + f + LEAK_MARGIN)
+            # Global keeps the same pixels for every fade, so the tinted rims nest too
+            seeds = edge if rim is None or mode == "flood" else edge | rim
+            rim = connected_from(seeds, tinted)
+            edge_len = np.count_nonzero(edge)
+            results.append({
+                "tolerance": t,
+                "fade": f,
+                "removed": removed_share(hist, roots, t, f, dist.size),
+                "holes": holes,
+                "fringe": float(np.count_nonzero(rim) / edge_len) if edge_len else 0.0,
+            })
+    return bg, results
+
+
+def best(results):
+    """Fewest holes, then the thinnest fringe, then the most removed."""
+    return min(results, key=lambda r: (r["holes"], round(r["fringe"], 2), -r["removed"]))
+
+
+# ============================================================
+# CONTACT SHEET
+# ============================================================
+
+def checkerboard(w, h, cell=8):
+    yy, xx = np.mgrid[:h, :w]
+    light = ((yy // cell + xx // cell) % 2).astype(bool)
+    board = np.where(light[..., None], 204, 153).astype(np.uint8)
+    return Image.fromarray(np.repeat(board, 3, axis=2), "RGB")
+
+
+def contact_sheet(img, name, bg, results, mode):
+    """Keyed thumbnails of every setting: rows are tolerances, columns fades."""
+    tolerances = sorted({r["tolerance"] for r in results})
+    fades = sorted({r["fade"] for r in results})
+    thumb = img.convert("RGBA")
+    thumb.thumbnail((THUMB, THUMB), Image.NEAREST)
+    base = np.asarray(thumb)
+    dist = color_distance(base, bg)
+    pick = best(results)
+
+    head_w = 44
+    cell_h = THUMB + LABEL_H
+    sheet = Image.new("RGB", (head_w + THUMB * len(fades), LABEL_H + cell_h * len(tolerances)),
+                      (40, 40, 40))
+    draw = ImageDraw.Draw(sheet)
+    draw.text((2, 2), name[:7], fill=(255, 255, 255))
+    for j, f in enumerate(fades):
+        draw.text((head_w + j * THUMB + 4, 2), f"fade {f}", fill=(255, 255, 255))
+    by_setting = {(r["tolerance"], r["fade"]): r for r in results}
+    for i, t in enumerate(tolerances):
+        y = LABEL_H + i * cell_h
+        draw.text((2, y + THUMB // 2), f"tol {t}", fill=(255, 255, 255))
+        for j, f in enumerate(fades):
+            arr = base.copy()
+            region = border_connected(dist < t + f) if mode == "flood" else None
+            apply_key(arr, dist, t, f, region)
+            x = head_w + j * THUMB
+            cell = checkerboard(base.shape[1], base.shape[0])
+            cell.paste(Image.fromarray(arr, "RGBA"), (0, 0), Image.fromarray(arr, "RGBA"))
+            sheet.paste(cell, (x, y))
+            r = by_setting[(t, f)]
+            draw.text((x + 2, y + THUMB), f"h{r['holes']} w{r['fringe']:.1f}",
+                      fill=(255, 120, 120) if r["holes"] else (200, 200, 200))
+            if r is pick:
+                draw.rectangle([x, y, x + THUMB - 1, y + cell_h - 1], outline=(255, 220, 0), width=2)
+    return sheet
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def load_raws(names):
+    """(name, raw image) for each name or PNG path; every raw on disk or archived by default."""
+    archive = RawArchive()
+    manifest = BuildManifest()
+    if not names:
+        loose = {p.stem[:-len("_raw")] for p in SPRITE_DIR.glob("*_raw.png")}
+        names = sorted(loose | {e["name"] for e in archive.entries})
+    raws = []
+    for name in names:
+        path = Path(name)
+        if path.suffix == ".png":
+            raws.append((path.stem, Image.open(path)))
+        elif (SPRITE_DIR / f"{name}_raw.png").exists():
+            raws.append((name, Image.open(SPRITE_DIR / f"{name}_raw.png")))
+        else:
+            entry = archive.current(name, manifest.entries.get(name, {}).get("raw"))
+            if entry is None:
+                print(f"  {name}: no raw on disk or in {archive.root}, skipping")
+                continue
+            raws.append((name, archive.image(entry)))
+    return raws
+
+
+def parse_values(text):
+    """'30:150:15' (inclusive range) or '0,15,30'."""
+    if ":" in text:
+        start, stop, step = (int(v) for v in text.split(":"))
+        return tuple(range(start, stop + 1, step))
+    return tuple(int(v) for v in text.split(","))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep keying tolerance and fade over raws.")
+    parser.add_argument("names", nargs="*", help="sprite names or raw PNG paths (default: all)")
+    parser.add_argument("--tolerances", type=parse_values, default=TOLERANCES,
+                        help="'start:stop:step' or a comma list (default 30:150:15)")
+    parser.add_argument("--fades", type=parse_values, default=FADES,
+                        help="comma list or 'start:stop:step' (default 0,15,30,45)")
+    parser.add_argument("--mode", choices=KEY_MODES, default="global")
+    parser.add_argument("--out", default=str(SHEET_DIR), help="contact sheet directory")
+    parser.add_argument("--no-sheets", action="store_true", help="skip the contact sheets")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"KEY SWEEP - {len(args.tolerances)} tolerances x {len(args.fades)} fades, {args.mode}")
+    print("=" * 60)
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    picks = []
+    for name, img in load_raws(args.names):
+        t0 = time.perf_counter()
+        bg, results = sweep(img, args.tolerances, args.fades, args.mode)
+        elapsed = time.perf_counter() - t0
+        pick = best(results)
+        picks.append((name, pick))
+
+        print(f"\n  {name}: bg RGB{bg}, {img.size[0]}x{img.size[1]}, swept in {elapsed:.2f}s")
+        print("     tol  fade  removed  holes  fringe")
+        for r in results:
+            mark = "*" if r is pick else " "
+            print(f"   {mark} {r['tolerance']:3d}  {r['fade']:4d}  {r['removed']:7.1%}  "
+                  f"{r['holes']:5d}  {r['fringe']:6.2f}")
+        if not args.no_sheets:
+            sheet = contact_sheet(img, name, bg, results, args.mode)
+            sheet.save(str(out / f"{name}.png"))
+
+    if picks:
+        print("\n  Suggested settings (fewest holes, thinnest fringe):")
+        for name, r in picks:
+            print(f"    {name:16s} \"tolerance\": {r['tolerance']}, \"fade\": {r['fade']}  "
+                  f"({r['holes']} holes, fringe {r['fringe']:.2f}px)")
+        if not args.no_sheets:
+            print(f"\n  Contact sheets in {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,93 +1,108 @@
 #!/usr/bin/env python3
-"""Normalize hero sprite PNGs so heads are consistent across animation frames.
+"""Normalize a group of animation frames so heads are consistent across them.
 
-1. Load all hero_*.png files (excluding *_raw.png)
-2. Find bounding box of non-transparent content in each
-3. Crop to content, resize proportionally to match the tallest
+regenerate_sprites.py already runs this stage on the hero frames in memory
+before saving them; this script is for frames made or edited some other way.
+
+1. Load the group's frames: hero_*.png by default, any --prefix (e.g.
+   goblin_ for a future enemy animation) or an explicit list of names,
+   never *_raw.png
+2. Find the bounding box of non-transparent content in all of them at once
+3. Crop to content, scale up (nearest neighbour) to match the tallest
 4. Bottom-align (feet) and center horizontally on a consistent canvas
-5. Save back to same filenames
+5. Save back to same filenames, refreshing their hitbox sidecars and the
+   combined hitboxes.json
+6. For frames in assets/sprites/, mark them as edited in the build
+   manifest (as watch_sprites.py does) and repack assets/atlas/, which
+   the game loads
+
+Usage:
+    python scripts/normalize_hero.py
+    python scripts/normalize_hero.py --prefix goblin_walk
+    python scripts/normalize_hero.py hero_run1 hero_run2 --padding 0
 """
 
-import glob
-import os
-from PIL import Image
-
-SPRITE_DIR = os.path.join(os.path.dirname(__file__), '..', 'assets', 'sprites')
-
-def get_content_bbox(img):
-    """Get bounding box of non-transparent pixels."""
-    alpha = img.getchannel('A')
-    bbox = alpha.getbbox()
-    return bbox
-
-def normalize_heroes():
-    pattern = os.path.join(SPRITE_DIR, 'hero_*.png')
-    files = sorted(glob.glob(pattern))
-    # Exclude raw files
-    files = [f for f in files if '_raw' not in f]
-
-    if not files:
-        print('No hero sprite files found.')
-        return
-
-    print(f'Found {len(files)} hero sprites:')
-    for f in files:
-        print(f'  {os.path.basename(f)}')
-
-    # Load images and find content bounds
-    images = {}
-    bboxes = {}
-    for f in files:
-        img = Image.open(f).convert('RGBA')
-        images[f] = img
-        bbox = get_content_bbox(img)
-        if bbox:
-            bboxes[f] = bbox
-            content_w = bbox[2] - bbox[0]
-            content_h = bbox[3] - bbox[1]
-            print(f'  {os.path.basename(f)}: content {content_w}x{content_h} at ({bbox[0]},{bbox[1]})')
-        else:
-            print(f'  {os.path.basename(f)}: empty/fully transparent, skipping')
-
-    if not bboxes:
-        print('No content found in any sprites.')
-        return
+import argparse
+from pathlib import Path
+
+from asset_manifest import read_aliases
 
-    # Find the tallest and widest content
-    max_h = max(bbox[3] - bbox[1] for bbox in bboxes.values())
-    max_w = max(bbox[2] - bbox[0] for bbox in bboxes.values())
+SPRITE_DIR = Path(__file__).parent.parent / 'assets' / 'sprites'
+PADDING = 20
 
-    # Canvas size: use the largest dimensions with some padding
-    canvas_w = max_w + 20
-    canvas_h = max_h + 20
 
-    print(f'\nNormalizing to canvas {canvas_w}x{canvas_h}, max content {max_w}x{max_h}')
+def frame_paths(sprite_dir=SPRITE_DIR, prefix='hero_', names=None):
+    """PNG paths of a frame group: the given names, or every {prefix}*.png that isn't a raw."""
+    sprite_dir = Path(sprite_dir)
+    if names:
+        return [sprite_dir / f'{name}.png' for name in names]
+    return sorted(p for p in sprite_dir.glob(f'{prefix}*.png') if not p.stem.endswith('_raw'))
 
-    for f, bbox in bboxes.items():
-        img = images[f]
-        # Crop to content
-        cropped = img.crop(bbox)
-        content_w, content_h = cropped.size
 
-        # Scale proportionally so height matches max_h
-        if content_h < max_h:
-            scale = max_h / content_h
-            new_w = int(content_w * scale)
-            new_h = max_h
-            cropped = cropped.resize((new_w, new_h), Image.LANCZOS)
-        else:
-            new_w, new_h = content_w, content_h
+def normalize_group(paths, padding=PADDING):
+    """Normalize the frames at `paths` in place. Returns the canvas size, or None."""
+    from PIL import Image
 
-        # Create new canvas and paste bottom-aligned, horizontally centered
-        result = Image.new('RGBA', (canvas_w, canvas_h), (0, 0, 0, 0))
-        paste_x = (canvas_w - new_w) // 2
-        paste_y = canvas_h - new_h  # bottom-align
-        result.paste(cropped, (paste_x, paste_y))
+    from hitboxes import write_combined, write_sidecar
+    from sprite_ops import normalize_frames
 
-        result.save(f)
-        print(f'  Saved {os.path.basename(f)}: {new_w}x{new_h} on {canvas_w}x{canvas_h} canvas')
+    if not paths:
+        print('No sprite files found.')
+        return None
+
+    print(f'Found {len(paths)} sprites:')
+    for p in paths:
+        print(f'  {p.name}')
+
+    images = {p: Image.open(p).convert('RGBA') for p in paths}
+    placed, (canvas_w, canvas_h) = normalize_frames(images, padding)
+    for p in paths:
+        if p not in placed:
+            print(f'  {p.name}: empty/fully transparent, skipping')
+    if not placed:
+        print('No content found in any sprites.')
+        return None
+
+    print(f'\nNormalizing to canvas {canvas_w}x{canvas_h}')
+    for p, (canvas, y_offset) in placed.items():
+        canvas.save(p)
+        write_sidecar(canvas, p)
+        print(f'  Saved {p.name}: content from y={y_offset} on {canvas_w}x{canvas_h} canvas')
+    sprite_dir = p.parent
+    aliases = read_aliases()
+    write_combined(sprite_dir, aliases)
+    if sprite_dir.resolve() == SPRITE_DIR.resolve():
+        # The build manifest and the atlas describe assets/sprites/, not copies elsewhere
+        from build_manifest import BuildManifest
+        from pack_atlas import ATLAS_DIR, build_atlas
+
+        BuildManifest().invalidate(path.stem for path in placed)
+        build_atlas(sprite_dir, aliases=aliases)
+        print(f'Repacked the atlas in {ATLAS_DIR}; the build manifest marks these frames '
+              f'as edited, so the next regenerate_sprites.py run rebuilds them')
+    return canvas_w, canvas_h
+
+
+def normalize_heroes(sprite_dir=SPRITE_DIR, prefix='hero_', padding=PADDING):
+    """Normalize every {prefix}*.png in `sprite_dir` (the hero frames by default)."""
+    size = normalize_group(frame_paths(sprite_dir, prefix), padding)
+    if size:
+        print('\nDone! All frames normalized.')
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Normalize a group of animation frames.')
+    parser.add_argument('names', nargs='*', help='sprite names (default: every --prefix*.png)')
+    parser.add_argument('--prefix', default='hero_', help='frame group prefix (default hero_)')
+    parser.add_argument('--padding', type=int, default=PADDING,
+                        help=f'extra canvas px beyond the largest frame (default {PADDING})')
+    parser.add_argument('--dir', default=str(SPRITE_DIR), help='sprite directory')
+    args = parser.parse_args()
+
+    if normalize_group(frame_paths(args.dir, args.prefix, args.names), args.padding):
+        print('\nDone! All frames normalized.')
 
-    print('\nDone! All hero sprites normalized.')
 
 if __name__ == '__main__':
-    normalize_heroes()
+    main()
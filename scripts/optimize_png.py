@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Lossless PNG recompression
+
+The shipped sprites are written with default img.save() settings. This stage
+re-encodes each PNG many ways and keeps the smallest one that decodes to the
+exact same RGBA pixels:
+- color type / bit depth reductions: RGBA, RGB (opaque), gray(+alpha), and
+  palette with tRNS at 8/4/2/1 bits when there are few enough colors
+- PNG row filters: None, Sub, Up, Average, Paeth, and per-row adaptive
+  (minimum sum of absolute differences)
+- zlib compression levels and strategies (default, filtered, RLE)
+- Pillow's own optimize=True encoding, as a baseline candidate
+
+Trials run in a process pool; each worker re-reads its PNG from disk so only
+paths and encoded bytes cross process boundaries.
+
+Usage:
+    python scripts/optimize_png.py                 # optimize assets/sprites/*.png in place
+    python scripts/optimize_png.py --dry-run       # just report savings
+    python scripts/optimize_png.py --jobs 4 path/to/a.png path/to/b.png
+"""
+
+import argparse
+import io
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+SPRITE_DIR = Path(__file__).parent.parent / "assets" / "sprites"
+
+FILTERS = ["none", "sub", "up", "average", "paeth", "adaptive"]
+STRATEGIES = {
+    "default": zlib.Z_DEFAULT_STRATEGY,
+    "filtered": zlib.Z_FILTERED,
+    "rle": zlib.Z_RLE,
+}
+DEFAULT_LEVELS = (6, 9)
+
+
+# ============================================================
+# COLOR TYPE REDUCTIONS
+# ============================================================
+
+def load_rgba(path):
+    return np.asarray(Image.open(path).convert("RGBA"))
+
+
+def reductions(rgba):
+    """Lossless encodings of an RGBA array.
+
+    Returns {label: (color_type, bit_depth, rows, bpp, plte, trns)} where rows is
+    an (h, row_bytes) uint8 array of unfiltered scanlines.
+    """
+    h, w = rgba.shape[:2]
+    opaque = bool((rgba[..., 3] == 255).all())
+    gray = bool((rgba[..., 0] == rgba[..., 1]).all() and (rgba[..., 1] == rgba[..., 2]).all())
+
+    result = {"rgba": (6, 8, rgba.reshape(h, w * 4), 4, None, None)}
+    if opaque:
+        result["rgb"] = (2, 8, np.ascontiguousarray(rgba[..., :3]).reshape(h, w * 3), 3, None, None)
+    if gray:
+        if opaque:
+            result["gray"] = (0, 8, np.ascontiguousarray(rgba[..., 0]), 1, None, None)
+        else:
+            result["gray_alpha"] = (4, 8, np.ascontiguousarray(rgba[..., [0, 3]]).reshape(h, w * 2),
+                                    2, None, None)
+
+    packed = rgba.reshape(-1, 4).view(np.uint32).ravel()
+    colors, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+    if len(colors) <= 256:
+        # Translucent entries first (so tRNS stays short), then most frequent
+        alpha = colors.view(np.uint8).reshape(-1, 4)[:, 3]
+        order = np.lexsort((-counts, alpha == 255))
+        remap = np.empty(len(colors), dtype=np.uint8)
+        remap[order] = np.arange(len(colors), dtype=np.uint8)
+        index = remap[inverse].reshape(h, w)
+        entries = colors[order].view(np.uint8).reshape(-1, 4)
+        plte = entries[:, :3].tobytes()
+        n_trns = int((entries[:, 3] < 255).sum())
+        trns = entries[:n_trns, 3].tobytes() if n_trns else None
+
+        depth = 8
+        for d in (1, 2, 4):
+            if len(colors) <= 1 << d:
+                depth = d
+                break
+        result[f"palette{depth}"] = (3, depth, pack_bits(index, depth), 1, plte, trns)
+    return result
+
+
+def pack_bits(index, depth):
+    """Pack an (h, w) array of small palette indices into `depth`-bit scanlines."""
+    if depth == 8:
+        return index
+    h, w = index.shape
+    bits = np.unpackbits(index[..., None], axis=2)[..., 8 - depth:]
+    return np.packbits(bits.reshape(h, w * depth), axis=1)
+
+
+# ============================================================
+# FILTERING AND ENCODING
+# ============================================================
+
+def filter_rows(rows, bpp, method):
+    """Apply a PNG filter to every scanline. Returns bytes with per-row filter type prefixes."""
+    x = rows.astype(np.int16)
+    a = np.zeros_like(x)
+    a[:, bpp:] = x[:, :-bpp]
+    b = np.zeros_like(x)
+    b[1:] = x[:-1]
+    c = np.zeros_like(x)
+    c[1:, bpp:] = x[:-1, :-bpp]
+
+    p = a + b - c
+    pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+    paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+    candidates = [x, x - a, x - b, x - (a + b) // 2, x - paeth]
+    filtered = np.stack([(f & 0xFF).astype(np.uint8) for f in candidates])
+
+    if method == "adaptive":
+        cost = np.abs(filtered.view(np.int8).astype(np.int32)).sum(axis=2)
+        types = cost.argmin(axis=0).astype(np.uint8)
+    else:
+        types = np.full(len(rows), FILTERS.index(method), dtype=np.uint8)
+
+    chosen = filtered[types, np.arange(len(rows))]
+    return np.concatenate([types[:, None], chosen], axis=1).tobytes()
+
+
+def chunk(kind, data):
+    return (struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def write_png(width, height, color_type, bit_depth, idat, plte=None, trns=None):
+    out = b"\x89PNG\r\n\x1a\n"
+    out += chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0))
+    if plte:
+        out += chunk(b"PLTE", plte)
+    if trns:
+        out += chunk(b"tRNS", trns)
+    out += chunk(b"IDAT", idat)
+    out += chunk(b"IEND", b"")
+    return out
+
+
+def run_trials(path, label, method, levels):
+    """Worker: encode one (reduction, filter) pair at every level and strategy.
+
+    Returns (size, description, png_bytes) of the smallest pixel-identical result.
+    """
+    rgba = load_rgba(path)
+    h, w = rgba.shape[:2]
+    if label == "pillow":
+        buf = io.BytesIO()
+        Image.fromarray(rgba, "RGBA").save(buf, "PNG", optimize=True)
+        data = buf.getvalue()
+        return len(data), "pillow optimize", data
+
+    color_type, depth, rows, bpp, plte, trns = reductions(rgba)[label]
+    raw = filter_rows(rows, bpp, method)
+    best = None
+    for level in levels:
+        for sname, strategy in STRATEGIES.items():
+            comp = zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+            data = write_png(w, h, color_type, depth, comp.compress(raw) + comp.flush(), plte, trns)
+            if best is None or len(data) < best[0]:
+                best = (len(data), f"{label} {method} z{level} {sname}", data)
+
+    decoded = np.asarray(Image.open(io.BytesIO(best[2])).convert("RGBA"))
+    if not np.array_equal(decoded, rgba):
+        return None
+    return best
+
+
+# ============================================================
+# DRIVER
+# ============================================================
+
+def submit_trials(path, pool, levels=DEFAULT_LEVELS):
+    """Queue every encoding trial of one PNG on `pool`. Returns the futures."""
+    labels = list(reductions(load_rgba(path)))
+    tasks = [("pillow", None)] + [(lbl, m) for lbl in labels for m in FILTERS]
+    return [pool.submit(run_trials, str(path), lbl, m, levels) for lbl, m in tasks]
+
+
+def keep_smallest(path, futures, dry_run=False):
+    """Wait for a PNG's trials and write the smallest if it beats the file. Returns a report row."""
+    old = path.stat().st_size
+    results = [r for r in (f.result() for f in futures) if r is not None]
+    size, desc, data = min(results, key=lambda r: r[0])
+    if size < old:
+        if not dry_run:
+            tmp = path.with_suffix(".png.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+    else:
+        size, desc = old, "kept original"
+    return path, old, size, desc
+
+
+def optimize_file(path, pool, levels=DEFAULT_LEVELS, dry_run=False):
+    """Recompress one PNG using trials on a caller's process pool. Returns (path, old, new, description)."""
+    return keep_smallest(path, submit_trials(path, pool, levels), dry_run)
+
+
+def optimize_all(paths, jobs=None, levels=DEFAULT_LEVELS, dry_run=False):
+    """Find the smallest lossless encoding of every PNG. Returns [(path, old, new, description)]."""
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {path: submit_trials(path, pool, levels) for path in paths}
+        return [keep_smallest(path, futs, dry_run) for path, futs in futures.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Losslessly recompress sprite PNGs.")
+    parser.add_argument("paths", nargs="*", help="PNG files (default: assets/sprites/*.png)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--levels", default=",".join(map(str, DEFAULT_LEVELS)),
+                        help="comma-separated zlib levels to try (default 6,9)")
+    parser.add_argument("--dry-run", action="store_true", help="report savings without writing")
+    args = parser.parse_args()
+
+    paths = [Path(p) for p in args.paths] or sorted(
+        p for p in SPRITE_DIR.glob("*.png") if not p.stem.endswith("_raw"))
+    levels = tuple(int(level) for level in args.levels.split(","))
+
+    print("=" * 60)
+    print("PNG RECOMPRESSION" + (" (dry run)" if args.dry_run else ""))
+    print("=" * 60)
+
+    report = optimize_all(paths, args.jobs, levels, args.dry_run)
+    total_old = total_new = 0
+    for path, old, new, desc in report:
+        total_old += old
+        total_new += new
+        print(f"  {path.name:24s} {old / 1024:8.1f} KB -> {new / 1024:8.1f} KB  "
+              f"(-{(old - new) / 1024:6.1f} KB)  {desc}")
+    print(f"\n  Total: {total_old / 1024:.1f} KB -> {total_new / 1024:.1f} KB, "
+          f"saved {(total_old - total_new) / 1024:.1f} KB "
+          f"({(1 - total_new / total_old) * 100 if total_old else 0:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
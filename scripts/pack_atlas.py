@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Texture atlas packer
+
+Packs the keyed sprites in assets/sprites/ into one or a few power-of-two
+sheets with a MaxRects (best short side fit) packer, and writes Phaser 3
+multiatlas JSON alongside them:
+1. Load every sprite (skipping *_raw.png), optionally trimming transparent
+   margins (the original size and offset are kept in the JSON, so frames
+   render exactly like the loose PNGs)
+2. Pack largest-first into the smallest power-of-two sheet that fits,
+   spilling onto further sheets when one would exceed --max-size
+3. Pad between frames and extrude edge pixels outward to avoid bleeding
+4. Save {name}-0.png, {name}-1.png, ... and {name}.json
+
+Sprites aliased in assets/asset_manifest.json (see asset_manifest.py) are
+packed once: the alias gets its own frame entry pointing at the same rect.
+
+BootScene loads the atlas with
+    this.load.multiatlas('sprites', 'assets/atlas/sprites.json', 'assets/atlas');
+and registers every frame under its sprite's name as a texture sharing the
+sheet, so scenes keep drawing e.g. this.add.sprite(x, y, 'goblin'). The
+loose PNGs are only loaded when there is no atlas. regenerate_sprites.py
+repacks it after every rebuild.
+
+Usage:
+    python scripts/pack_atlas.py
+    python scripts/pack_atlas.py --max-size 1024 --padding 2 --extrude 1 --no-trim
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+from asset_manifest import read_aliases
+
+SPRITE_DIR = Path(__file__).parent.parent / "assets" / "sprites"
+ATLAS_DIR = Path(__file__).parent.parent / "assets" / "atlas"
+
+
+# ============================================================
+# MAXRECTS
+# ============================================================
+
+class MaxRectsBin:
+    """One sheet of the MaxRects packer: a list of maximal free rectangles."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.free = [(0, 0, width, height)]
+
+    def find(self, w, h):
+        """Best short side fit: the free spot that leaves the smallest leftover edge."""
+        best = None
+        best_score = None
+        for fx, fy, fw, fh in self.free:
+            if w <= fw and h <= fh:
+                score = (min(fw - w, fh - h), max(fw - w, fh - h))
+                if best_score is None or score < best_score:
+                    best, best_score = (fx, fy), score
+        return best
+
+    def place(self, x, y, w, h):
+        """Mark (x, y, w, h) as used, splitting and pruning the free list."""
+        new_free = []
+        for fx, fy, fw, fh in self.free:
+            if x >= fx + fw or x + w <= fx or y >= fy + fh or y + h <= fy:
+                new_free.append((fx, fy, fw, fh))
+                continue
+            if x > fx:
+                new_free.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                new_free.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                new_free.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                new_free.append((fx, y + h, fw, fy + fh - y - h))
+        self.free = [r for r in new_free if not any(
+            r is not o and _contains(o, r) for o in new_free)]
+        self.free = list(dict.fromkeys(self.free))
+
+    def insert(self, w, h):
+        spot = self.find(w, h)
+        if spot is not None:
+            self.place(spot[0], spot[1], w, h)
+        return spot
+
+
+def _contains(outer, inner):
+    ox, oy, ow, oh = outer
+    ix, iy, iw, ih = inner
+    return ox <= ix and oy <= iy and ix + iw <= ox + ow and iy + ih <= oy + oh and outer != inner
+
+
+def sheet_sizes(max_size):
+    """Power-of-two (w, h) candidates up to max_size, smallest area first."""
+    sides = []
+    s = 16
+    while s <= max_size:
+        sides.append(s)
+        s *= 2
+    sizes = [(w, h) for w in sides for h in sides if max(w, h) <= 2 * min(w, h)]
+    return sorted(sizes, key=lambda wh: (wh[0] * wh[1], max(wh)))
+
+
+def pack_sheet(items, w, h):
+    """Pack as many (name, cell_w, cell_h) items as fit into one w x h sheet.
+
+    Returns ({name: (x, y)}, True if every item fit).
+    """
+    bin_ = MaxRectsBin(w, h)
+    placed = {}
+    for name, cw, ch in items:
+        spot = bin_.insert(cw, ch)
+        if spot is not None:
+            placed[name] = spot
+    return placed, len(placed) == len(items)
+
+
+def pack(items, max_size):
+    """Split (name, cell_w, cell_h) items across as few power-of-two sheets as possible.
+
+    Returns a list of ((sheet_w, sheet_h), {name: (x, y)}).
+    """
+    items = sorted(items, key=lambda it: (max(it[1], it[2]), it[1] * it[2]), reverse=True)
+    for name, cw, ch in items:
+        if cw > max_size or ch > max_size:
+            raise ValueError(f"{name} ({cw}x{ch} with padding) does not fit a {max_size}px sheet")
+
+    sheets = []
+    remaining = items
+    while remaining:
+        area = sum(cw * ch for _, cw, ch in remaining)
+        for w, h in sheet_sizes(max_size):
+            if w * h < area:
+                continue
+            placed, ok = pack_sheet(remaining, w, h)
+            if ok:
+                break
+        else:
+            # Nothing holds all of them: fill a max-size sheet and carry the rest over
+            w = h = max_size
+            placed, _ = pack_sheet(remaining, w, h)
+        sheets.append(((w, h), placed))
+        remaining = [it for it in remaining if it[0] not in placed]
+    return sheets
+
+
+# ============================================================
+# SHEET RENDERING
+# ============================================================
+
+def extrude(img, amount):
+    """Repeat an image's outermost pixels `amount` px outward on every side."""
+    if amount <= 0:
+        return img
+    from PIL import Image
+
+    w, h = img.size
+    out = Image.new("RGBA", (w + 2 * amount, h + 2 * amount))
+    out.paste(img, (amount, amount))
+    # Stretch the edge rows, then the edge columns of the result (which fills the corners)
+    out.paste(img.crop((0, 0, w, 1)).resize((w, amount), Image.NEAREST), (amount, 0))
+    out.paste(img.crop((0, h - 1, w, h)).resize((w, amount), Image.NEAREST), (amount, h + amount))
+    full = h + 2 * amount
+    out.paste(out.crop((amount, 0, amount + 1, full)).resize((amount, full), Image.NEAREST), (0, 0))
+    out.paste(out.crop((amount + w - 1, 0, amount + w, full)).resize((amount, full), Image.NEAREST),
+              (amount + w, 0))
+    return out
+
+
+def load_sprites(sprite_dir, trim, skip=()):
+    """Return {name: (image, source_w, source_h, trim_x, trim_y)} for every keyed sprite."""
+    from PIL import Image
+
+    sprites = {}
+    for path in sorted(Path(sprite_dir).glob("*.png")):
+        if path.stem.endswith("_raw") or path.stem in skip:
+            continue
+        img = Image.open(path).convert("RGBA")
+        sw, sh = img.size
+        tx = ty = 0
+        if trim:
+            bbox = img.getchannel("A").getbbox()
+            if bbox and bbox != (0, 0, sw, sh):
+                tx, ty = bbox[0], bbox[1]
+                img = img.crop(bbox)
+        sprites[path.stem] = (img, sw, sh, tx, ty)
+    return sprites
+
+
+def build_atlas(sprite_dir=SPRITE_DIR, out_dir=ATLAS_DIR, name="sprites", max_size=2048,
+                padding=2, extrude_px=1, trim=True, aliases=None):
+    """Pack sprites and write the sheets plus Phaser multiatlas JSON. Returns the JSON dict.
+
+    `aliases` ({alias: sprite}) defaults to the asset manifest's.
+    """
+    from PIL import Image
+
+    if aliases is None:
+        aliases = read_aliases()
+    sprites = load_sprites(sprite_dir, trim, skip=aliases)
+    # Each cell holds the extruded frame followed by `padding` transparent px
+    border = 2 * extrude_px + padding
+    items = [(n, img.size[0] + border, img.size[1] + border) for n, (img, *_) in sprites.items()]
+    sheets = pack(items, max_size)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    textures = []
+    for index, ((sw, sh), placed) in enumerate(sheets):
+        sheet = Image.new("RGBA", (sw, sh), (0, 0, 0, 0))
+        frames = []
+        for frame_name, (cx, cy) in sorted(placed.items()):
+            img, src_w, src_h, tx, ty = sprites[frame_name]
+            sheet.paste(extrude(img, extrude_px), (cx, cy))
+            x, y = cx + extrude_px, cy + extrude_px
+            w, h = img.size
+            frame = {
+                "rotated": False,
+                "trimmed": (w, h) != (src_w, src_h),
+                "sourceSize": {"w": src_w, "h": src_h},
+                "spriteSourceSize": {"x": tx, "y": ty, "w": w, "h": h},
+                "frame": {"x": x, "y": y, "w": w, "h": h},
+            }
+            for alias in [frame_name] + sorted(a for a, t in aliases.items() if t == frame_name):
+                frames.append(dict(filename=alias, **frame))
+        image_name = f"{name}-{index}.png"
+        sheet.save(str(out_dir / image_name), optimize=True)
+        textures.append({
+            "image": image_name,
+            "format": "RGBA8888",
+            "size": {"w": sw, "h": sh},
+            "scale": 1,
+            "frames": frames,
+        })
+
+    atlas = {
+        "textures": textures,
+        "meta": {"app": "tangled-tower/pack_atlas.py", "version": "1.0"},
+    }
+    (out_dir / f"{name}.json").write_text(json.dumps(atlas, indent=2) + "\n")
+    return atlas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack keyed sprites into Phaser multiatlas sheets.")
+    parser.add_argument("--sprites", default=str(SPRITE_DIR), help="directory of keyed PNGs")
+    parser.add_argument("--out", default=str(ATLAS_DIR), help="output directory")
+    parser.add_argument("--name", default="sprites", help="atlas base name")
+    parser.add_argument("--max-size", type=int, default=2048, help="largest sheet side (power of two)")
+    parser.add_argument("--padding", type=int, default=2, help="transparent px between frames")
+    parser.add_argument("--extrude", type=int, default=1, help="px of edge extrusion per frame")
+    parser.add_argument("--no-trim", action="store_true", help="keep transparent margins")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("TEXTURE ATLAS")
+    print("=" * 60)
+
+    atlas = build_atlas(args.sprites, args.out, args.name, args.max_size,
+                        args.padding, args.extrude, not args.no_trim)
+    aliases = read_aliases()
+    for tex in atlas["textures"]:
+        used = sum(f["frame"]["w"] * f["frame"]["h"] for f in tex["frames"]
+                   if f["filename"] not in aliases)
+        size = tex["size"]["w"] * tex["size"]["h"]
+        print(f"  {tex['image']}: {tex['size']['w']}x{tex['size']['h']}, "
+              f"{len(tex['frames'])} frames, {used / size * 100:.0f}% filled")
+    print(f"  Wrote {Path(args.out) / (args.name + '.json')}")
+
+
+if __name__ == "__main__":
+    main()
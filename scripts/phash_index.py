@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Perceptual-hash index of raws and keyed outputs
+
+Every raw the pipeline receives and every sprite it writes gets two 64-bit
+perceptual hashes:
+- pHash: signs of the lowest 8x8 DCT coefficients of a 32x32 grayscale
+  copy against their median (overall shape and shading)
+- dHash: whether each pixel of a 9x8 grayscale copy is brighter than its
+  left neighbour (edges and gradients)
+Transparent pixels count as black, so a keyed sprite hashes by its
+silhouette rather than by whatever color its cleared pixels kept. Two
+images are near-duplicates when both hashes differ in at most NEAR_BITS
+bits.
+
+Hashes are kept in .phash_index/index.jsonl, one JSON line per image:
+    {"kind", "name", "ref", "phash", "dhash", "width", "height", "created", ...}
+`kind` is "raw" or "output", and `ref` is what identifies the image
+elsewhere: a raw's sha256 in the raw archive, or an output's
+build_manifest.pixel_hash. Lookups XOR the query against packed uint64
+arrays of every hash and popcount the result in one vectorized pass, so a
+query costs microseconds even with thousands of entries.
+
+regenerate_sprites.py uses the index to:
+- flag wasted API calls: a freshly generated raw that is a near-duplicate
+  of one already received for the same sprite, or of another candidate of
+  the same call
+- skip storing raws that repeat an archived one: the raw archive records
+  them as aliases of the earlier raw once the pixels confirm they are the
+  same up to encoder noise (see same_pixels)
+- alias identical outputs in assets/asset_manifest.json instead of
+  shipping copies (see asset_manifest.py)
+
+Usage:
+    python scripts/phash_index.py            # index archived raws and sprites, list near-duplicates
+    python scripts/phash_index.py --bits 10  # looser match
+"""
+
+import argparse
+import json
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+INDEX_DIR = Path(__file__).parent.parent / ".phash_index"
+NEAR_BITS = 4            # max differing bits (of 64, in both hashes) for a near-duplicate
+PIXEL_TOLERANCE = 2      # max |difference| per channel for a pixel to count as unchanged
+MAX_PIXEL_DIFF = 8       # no channel of any pixel may differ by more for raws to be the same
+CHANGED_FRACTION = 1e-4  # share of pixels that may differ by more than PIXEL_TOLERANCE
+HASH_SIZE = 8
+PHASH_SIZE = 32
+
+if hasattr(np, "bitwise_count"):
+    def popcount(arr):
+        return np.bitwise_count(arr)
+else:  # numpy < 2.0
+    _BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(arr):
+        return _BITS[arr.view(np.uint8)].reshape(*arr.shape, 8).sum(axis=-1)
+
+
+# ============================================================
+# HASHES
+# ============================================================
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def _gray(img, size):
+    """(h, w) float luminance of `img` shrunk to `size`, transparent pixels black."""
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA")
+    arr = np.asarray(img.resize(size, Image.BOX).convert("RGBA"), dtype=np.float64)
+    return (arr[..., :3] @ [0.299, 0.587, 0.114]) * (arr[..., 3] / 255)
+
+
+def _pack(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def phash(img):
+    low = (_DCT @ _gray(img, (PHASH_SIZE, PHASH_SIZE)) @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term is the mean brightness; leave it out of the threshold
+    return _pack(low > np.median(low.ravel()[1:]))
+
+
+def dhash(img):
+    gray = _gray(img, (HASH_SIZE + 1, HASH_SIZE))
+    return _pack(gray[:, 1:] > gray[:, :-1])
+
+
+def image_hashes(img):
+    """{"phash", "dhash"} of an image as 16-digit hex strings."""
+    return {"phash": f"{phash(img):016x}", "dhash": f"{dhash(img):016x}"}
+
+
+def same_pixels(a, b, tolerance=PIXEL_TOLERANCE, max_diff=MAX_PIXEL_DIFF,
+                changed=CHANGED_FRACTION):
+    """True if two images have one size and are the same up to encoder noise.
+
+    No channel of any pixel may differ by more than `max_diff`, and at most
+    a `changed` share of the pixels by more than `tolerance`. An average
+    would let a real edit through: 2% of a flat 1024x1024 raw changed by 50
+    averages about 1 per channel.
+    """
+    if a.size != b.size:
+        return False
+    diff = np.abs(np.asarray(a.convert("RGBA"), dtype=np.int16)
+                  - np.asarray(b.convert("RGBA"), dtype=np.int16)).max(axis=-1)
+    if int(diff.max()) > max_diff:
+        return False
+    return np.count_nonzero(diff > tolerance) <= changed * diff.size
+
+
+# ============================================================
+# INDEX
+# ============================================================
+
+class PerceptualIndex:
+    """Append-only index of image hashes, safe to share between threads and processes."""
+
+    def __init__(self, root=INDEX_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.path = self.root / "index.jsonl"
+        self.path.touch()
+        self.entries = []
+        self._by_ref = {}
+        self._phash = np.empty(0, dtype=np.uint64)
+        self._dhash = np.empty(0, dtype=np.uint64)
+        self._pos = 0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Load index lines appended since the last call (by any process). Returns how many."""
+        with self._lock:
+            with open(self.path, "rb") as f:
+                f.seek(self._pos)
+                chunk = f.read()
+            # A line still being written has no newline yet; leave it for next time
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            self._pos += len(complete)
+            new = [json.loads(line) for line in complete.splitlines()]
+            for entry in new:
+                self.entries.append(entry)
+                self._by_ref[(entry["kind"], entry["ref"])] = entry
+            if new:
+                self._phash = np.concatenate([
+                    self._phash, np.array([int(e["phash"], 16) for e in new], dtype=np.uint64)])
+                self._dhash = np.concatenate([
+                    self._dhash, np.array([int(e["dhash"], 16) for e in new], dtype=np.uint64)])
+            return len(new)
+
+    def get(self, kind, ref):
+        return self._by_ref.get((kind, ref))
+
+    def add(self, kind, name, img, ref, hashes=None, **extra):
+        """Index an image unless (kind, ref) already is. Returns its entry."""
+        existing = self.get(kind, ref)
+        if existing is not None:
+            return existing
+        entry = dict(kind=kind, name=name, ref=ref, **(hashes or image_hashes(img)),
+                     width=img.size[0], height=img.size[1], created=time.time(), **extra)
+        with open(self.path, "ab") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write((json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8"))
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        self.refresh()
+        return entry
+
+    def near(self, hashes, max_bits=NEAR_BITS, kind=None, name=None):
+        """Entries within `max_bits` of `hashes` in both pHash and dHash, closest first.
+
+        Returns [(bits, entry)], bits being the larger of the two distances.
+        """
+        with self._lock:
+            ph, dh, entries = self._phash, self._dhash, self.entries
+        if not len(ph):
+            return []
+        dist = np.maximum(popcount(ph ^ np.uint64(int(hashes["phash"], 16))),
+                          popcount(dh ^ np.uint64(int(hashes["dhash"], 16))))
+        found = []
+        for i in np.flatnonzero(dist <= max_bits):
+            entry = entries[i]
+            if (kind is None or entry["kind"] == kind) and (name is None or entry["name"] == name):
+                found.append((int(dist[i]), entry))
+        found.sort(key=lambda f: f[0])
+        return found
+
+    def groups(self, max_bits=NEAR_BITS, kind=None, refs=None):
+        """Clusters of near-duplicate entries, each entry in the first cluster it matches.
+
+        `refs` limits the search to entries with those refs (e.g. the current outputs).
+        """
+        def wanted(entry):
+            return (kind is None or entry["kind"] == kind) and (refs is None or entry["ref"] in refs)
+
+        seen = set()
+        clusters = []
+        for entry in self.entries:
+            if id(entry) in seen or not wanted(entry):
+                continue
+            seen.add(id(entry))
+            members = [e for _, e in self.near(entry, max_bits, kind)
+                       if id(e) not in seen and wanted(e)]
+            seen.update(id(e) for e in members)
+            if members:
+                clusters.append([entry] + members)
+        return clusters
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Index raws and sprites by perceptual hash.")
+    parser.add_argument("--bits", type=int, default=NEAR_BITS,
+                        help="max differing bits for a near-duplicate")
+    args = parser.parse_args()
+
+    from build_manifest import pixel_hash
+    from raw_archive import RawArchive
+    from regenerate_sprites import output_dir
+
+    index = PerceptualIndex()
+    archive = RawArchive()
+    before = len(index.entries)
+    for entry in archive.entries:
+        if index.get("raw", entry["sha256"]) is None:
+            index.add("raw", entry["name"], archive.image(entry), entry["sha256"],
+                      request=entry["request"], candidate=entry["candidate"])
+    current = set()
+    for path in sorted(output_dir.glob("*.png")):
+        if not path.stem.endswith("_raw"):
+            img = Image.open(path).convert("RGBA")
+            current.add(index.add("output", path.stem, img, pixel_hash(img))["ref"])
+    print(f"{len(index.entries)} images indexed in {index.path} "
+          f"({len(index.entries) - before} new)")
+
+    for kind, refs in (("raw", None), ("output", current)):
+        for cluster in index.groups(args.bits, kind, refs):
+            print(f"  Near-duplicate {kind}s: " + ", ".join(
+                f"{e['name']} ({e['ref'][:12]})" for e in cluster))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Pixel-grid detection and true-resolution resampling
+
+Imagen's "pixel art" is drawn on a logical grid where every art pixel is a
+block of many screen pixels, at a pitch that is rarely a whole number.
+resize_to_height then NEAREST-scales that by an arbitrary ratio, so block
+edges wobble and the file stays several times larger than the art.
+
+This stage recovers the grid and resamples onto it:
+1. Edge profile: summed color differences between neighbouring columns
+   (and rows), which peak at block boundaries
+2. Pitch and phase: a comb search over fractional pitches picks the
+   largest pitch whose boundaries line up with the edge peaks (the
+   fundamental: its divisors line up just as well, as their lines are a
+   superset)
+3. Majority vote: each logical cell samples its interior (away from
+   anti-aliased block edges), quantizes the samples, and keeps the mean
+   color of the most common bin
+
+Usage:
+    python scripts/pixel_grid.py assets/sprites/hero_run1.png ...   # report pitch
+    python scripts/pixel_grid.py --out /tmp/true_res assets/sprites/*.png
+"""
+
+import argparse
+import io
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+MIN_PITCH = 2.0
+MIN_CELLS = 8
+EDGE_THRESHOLD = 48
+# Peaks within this fraction of the strongest count as candidates for the grid
+SCORE_TOLERANCE = 0.85
+# Minimum alignment (0..1) for a grid to count as present
+MIN_ALIGNMENT = 0.4
+# Fraction of grid lines that must carry edges; a few stray spikes align with anything
+MIN_COVERAGE = 0.5
+# Art pixels are square: x and y pitch must agree within this fraction
+MAX_ASPECT_ERROR = 0.1
+
+
+# ============================================================
+# GRID ESTIMATION
+# ============================================================
+
+def edge_profile(arr, axis):
+    """Count of color steps across each boundary between neighbouring columns (axis=1) or rows (axis=0).
+
+    Steps below EDGE_THRESHOLD (summed over RGBA) are treated as noise, and so
+    is the noise floor every line sees (median plus a few median deviations).
+    """
+    px = arr.astype(np.int16)
+    # Premultiply so color noise under transparent pixels doesn't count as an edge
+    px[..., :3] = px[..., :3] * px[..., 3:4] // 255
+    steps = np.abs(np.diff(px, axis=axis)).sum(axis=2) > EDGE_THRESHOLD
+    counts = steps.sum(axis=1 - axis).astype(np.float64)
+    median = np.median(counts)
+    floor = median + 3 * np.median(np.abs(counts - median))
+    return np.maximum(counts - floor, 0)
+
+
+def alignment_at(profile, pitches):
+    """Fourier coefficient of the edge profile at frequency 1/pitch, per pitch, normalized.
+
+    A boundary at profile index i lies at position i + 1 (between pixels i and
+    i+1). The magnitude is 1.0 when every edge sits exactly on a grid line and
+    near 0 when edges ignore the grid; the angle gives the phase.
+    """
+    positions = np.arange(1, len(profile) + 1)
+    return np.exp(-2j * np.pi * positions[None, :] / pitches[:, None]) @ profile / profile.sum()
+
+
+def estimate_pitch(profile, max_pitch=None):
+    """Find (pitch, phase, alignment) of the periodic peaks in a 1-D edge profile."""
+    n = len(profile)
+    if n < 4 * MIN_PITCH or profile.sum() == 0:
+        return None
+    max_pitch = max_pitch or n / MIN_CELLS
+
+    # Coarse scan evenly in frequency (peaks are ~1/n wide there), then refine
+    freqs = np.arange(1 / max_pitch, 1 / MIN_PITCH, 1 / (4 * n))
+    strength = np.abs(alignment_at(profile, 1 / freqs))
+    peaks = np.flatnonzero((strength[1:-1] >= strength[:-2]) & (strength[1:-1] >= strength[2:])) + 1
+    if len(peaks) == 0:
+        return None
+    # Divisors of the true pitch line up with the edges as well as the pitch itself
+    # (their lines are a superset), so take the lowest-frequency strong peak
+    strong = peaks[strength[peaks] >= SCORE_TOLERANCE * strength[peaks].max()]
+    f = freqs[strong[0]]
+
+    fine = 1 / np.linspace(f - 1 / (4 * n), f + 1 / (4 * n), 41)
+    coeffs = alignment_at(profile, fine)
+    best = int(np.abs(coeffs).argmax())
+    pitch = fine[best]
+    phase = (-np.angle(coeffs[best]) / (2 * np.pi) * pitch) % pitch
+
+    lines = np.rint(np.arange(phase, n + 1, pitch)).astype(int) - 1
+    lines = lines[(lines >= 0) & (lines < n)]
+    if len(lines) == 0 or (profile[lines] > 0).mean() < MIN_COVERAGE:
+        return None
+    return float(pitch), float(phase), float(abs(coeffs[best]))
+
+
+def estimate_grid(img):
+    """Estimate the logical pixel grid of an RGBA image.
+
+    Returns (pitch_x, phase_x, pitch_y, phase_y, alignment), or None when no
+    clear grid is present. Art pixels are square, so both axes must agree
+    on the pitch; they then share the average.
+    """
+    arr = np.asarray(img.convert("RGBA"))
+    gx = estimate_pitch(edge_profile(arr, axis=1))
+    gy = estimate_pitch(edge_profile(arr, axis=0))
+    if gx is None or gy is None:
+        return None
+    alignment = min(gx[2], gy[2])
+    if alignment < MIN_ALIGNMENT:
+        return None
+    if abs(gx[0] - gy[0]) > MAX_ASPECT_ERROR * max(gx[0], gy[0]):
+        return None
+    pitch = (gx[0] + gy[0]) / 2
+    return pitch, gx[1], pitch, gy[1], alignment
+
+
+# ============================================================
+# RESAMPLING
+# ============================================================
+
+def cell_samples(origin, pitch, count, per_cell):
+    """Sample coordinates inside each of `count` cells, away from the cell edges."""
+    offsets = (np.arange(per_cell) + 0.5) / per_cell
+    # Keep samples in the middle 60% of the cell, where there is no anti-aliasing
+    offsets = 0.2 + 0.6 * offsets
+    starts = origin + np.arange(count) * pitch
+    return np.floor(starts[:, None] + offsets[None, :] * pitch).astype(int)
+
+
+def resample_to_grid(img, grid, quant_bits=4):
+    """Downsample to one pixel per logical cell by majority vote. Returns an RGBA image."""
+    arr = np.asarray(img.convert("RGBA"))
+    h, w = arr.shape[:2]
+    pitch_x, phase_x, pitch_y, phase_y = grid[:4]
+
+    # First cell is the one whose center lands at or just past the image edge
+    x0 = (phase_x + pitch_x / 2) % pitch_x - pitch_x / 2
+    y0 = (phase_y + pitch_y / 2) % pitch_y - pitch_y / 2
+    cols = int(np.floor((w - x0) / pitch_x - 0.5)) + 1
+    rows = int(np.floor((h - y0) / pitch_y - 0.5)) + 1
+    per = max(1, min(4, int(min(pitch_x, pitch_y) * 0.6)))
+
+    xs = np.clip(cell_samples(x0, pitch_x, cols, per), 0, w - 1)
+    ys = np.clip(cell_samples(y0, pitch_y, rows, per), 0, h - 1)
+    # (rows, cols, per*per, 4)
+    samples = arr[ys[:, None, :, None], xs[None, :, None, :]].reshape(rows, cols, per * per, 4)
+
+    shift = 8 - quant_bits
+    q = (samples >> shift).astype(np.uint32)
+    keys = (q[..., 0] << 24) | (q[..., 1] << 16) | (q[..., 2] << 8) | q[..., 3]
+    # Transparent samples all vote together, whatever their color channels hold
+    keys[samples[..., 3] < 128] = 0xFFFFFFFF
+    votes = (keys[..., :, None] == keys[..., None, :]).sum(axis=-1)
+    winner = keys[np.arange(rows)[:, None], np.arange(cols)[None, :], votes.argmax(axis=-1)]
+    members = keys == winner[..., None]
+
+    out = (samples * members[..., None]).sum(axis=2) / members.sum(axis=2)[..., None]
+    out = np.rint(out).astype(np.uint8)
+    out[winner == 0xFFFFFFFF] = 0
+    return Image.fromarray(out, "RGBA")
+
+
+def snap_to_grid(img):
+    """Return (logical_image, grid) for an image with a detectable pixel grid, else (img, None)."""
+    grid = estimate_grid(img)
+    if grid is None:
+        return img, None
+    return resample_to_grid(img, grid), grid
+
+
+# ============================================================
+# REPORT
+# ============================================================
+
+def png_size(img):
+    buf = io.BytesIO()
+    img.save(buf, "PNG", optimize=True)
+    return buf.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect pixel-art grids and resample to true resolution.")
+    parser.add_argument("paths", nargs="+", help="keyed sprite PNGs")
+    parser.add_argument("--out", help="write true-resolution PNGs into this directory")
+    args = parser.parse_args()
+
+    out_dir = Path(args.out) if args.out else None
+    if out_dir:
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    total_before = total_after = 0
+    for path in map(Path, args.paths):
+        img = Image.open(path).convert("RGBA")
+        logical, grid = snap_to_grid(img)
+        if grid is None:
+            print(f"  {path.name:24s} {img.size[0]}x{img.size[1]}  no clear pixel grid")
+            continue
+        before, after = png_size(img), png_size(logical)
+        total_before += before
+        total_after += after
+        print(f"  {path.name:24s} {img.size[0]}x{img.size[1]} -> {logical.size[0]}x{logical.size[1]}  "
+              f"pitch {grid[0]:.2f}x{grid[2]:.2f}  alignment {grid[4]:.2f}  "
+              f"{before / 1024:.1f} KB -> {after / 1024:.1f} KB")
+        if out_dir:
+            logical.save(str(out_dir / path.name))
+
+    if total_before:
+        print(f"\n  Total: {total_before / 1024:.1f} KB -> {total_after / 1024:.1f} KB "
+              f"({total_before / max(total_after, 1):.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Append-only, memory-mapped archive of raw Imagen generations
+
+Every raw the pipeline receives is stored once, decoded, as uncompressed
+RGBA in .raw_archive/raws.bin (each raw starts on a 64-byte boundary), with
+one JSON line per raw in .raw_archive/index.jsonl:
+    {"offset", "width", "height", "name", "request", "prompt", "candidate",
+     "created", "sha256"}
+`request` is the Imagen cache key of the call (model, prompt, config,
+backend), `prompt` a short hash of the full prompt text, and `sha256` the
+digest of the PNG bytes Imagen returned (what the build manifest records).
+A raw with the same pixels as an archived one, up to encoder noise (see
+phash_index.same_pixels), is not stored again: its entry points at the
+earlier pixels and names them in "same_as".
+
+Reads map raws.bin and hand out array views into it, so reprocessing a
+sprite never decodes a PNG and the pixels are not copied until a stage
+writes to them. Nothing is ever rewritten in place; entries for the same
+raw are not duplicated. Appends from several processes are serialized
+with a lock on the index where the OS supports it.
+
+The archive is capped in bytes like the response cache (which still holds
+every raw's PNG): compact() rewrites both files with only the raws to
+keep, and once a build leaves the archive over the cap
+regenerate_sprites.py compacts it to the raws of the requests the build
+manifest records (see in_manifest). Other processes
+notice the new files on their next refresh().
+
+Usage:
+    python scripts/raw_archive.py                      # list entries
+    python scripts/raw_archive.py --export goblin /tmp # newest goblin raw as PNG
+    python scripts/raw_archive.py --compact            # keep only the build manifest's requests
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+ARCHIVE_DIR = Path(__file__).parent.parent / ".raw_archive"
+ALIGN = 64
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def in_manifest(manifest_entries):
+    """compact() predicate keeping what build manifest entries use.
+
+    That is each sprite's raw plus every candidate of its current request,
+    so the next build still finds all of them here.
+    """
+    raws = {e.get("raw") for e in manifest_entries.values()}
+    requests = {e.get("request") for e in manifest_entries.values()}
+    return lambda entry: entry["sha256"] in raws or entry["request"] in requests
+
+
+class RawArchive:
+    """Append-only store of decoded raws, safe to share between threads."""
+
+    def __init__(self, root=ARCHIVE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.root / "raws.bin"
+        self.index_path = self.root / "index.jsonl"
+        self.data_path.touch()
+        self.index_path.touch()
+        self._lock = threading.Lock()
+        self._index_id = None
+        self._reset()
+        self.hits = 0
+        self.refresh()
+
+    def _reset(self):
+        self.entries = []
+        self._by_request = {}
+        self._by_sha = {}
+        self._index_pos = 0
+        self._map = None
+
+    # --- Index ---
+
+    def refresh(self):
+        """Load index lines appended since the last call (by any process). Returns how many."""
+        with self._lock:
+            st = os.stat(self.index_path)
+            if (st.st_dev, st.st_ino) != self._index_id:
+                # First load, or compacted since: the offsets we hold are stale
+                self._index_id = (st.st_dev, st.st_ino)
+                self._reset()
+            with open(self.index_path, "rb") as f:
+                f.seek(self._index_pos)
+                chunk = f.read()
+            # A line still being written has no newline yet; leave it for next time
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            self._index_pos += len(complete)
+            lines = complete.splitlines()
+            for line in lines:
+                entry = json.loads(line)
+                self.entries.append(entry)
+                self._by_request[(entry["request"], entry["candidate"])] = entry
+                self._by_sha[entry["sha256"]] = entry
+            return len(lines)
+
+    def find(self, request, candidate=0):
+        """Newest entry for a request's candidate, or None."""
+        return self._by_request.get((request, candidate))
+
+    def find_sha(self, sha256):
+        """Entry for the raw whose PNG bytes had this digest, or None."""
+        return self._by_sha.get(sha256)
+
+    def latest(self, name):
+        """Newest entry recorded for a sprite name, or None."""
+        for entry in reversed(self.entries):
+            if entry["name"] == name:
+                return entry
+        return None
+
+    def current(self, name, recorded=None):
+        """Entry of the raw a sprite was built from (`recorded`: the manifest's raw
+        digest), else its newest raw, or None."""
+        return (recorded and self.find_sha(recorded)) or self.latest(name)
+
+    # --- Data ---
+
+    def append(self, img, name, request, candidate=0, prompt="", sha256=None):
+        """Store a decoded raw unless the same raw is already archived. Returns its entry."""
+        sha256 = sha256 or img.info.get("raw_sha256") or hashlib.sha256(img.tobytes()).hexdigest()
+        existing = self.find_sha(sha256)
+        if existing is not None:
+            return existing
+        import numpy as np
+
+        arr = np.ascontiguousarray(np.asarray(img.convert("RGBA")))
+
+        def write(data):
+            end = data.seek(0, 2)
+            data.write(b"\0" * (-end % ALIGN))
+            offset = data.tell()
+            data.write(arr.data)
+            return {"offset": offset, "width": arr.shape[1], "height": arr.shape[0]}
+
+        return self._add(write, name, request, candidate, prompt, sha256)
+
+    def alias(self, same_as, name, request, candidate=0, prompt="", sha256=None):
+        """Record a raw as the archived entry `same_as` (same pixels), storing no pixels.
+
+        Reads of the new entry return `same_as`'s pixels. Returns the new entry.
+        """
+        existing = self.find_sha(sha256)
+        if existing is not None:
+            return existing
+
+        def write(data):
+            return {"offset": same_as["offset"], "width": same_as["width"],
+                    "height": same_as["height"], "same_as": same_as["sha256"]}
+
+        return self._add(write, name, request, candidate, prompt, sha256)
+
+    def _add(self, write, name, request, candidate, prompt, sha256):
+        """Append an index line, `write(data file)` giving its location fields, under the lock."""
+        with open(self.index_path, "ab") as index:
+            if fcntl:
+                fcntl.flock(index, fcntl.LOCK_EX)
+            try:
+                with open(self.data_path, "ab") as data:
+                    entry = write(data)
+                entry.update({
+                    "name": name,
+                    "request": request,
+                    "prompt": prompt_hash(prompt),
+                    "candidate": candidate,
+                    "created": time.time(),
+                    "sha256": sha256,
+                })
+                index.write((json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8"))
+            finally:
+                if fcntl:
+                    fcntl.flock(index, fcntl.LOCK_UN)
+        self.refresh()
+        return entry
+
+    def array(self, entry):
+        """Read-only (height, width, 4) uint8 view of an entry's pixels in the mapped file."""
+        import numpy as np
+
+        size = entry["width"] * entry["height"] * 4
+        with self._lock:
+            if self._map is None or entry["offset"] + size > len(self._map):
+                # The file grew since it was mapped; views into the old map stay valid
+                self._map = np.memmap(self.data_path, dtype=np.uint8, mode="r")
+            mapped = self._map
+            self.hits += 1
+        view = mapped[entry["offset"]:entry["offset"] + size]
+        return np.asarray(view).reshape(entry["height"], entry["width"], 4)
+
+    def image(self, entry):
+        """RGBA image sharing the mapped pixels (Pillow copies only if it is written to)."""
+        from PIL import Image
+
+        img = Image.frombuffer("RGBA", (entry["width"], entry["height"]), self.array(entry),
+                               "raw", "RGBA", 0, 1)
+        img.info["raw_sha256"] = entry["sha256"]
+        return img
+
+    def size(self):
+        return self.data_path.stat().st_size
+
+    def over_cap(self):
+        return self.size() > self.max_bytes
+
+    def compact(self, keep):
+        """Rewrite the archive with only the entries `keep(entry)` is true for. Returns bytes freed.
+
+        Entries recorded as the same as another raw keep that raw's pixels.
+        Run it while no build is appending: an append waiting on the old
+        index is lost (its raw is still in the response cache).
+        """
+        before = self.size()
+        with open(self.index_path, "ab") as index:
+            if fcntl:
+                fcntl.flock(index, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                kept = [e for e in self.entries if keep(e)]
+                if len(kept) == len(self.entries):
+                    return 0
+                needed = {e.get("same_as", e["sha256"]) for e in kept}
+                offsets = {}
+                data_tmp = self.data_path.with_suffix(".tmp")
+                index_tmp = self.index_path.with_suffix(".tmp")
+                with open(data_tmp, "wb") as data:
+                    for entry in self.entries:
+                        sha = entry["sha256"]
+                        if "same_as" in entry or sha not in needed or sha in offsets:
+                            continue
+                        if not offsets:
+                            import numpy as np
+
+                            src = np.memmap(self.data_path, dtype=np.uint8, mode="r")
+                        data.write(b"\0" * (-data.tell() % ALIGN))
+                        offsets[sha] = data.tell()
+                        start = entry["offset"]
+                        data.write(src[start:start + entry["width"] * entry["height"] * 4])
+                with open(index_tmp, "wb") as new_index:
+                    for entry in kept:
+                        entry = dict(entry, offset=offsets[entry.get("same_as", entry["sha256"])])
+                        new_index.write((json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8"))
+                os.replace(data_tmp, self.data_path)
+                os.replace(index_tmp, self.index_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(index, fcntl.LOCK_UN)
+        self.refresh()
+        return before - self.size()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the raw generation archive.")
+    parser.add_argument("--export", nargs=2, metavar=("NAME", "DIR"),
+                        help="write the newest raw for NAME to DIR/NAME_raw.png")
+    parser.add_argument("--compact", action="store_true",
+                        help="drop raws of requests the build manifest doesn't record "
+                             "(they stay in .imagen_cache/ while it holds them)")
+    args = parser.parse_args()
+
+    archive = RawArchive()
+    if args.compact:
+        from build_manifest import BuildManifest
+
+        freed = archive.compact(in_manifest(BuildManifest().entries))
+        print(f"  Kept {len(archive.entries)} raws, freed {freed / 1024 / 1024:.1f} MB")
+        return
+    if args.export:
+        name, out = args.export
+        entry = archive.latest(name)
+        if entry is None:
+            print(f"  No raws archived for {name}")
+            return
+        path = Path(out) / f"{name}_raw.png"
+        archive.image(entry).save(str(path))
+        print(f"  Wrote {path}")
+        return
+
+    print(f"{len(archive.entries)} raws, {archive.size() / 1024 / 1024:.1f} MB "
+          f"(cap {archive.max_bytes / 1024 / 1024:.0f} MB) in {archive.root}")
+    for entry in archive.entries:
+        stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["created"]))
+        same = f"  = {entry['same_as'][:12]}" if "same_as" in entry else ""
+        print(f"  {entry['request'][:12]}  #{entry['candidate']}  {stamp}  "
+              f"{entry['width']}x{entry['height']}  prompt {entry['prompt']}  {entry['name']}{same}")
+
+
+if __name__ == "__main__":
+    main()
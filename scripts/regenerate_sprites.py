@@ -6,144 +6,477 @@ Regenerates every game sprite via Gemini Imagen 4.0 with prompts that specify
 the target display size and emphasize chunky pixel art. After generation:
 1. Chroma-key background removal
 2. Crop to content bounding box
-3. Resize proportionally to target file height
-4. Save both {name}_raw.png and {name}.png
+3. Optionally snap to the art's logical pixel grid (--pixel-grid)
+4. Resize proportionally to target file height
+5. Save {name}.png, plus a {name}.hitbox.json sidecar with the collision
+   boxes and mask (see hitboxes.py); once every sprite is final the
+   sidecars are folded into hitboxes.json, which the game loads
 
 Hero sprites share an identical base description for consistency, then get
-placed on a uniform canvas (bottom-aligned) so all frames have the same
-dimensions.
+normalized in memory (sprite_ops.normalize_frames): content scaled to the
+tallest frame and placed on a uniform bottom-aligned canvas, so all frames
+have the same dimensions and no separate normalize_hero.py pass is needed.
+
+The build runs as a task graph (task_graph.py, see build_graph): each
+sprite's fetch, processing and optional recompression, the hero canvas,
+the asset manifest and the atlas repack each start as soon as
+their inputs exist, and when several are ready the one heading the longest
+remaining chain goes first. The run takes about as long as its longest
+chain (usually the hero group) rather than the sum of its parts.
+
+Usage:
+    python scripts/regenerate_sprites.py                   # one request at a time
+    python scripts/regenerate_sprites.py --concurrency 8   # overlap requests
+    python scripts/regenerate_sprites.py --force --jobs 0  # reprocess on every core
+    python scripts/regenerate_sprites.py --refresh goblin  # ignore cached goblin response
+    python scripts/regenerate_sprites.py --force           # ignore the build manifest
+    python scripts/regenerate_sprites.py --backend fake    # offline stand-in for Imagen
+    python scripts/regenerate_sprites.py --optimize        # recompress rebuilt PNGs
+    python scripts/regenerate_sprites.py --atlas           # repack assets/atlas/ even if up to date
+    python scripts/regenerate_sprites.py --pixel-grid snap # majority-vote onto the art grid
+    python scripts/regenerate_sprites.py --auto-key        # per-image keying tolerance
+    python scripts/regenerate_sprites.py --candidates 4    # best of 4 images per call
+    python scripts/regenerate_sprites.py --raw-png         # also write {name}_raw.png
+    python scripts/regenerate_sprites.py --force --trace build_trace.json --profile key
+
+Imagen calls go through imagen_client.ResilientBackend: a token bucket at
+--rpm (the project's quota), jittered exponential backoff on rate limits
+and server errors, and a circuit breaker that pauses the queue when errors
+spike. A summary of retries and latency percentiles ends each run,
+followed by wall/CPU time, bytes, pixels and memory per pipeline stage
+(instrument.py); --trace saves every stage span as a Chrome trace and
+--profile runs one stage under cProfile.
+
+With --jobs N, keying, cropping, resizing and saving run in N worker
+processes; decoded raws reach them through shared memory (shared_image.py)
+rather than pickling. Each sprite is processed the same way whichever
+worker gets it, so the outputs don't depend on N. Raws of 2048x2048 and
+up (HiDPI masters) are keyed tile by tile in shared memory instead, the
+tiles spread over the N workers (see tiled_key.py), with the same result.
+
+Imagen responses are cached in .imagen_cache/ keyed by model, prompt and
+config, so reruns after tweaking post-processing need no network. Decoded
+raws are also appended to .raw_archive/ (see raw_archive.py) and read back
+from there through a memory map, so reruns don't decode PNGs either; a
+build that leaves the archive over its cap compacts it to the raws of the
+current requests. Loose
+{name}_raw.png files are only written with --raw-png, for hand edits (which
+watch_sprites.py picks up).
+
+Raws and outputs are also indexed by perceptual hash (phash_index.py). A
+freshly generated raw that nearly duplicates an earlier raw of the same
+sprite is reported as a wasted call, a raw with the same pixels as an
+archived one is not stored again, and sprites with identical pixels
+(always hero_run and hero_run1) are listed as aliases in
+assets/asset_manifest.json, so the game downloads one copy (see
+asset_manifest.py).
+OTHER_SPRITES entries may set "key": "flood" to remove only background
+connected to the image border (see chroma_key.py), for sprites whose own
+colors come close to the chroma key. They may also pin "tolerance" and
+"fade"; with --auto-key, sprites that don't are keyed with values picked
+per image, which are logged so they can be pinned.
+
+With --candidates N (or a per-sprite "candidates"), each call asks for N
+images; all are keyed and scored in parallel (see sprite_score.py), the
+best is kept, and the runners-up are archived in assets/candidates/. A
+sprite may name a "reference" sprite whose palette candidates should
+match; hero frames use hero_run1.
+
+assets/build_manifest.json records what each output was built from, so a
+rerun only rebuilds sprites whose prompt, chroma, target height, raw image
+or post-processing code changed (plus the hero group they belong to).
+
+While tuning keying options or target heights, watch_sprites.py keeps a
+warm process that reprocesses sprites as their raws or specs here change.
 """
 
-import os
-import sys
+import argparse
+import hashlib
 import io
+import json
+import os
 import shutil
+import sys
+import time
 from pathlib import Path
 
-# Load API key from .env
-env_path = Path(__file__).parent.parent / ".env"
-if env_path.exists():
-    for line in env_path.read_text().splitlines():
-        if "=" in line and not line.startswith("#"):
-            key, val = line.strip().split("=", 1)
-            os.environ[key] = val
-
-api_key = os.environ.get("GEMINI_API_KEY")
-if not api_key:
-    print("ERROR: GEMINI_API_KEY not found in .env")
-    sys.exit(1)
+from asset_manifest import ASSET_MANIFEST_PATH, read_aliases, write_aliases
+from imagen_cache import ImagenCache, cache_key
 
-from google import genai
-from google.genai import types
-from PIL import Image
+# Everything else (Pillow, NumPy and the modules built on them, the backends,
+# instrument) is imported in the functions that use it, so --help and usage
+# errors return before any of it loads. The Imagen SDK itself only loads on
+# the first uncached call.
 
-client = genai.Client(api_key=api_key)
 output_dir = Path(__file__).parent.parent / "assets" / "sprites"
-output_dir.mkdir(parents=True, exist_ok=True)
+atlas_dir = output_dir.parent / "atlas"  # what the game loads (see pack_atlas.py)
+ARCHIVE_DIR = output_dir.parent / "candidates"
+# Opened by open_stores() (main() and watch_sprites.py call it), so importing
+# this module or running --help creates and reads nothing on disk
+cache = None
+manifest = None
+raw_store = None
+phash_index = None
+asset_manifest_path = ASSET_MANIFEST_PATH
+wasted_calls = []  # (name, candidate) of generated raws that duplicated earlier ones
+backend = None  # set by main(): a ResilientBackend around --backend / IMAGEN_BACKEND
+grid_mode = None  # set by main() from --pixel-grid: None, "snap" or "true"
+export_raws = False  # set by main() from --raw-png
+
+IMAGEN_MODEL = "imagen-4.0-generate-001"
+# Instrumented spans (see instrument.py), in pipeline order
+STAGES = ("cache", "generate", "decode", "hash", "archive", "score", "export", "key", "crop",
+          "grid", "resize", "save", "canvas", "alias", "optimize", "atlas")
+
+
+def open_stores():
+    """Open the response cache, build manifest, raw archive and hash index not set yet.
+
+    A caller may assign its own first (e.g. stores in a scratch directory).
+    """
+    from build_manifest import BuildManifest
+    from phash_index import PerceptualIndex
+    from raw_archive import RawArchive
+
+    global cache, manifest, raw_store, phash_index
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if cache is None:
+        cache = ImagenCache()
+    if manifest is None:
+        manifest = BuildManifest()
+    if raw_store is None:
+        raw_store = RawArchive()
+    if phash_index is None:
+        phash_index = PerceptualIndex()
 
 
 # ============================================================
-# UTILITIES
+# GENERATION
 # ============================================================
 
-def remove_background(img, tolerance=90):
-    """Remove background by global color match against corner-sampled color."""
-    img_rgba = img.convert("RGBA")
-    pixels = img_rgba.load()
-    w, h = img_rgba.size
-
-    corners = [(2, 2), (w - 3, 2), (2, h - 3), (w - 3, h - 3)]
-    bg_r = sum(pixels[x, y][0] for x, y in corners) // 4
-    bg_g = sum(pixels[x, y][1] for x, y in corners) // 4
-    bg_b = sum(pixels[x, y][2] for x, y in corners) // 4
-
-    removed = 0
-    for y in range(h):
-        for x in range(w):
-            r, g, b, a = pixels[x, y]
-            dist = ((r - bg_r) ** 2 + (g - bg_g) ** 2 + (b - bg_b) ** 2) ** 0.5
-            if dist < tolerance:
-                pixels[x, y] = (0, 0, 0, 0)
-                removed += 1
-            elif dist < tolerance + 30:
-                af = (dist - tolerance) / 30.0
-                pixels[x, y] = (r, g, b, int(a * max(0, min(1, af))))
-
-    return img_rgba, removed
-
-
-def crop_to_content(img):
-    """Crop image to its non-transparent content bounding box."""
-    bbox = img.getbbox()
-    if bbox:
-        return img.crop(bbox)
-    return img
+BG_SUFFIX = {
+    "green": (
+        "Solid bright green chroma key background (#00FF00). "
+        "IMPORTANT: Do not use any bright green or lime colors anywhere in the sprite itself."
+    ),
+    "magenta": (
+        "Solid bright magenta chroma key background (#FF00FF). "
+        "IMPORTANT: Do not use any pink, magenta, or purple colors anywhere in the sprite itself."
+    ),
+}
 
 
-def resize_to_height(img, target_height):
-    """Resize image proportionally so height == target_height."""
-    w, h = img.size
-    if h == 0:
-        return img
-    ratio = target_height / h
-    new_w = max(1, int(w * ratio))
-    return img.resize((new_w, target_height), Image.NEAREST)
+def request_key(prompt, chroma="magenta", candidates=1):
+    """Return (full_prompt, config, cache key) for one Imagen request."""
+    full_prompt = prompt + " " + BG_SUFFIX[chroma]
+    config = backend.config(number_of_images=candidates)
+    return full_prompt, config, cache_key(IMAGEN_MODEL, full_prompt, config, backend.name)
 
 
-def generate_and_save(prompt, name, chroma="magenta", target_height=128):
-    """Generate sprite, remove background, crop, resize, and save."""
-    bg_suffix = {
-        "green": (
-            "Solid bright green chroma key background (#00FF00). "
-            "IMPORTANT: Do not use any bright green or lime colors anywhere in the sprite itself."
-        ),
-        "magenta": (
-            "Solid bright magenta chroma key background (#FF00FF). "
-            "IMPORTANT: Do not use any pink, magenta, or purple colors anywhere in the sprite itself."
-        ),
-    }
+def candidate_key(key, index):
+    """Cache key of the index-th image of a response."""
+    return key if index == 0 else f"{key}-{index}"
+
+
+def request_images(prompt, name, chroma="magenta", target_height=128, refresh=False, candidates=1):
+    """Fetch `candidates` raws from the raw archive, the cache or a single Imagen call (network stage).
+
+    Returns the decoded raw images; an empty list on error. Archived raws are
+    read-only views of the archive's memory map.
+    """
+    from PIL import Image
+
+    from imagen_backend import BackendUnavailable
+    from instrument import stage
+    from phash_index import image_hashes
 
-    full_prompt = prompt + " " + bg_suffix[chroma]
-    print(f"\n  Generating: {name} ({chroma} chroma, target {target_height}px)...")
+    full_prompt, config, key = request_key(prompt, chroma, candidates)
+    keys = [candidate_key(key, i) for i in range(candidates)]
 
     try:
-        response = client.models.generate_images(
-            model="imagen-4.0-generate-001",
-            prompt=full_prompt,
-            config=types.GenerateImagesConfig(number_of_images=1),
-        )
+        entries = [raw_store.find(key, i) for i in range(candidates)]
+        if not refresh and None not in entries:
+            print(f"\n  Archived: {name} ({key[:12]})")
+            with stage("archive", name) as span:
+                images = [raw_store.image(e) for e in entries]
+                span["pixels"] = sum(img.size[0] * img.size[1] for img in images)
+            return images
+
+        blobs = None
+        generated = False
+        if not refresh:
+            with stage("cache", name) as span:
+                blobs = [cache.get(k) for k in keys]
+                span["bytes_in"] = sum(len(b) for b in blobs if b)
+        if blobs and all(b is not None for b in blobs):
+            print(f"\n  Cached: {name} ({key[:12]})")
+        else:
+            what = f"{candidates} candidates, " if candidates > 1 else ""
+            print(f"\n  Generating: {name} ({what}{chroma} chroma, target {target_height}px)...")
+            with stage("generate", name) as span:
+                response = backend.generate_images(
+                    model=IMAGEN_MODEL,
+                    prompt=full_prompt,
+                    config=config,
+                )
+                span["bytes_out"] = sum(len(g.image.image_bytes or b"")
+                                        for g in response.generated_images or [])
+
+            if not response.generated_images:
+                print(f"  ERROR: No images generated for {name}")
+                return []
+
+            generated = True
+            blobs = [g.image.image_bytes for g in response.generated_images[:candidates]]
+            for i, (k, data) in enumerate(zip(keys, blobs)):
+                cache.put(k, data, name=name, model=IMAGEN_MODEL, prompt=full_prompt, candidate=i)
+
+        images = []
+        for i, data in enumerate(blobs):
+            with stage("decode", name, bytes_in=len(data)) as span:
+                img = Image.open(io.BytesIO(data))
+                img.load()
+                img.info["raw_sha256"] = hashlib.sha256(data).hexdigest()
+                span["pixels"] = img.size[0] * img.size[1]
+            with stage("hash", name, pixels=img.size[0] * img.size[1]):
+                hashes = image_hashes(img)
+            if generated:
+                flag_wasted(name, i, hashes)
+            with stage("archive", name, bytes_out=img.size[0] * img.size[1] * 4):
+                img = archive_raw(img, hashes, name, key, i, full_prompt)
+            images.append(img)
+        return images
+
+    except BackendUnavailable:
+        # No SDK or API key: every uncached sprite would fail the same way
+        raise
+    except Exception as e:
+        print(f"  ERROR generating {name}: {e}")
+        return []
+
 
-        if not response.generated_images:
-            print(f"  ERROR: No images generated for {name}")
-            return None
+def flag_wasted(name, candidate, hashes):
+    """Report a freshly generated raw that nearly duplicates one received before for `name`.
 
-        img_data = response.generated_images[0].image.image_bytes
-        img = Image.open(io.BytesIO(img_data))
+    Earlier raws include the other candidates of the same call, which are
+    indexed as they are decoded. Raws of other sprites don't count: similar
+    sprites (hero frames, say) are requested separately on purpose.
+    """
+    found = phash_index.near(hashes, kind="raw", name=name)
+    if found:
+        bits, match = found[0]
+        wasted_calls.append((name, candidate))
+        print(f"  Wasted call: {name} #{candidate} is a near-duplicate of {match['name']} "
+              f"#{match.get('candidate', 0)} ({match['ref'][:12]}, {bits} bits apart)")
 
-        # Save raw
-        raw_path = output_dir / f"{name}_raw.png"
-        img.save(str(raw_path))
 
+def archive_raw(img, hashes, name, request, candidate, prompt):
+    """Archive a decoded raw and index its hashes. Returns the image to build from.
+
+    A raw whose pixels match an archived one up to encoder noise (found by
+    hash, confirmed by phash_index.same_pixels) is recorded as an alias of
+    it instead of being stored again, and the archived pixels are used, as
+    later runs will.
+    """
+    from phash_index import same_pixels
+
+    sha256 = img.info["raw_sha256"]
+    if raw_store.find_sha(sha256) is None:
+        for _, match in phash_index.near(hashes, kind="raw"):
+            earlier = raw_store.find_sha(match["ref"])
+            if earlier is not None and same_pixels(img, raw_store.image(earlier)):
+                entry = raw_store.alias(earlier, name, request, candidate, prompt, sha256)
+                phash_index.add("raw", name, img, sha256, hashes, request=request,
+                                candidate=candidate)
+                print(f"  {name} #{candidate}: same pixels as archived raw "
+                      f"{earlier['sha256'][:12]} ({earlier['name']}), not stored again")
+                return raw_store.image(entry)
+    raw_store.append(img, name, request, candidate, prompt)
+    phash_index.add("raw", name, img, sha256, hashes, request=request, candidate=candidate)
+    return img
+
+
+def choose_candidate(job, images):
+    """Return the best-scoring raw of `images`, archiving the runners-up.
+
+    Candidates are keyed with the job's key options and scored by
+    sprite_score; if the job names a reference sprite that exists on disk,
+    palette distance to it counts too. Runners-up and every score go to
+    assets/candidates/{name}/.
+    """
+    if len(images) == 1:
+        return images[0]
+    from PIL import Image
+
+    from instrument import stage
+    from sprite_score import format_scores, rank_candidates
+
+    reference = None
+    if job["reference"] and (output_dir / f"{job['reference']}.png").exists():
+        reference = Image.open(output_dir / f"{job['reference']}.png")
+
+    with stage("score", job["name"], pixels=sum(i.size[0] * i.size[1] for i in images)):
+        ranked = rank_candidates(images, job["key"], reference)
+
+    archive = ARCHIVE_DIR / job["name"]
+    shutil.rmtree(archive, ignore_errors=True)
+    archive.mkdir(parents=True)
+    for rank, (scores, index) in enumerate(ranked):
+        print(f"  {'Picked' if rank == 0 else 'Runner-up'} candidate {index}: {format_scores(scores)}")
+        if rank:
+            path = archive / f"{job['name']}_rank{rank + 1}_raw.png"
+            with stage("export", job["name"]) as span:
+                images[index].save(str(path))
+                span["bytes_out"] = path.stat().st_size
+    (archive / "scores.json").write_text(json.dumps([
+        dict(scores, candidate=index, raw=images[index].info.get("raw_sha256"))
+        for scores, index in ranked
+    ], indent=2) + "\n")
+    return images[ranked[0][1]]
+
+
+def postprocess(img, name, target_height, key, grid, out_dir, save_raw=False, procs=None):
+    """Remove background, crop, resize, and save a raw image's sprite (CPU stage).
+
+    Takes every setting as an argument so it can run in a worker process.
+    `save_raw=True` also writes the raw as {name}_raw.png (--raw-png).
+    Masters of TILED_MIN_PIXELS or more are keyed tile by tile (see
+    tiled_key.py), across the process pool `procs` if one is given.
+    Returns (sprite, log lines).
+    """
+    from chroma_key import AUTO, remove_background
+    from instrument import stage
+    from sprite_ops import crop_to_content, resize_to_height
+    from tiled_key import TILED_MIN_PIXELS, TiledImage
+
+    log = []
+    # Export raw for hand edits
+    if save_raw:
+        raw_path = out_dir / f"{name}_raw.png"
+        with stage("export", name) as span:
+            img.save(str(raw_path))
+            span["bytes_out"] = raw_path.stat().st_size
+
+    master = None
+    if img.size[0] * img.size[1] >= TILED_MIN_PIXELS:
+        master = TiledImage(img)
+    try:
         # Remove background
-        keyed_img, removed = remove_background(img)
+        with stage("key", name, pixels=img.size[0] * img.size[1]):
+            if master:
+                removed, chosen = master.key(procs=procs, **(key or {}))
+            else:
+                keyed_img, removed = remove_background(img, **(key or {}))
+                chosen = keyed_img.info["key"]
+        if key and key.get("tolerance") == AUTO:
+            log.append(f"  Auto key: {name} bg RGB{chosen['bg']}, "
+                       f"\"tolerance\": {chosen['tolerance']}, \"fade\": {chosen['fade']}")
+
+        # Crop to content (a master is only cropped for the grid pass; otherwise
+        # the resize reads its content box directly)
+        cropped = None
+        if not master:
+            with stage("crop", name, pixels=keyed_img.size[0] * keyed_img.size[1]):
+                cropped = crop_to_content(keyed_img)
+        elif grid:
+            with stage("crop", name, pixels=img.size[0] * img.size[1]):
+                cropped = master.crop()
+
+        # Snap to the logical pixel grid: "snap" rescales the clean grid to the
+        # target height, "true" keeps one file pixel per art pixel
+        grid_note = ""
+        if grid:
+            from pixel_grid import snap_to_grid
 
-        # Crop to content
-        cropped = crop_to_content(keyed_img)
+            with stage("grid", name, pixels=cropped.size[0] * cropped.size[1]):
+                logical, found = snap_to_grid(cropped)
+            if found:
+                cropped = logical
+                grid_note = f", grid pitch {found[0]:.2f}"
+        if grid == "true" and grid_note:
+            resized = cropped
+        else:
+            with stage("resize", name) as span:
+                if cropped is None:
+                    resized = master.resize_to_height(target_height)
+                else:
+                    resized = resize_to_height(cropped, target_height)
+                span["pixels"] = resized.size[0] * resized.size[1]
+    finally:
+        if master:
+            master.close()
 
-        # Resize to target height
-        resized = resize_to_height(cropped, target_height)
+    # Save final
+    save_sprite(resized, out_dir / f"{name}.png", name)
 
-        # Save final
-        final_path = output_dir / f"{name}.png"
-        resized.save(str(final_path))
+    tiled_note = f", keyed in {len(master.tiles)} tiles" if master else ""
+    log.append(f"  Saved: {name}.png ({resized.size[0]}x{resized.size[1]}, "
+               f"from {img.size[0]}x{img.size[1]}, {removed} bg pixels removed{grid_note}"
+               f"{tiled_note})")
+    return resized, log
 
-        print(f"  Saved: {name}.png ({resized.size[0]}x{resized.size[1]}, "
-              f"from {img.size[0]}x{img.size[1]}, {removed} bg pixels removed)")
-        return resized
 
+def save_sprite(img, path, name):
+    """Save a finished sprite and its hitbox sidecar."""
+    from hitboxes import sidecar_path, write_sidecar
+    from instrument import stage
+
+    with stage("save", name, pixels=img.size[0] * img.size[1]) as span:
+        img.save(str(path))
+        write_sidecar(img, path)
+        span["bytes_out"] = path.stat().st_size + sidecar_path(path).stat().st_size
+
+
+def postprocess_shared(handle, name, target_height, key, grid, out_dir, save_raw=False,
+                       profile_stage=None):
+    """postprocess() for a process pool worker, reading the raw from shared memory.
+
+    Returns (sprite, log lines, drained instrument spans).
+    """
+    from instrument import recorder
+    from shared_image import attached_image
+
+    recorder.profile_stage = profile_stage
+    with attached_image(handle) as img:
+        resized, log = postprocess(img, name, target_height, key, grid, out_dir, save_raw)
+    return resized, log, recorder.drain()
+
+
+def process_and_save(img, name, target_height=128, fingerprint=None, key=None, procs=None):
+    """Remove background, crop, resize, and save a raw image.
+
+    `key` holds remove_background keyword arguments (see key_options). If
+    `fingerprint` is given, the output is recorded in the build manifest.
+    With a process pool in `procs`, the work runs there, the raw going over
+    as a shared memory handle; the log and the small final sprite come back.
+    A large master is processed here instead, its tiles spread over the pool.
+    """
+    from instrument import recorder
+    from tiled_key import TILED_MIN_PIXELS
+
+    try:
+        if procs is None or img.size[0] * img.size[1] >= TILED_MIN_PIXELS:
+            # A master's tiles fan out over the pool rather than all going to one worker
+            resized, log = postprocess(img, name, target_height, key, grid_mode, output_dir,
+                                       export_raws, procs)
+        else:
+            from shared_image import release, share_image
+
+            shm, handle = share_image(img)
+            try:
+                resized, log, drained = procs.submit(
+                    postprocess_shared, handle, name, target_height, key, grid_mode,
+                    output_dir, export_raws, recorder.profile_stage).result()
+            finally:
+                release(shm)
+            recorder.absorb(drained)
     except Exception as e:
-        print(f"  ERROR generating {name}: {e}")
+        print(f"  ERROR processing {name}: {e}")
         return None
+    print("\n".join(log))
+    if fingerprint:
+        manifest.record(name, fingerprint, raw=img.info.get("raw_sha256"))
+    return resized
 
 
 # ============================================================
@@ -247,6 +580,7 @@ OTHER_SPRITES = [
         "name": "goblin",
         "target": 160,
         "chroma": "magenta",
+        "key": "flood",
         "prompt": (
             "A side-view pixel art sprite of a small goblin enemy for a 2D platformer game. "
             "16-bit retro style, clean pixel edges, bold black outline. "
@@ -508,60 +842,439 @@ OTHER_SPRITES = [
 ]
 
 
+# ============================================================
+# BUILD JOBS
+# ============================================================
+
+def key_options(spec, auto_key=False):
+    """remove_background keyword arguments for a sprite spec."""
+    from chroma_key import AUTO, DEFAULT_FADE, DEFAULT_TOLERANCE
+
+    return {
+        "mode": spec.get("key", "global"),
+        "tolerance": spec.get("tolerance", AUTO if auto_key else DEFAULT_TOLERANCE),
+        "fade": spec.get("fade", DEFAULT_FADE),
+    }
+
+
+def build_jobs(refresh=(), auto_key=False, candidates=1):
+    """Flatten HERO_SPRITES and OTHER_SPRITES into one list of generation jobs.
+
+    Names in `refresh` (or "all") bypass the response cache. With `auto_key`,
+    sprites without a pinned tolerance get one chosen per image. Sprites
+    without a pinned "candidates" count request `candidates` images per call.
+    """
+    refresh = set(refresh)
+    code = postprocess_version()
+    jobs = []
+    for hero in HERO_SPRITES:
+        jobs.append({
+            "name": hero["name"],
+            "prompt": HERO_BASE + hero["pose"] + " " + HERO_SCALE_HINT,
+            "chroma": "green",
+            "target": HERO_TARGET,
+            "key": key_options(hero, auto_key),
+            "candidates": hero.get("candidates", candidates),
+            # Later frames should match the first frame's palette
+            "reference": None if hero["name"] == "hero_run1" else "hero_run1",
+            "hero": True,
+            "refresh": "all" in refresh or hero["name"] in refresh,
+        })
+        jobs[-1]["fingerprint"] = fingerprint(jobs[-1], code)
+    for sprite in OTHER_SPRITES:
+        jobs.append({
+            "name": sprite["name"],
+            "prompt": sprite["prompt"],
+            "chroma": sprite["chroma"],
+            "target": sprite["target"],
+            "key": key_options(sprite, auto_key),
+            "candidates": sprite.get("candidates", candidates),
+            "reference": sprite.get("reference"),
+            "hero": False,
+            "refresh": "all" in refresh or sprite["name"] in refresh,
+        })
+        jobs[-1]["fingerprint"] = fingerprint(jobs[-1], code)
+    return jobs
+
+
+def postprocess_version():
+    """Hash of every piece of code between the raw image and the saved PNG."""
+    from build_manifest import source_version
+
+    return source_version("chroma_key", "sprite_ops", "pixel_grid", "sprite_score", "hitboxes",
+                          choose_candidate, postprocess, save_sprite, place_heroes)
+
+
+def fingerprint(job, code):
+    """Everything that determines a job's output PNG, except the raw pixels."""
+    return {
+        "request": request_key(job["prompt"], job["chroma"], job["candidates"])[2],
+        "chroma": job["chroma"],
+        "target": job["target"],
+        "key": job["key"],
+        "reference": job["reference"] if job["candidates"] > 1 else None,
+        "code": code,
+        "grid": grid_mode,
+    }
+
+
+def is_stale(job):
+    """True if a job's output is missing, built from other inputs, or its raw changed."""
+    from hitboxes import sidecar_path
+
+    if job["refresh"]:
+        return True
+    output = output_dir / f"{job['name']}.png"
+    if manifest.is_stale(job["name"], job["fingerprint"], output) or not sidecar_path(output).exists():
+        return True
+    recorded_raw = manifest.entries[job["name"]].get("raw")
+    request = job["fingerprint"]["request"]
+    current_raws = set()
+    for i in range(job["candidates"]):
+        entry = raw_store.find(request, i)
+        current_raws.add(entry["sha256"] if entry else cache.digest(candidate_key(request, i)))
+    return bool(recorded_raw and None not in current_raws and recorded_raw not in current_raws)
+
+
+def select_stale(jobs):
+    """Keep only stale jobs, plus their dependents.
+
+    The hero frames share one canvas sized to the largest frame, and hero_run is
+    an alias of hero_run1 in the asset manifest, so any stale hero (or a missing
+    alias or hitboxes.json, both written after the hero canvas) rebuilds the whole
+    hero group. Fresh hero frames come back from the response cache, so this
+    costs post-processing time, not API calls.
+    """
+    from hitboxes import COMBINED_NAME
+
+    stale = {job["name"] for job in jobs if is_stale(job)}
+    heroes = [job for job in jobs if job["hero"]]
+    alias_missing = (read_aliases(asset_manifest_path).get("hero_run") != "hero_run1"
+                     or not (output_dir / COMBINED_NAME).exists())
+    if alias_missing or any(job["name"] in stale for job in heroes):
+        stale.update(job["name"] for job in heroes)
+    return [job for job in jobs if job["name"] in stale]
+
+
+def place_heroes(hero_images):
+    """Normalize hero frames onto a uniform bottom-aligned canvas and save them."""
+    from instrument import stage
+    from sprite_ops import normalize_frames
+
+    # Post-process hero frames: matching content height, uniform canvas, bottom-aligned
+    if not hero_images:
+        return
+    print("\n  Post-processing hero frames: normalizing onto a uniform canvas...")
+    with stage("canvas", pixels=sum(i.size[0] * i.size[1] for i in hero_images.values())):
+        placed, (max_w, max_h) = normalize_frames(hero_images)
+    print(f"  Uniform canvas: {max_w}x{max_h}")
+
+    for name, (canvas, y_offset) in placed.items():
+        save_sprite(canvas, output_dir / f"{name}.png", name)
+        print(f"  Placed {name} on {max_w}x{max_h} canvas (offset y={y_offset})")
+
+
+def alias_outputs():
+    """Write the asset manifest's aliases and the combined hitboxes.json. Returns the aliases.
+
+    hero_run (the fallback key some scenes use) is an alias of hero_run1,
+    and any sprite whose pixels match an earlier one's in spec order is an
+    alias of it, so the game downloads each image once. A leftover
+    hero_run.png copy is deleted. Sprites that are only near-identical are
+    reported, as their prompts may need telling apart.
+    """
+    from PIL import Image
+
+    from build_manifest import pixel_hash
+    from hitboxes import sidecar_path, write_combined
+    from instrument import stage
+
+    aliases = {}
+    if (output_dir / "hero_run1.png").exists():
+        aliases["hero_run"] = "hero_run1"
+    first = {}
+    with stage("alias"):
+        for spec in HERO_SPRITES + OTHER_SPRITES:
+            path = output_dir / f"{spec['name']}.png"
+            if not path.exists():
+                continue
+            img = Image.open(path).convert("RGBA")
+            ref = phash_index.add("output", spec["name"], img, pixel_hash(img))["ref"]
+            if ref in first:
+                aliases[spec["name"]] = first[ref]
+            else:
+                first[ref] = spec["name"]
+        write_aliases(aliases, asset_manifest_path)
+
+    copy = output_dir / "hero_run.png"
+    if "hero_run" in aliases and copy.exists():
+        copy.unlink()
+        sidecar_path(copy).unlink(missing_ok=True)
+    write_combined(output_dir, aliases)
+    print(f"\n  Asset manifest: " + ", ".join(f"{a} -> {t}" for a, t in aliases.items()))
+    for cluster in phash_index.groups(kind="output", refs=set(first)):
+        print("  Near-identical sprites: " + ", ".join(e["name"] for e in cluster))
+    return aliases
+
+
+def repack_atlas():
+    """Repack atlas_dir from the current sprites and aliases (see pack_atlas.py). Returns its JSON."""
+    from instrument import stage
+    from pack_atlas import build_atlas
+
+    with stage("atlas"):
+        atlas = build_atlas(output_dir, atlas_dir, aliases=read_aliases(asset_manifest_path))
+    print(f"\n  Packed atlas: {len(atlas['textures'])} sheet(s) in {atlas_dir}")
+    return atlas
+
+
+# ============================================================
+# BUILD GRAPH
+# ============================================================
+
+# Rough costs in seconds, only used to rank tasks by the chain they lead
+API_COST = 8.0           # one uncached Imagen call
+LOAD_COST = 0.05         # an archived or cached raw
+PROCESS_COST = 1.0       # key, crop, resize and save one raw
+SCORE_COST = 0.5         # scoring each candidate
+OPTIMIZE_COST = 0.3      # recompressing a 128px sprite (grows with area)
+CANVAS_COST = 0.3
+ALIAS_COST = 0.1         # hashing every output
+ATLAS_COST = 1.0
+
+
+def fetch_cost(job):
+    request = job["fingerprint"]["request"]
+    stored = raw_store.find(request) or cache.digest(candidate_key(request, 0))
+    return LOAD_COST if stored and not job["refresh"] else API_COST
+
+
+def build_graph(jobs, procs=None, optimize_pool=None, atlas=False, report=None):
+    """Express a rebuild as a TaskGraph.
+
+    Per sprite: fetch (raws from the archive, the cache or Imagen) -> sprite
+    (pick a candidate, then key, crop, resize and save; one task, since the
+    chain has no fan-out and splitting it would only move full-size
+    intermediates between processes) -> optimize. The hero frames join in
+    canvas. A sprite whose candidates are scored against a reference waits
+    for that reference's final PNG (a hero frame for the frame pass, before
+    the canvas). alias (the asset manifest) waits for every PNG, and atlas
+    for alias.
+
+    `procs` runs sprite processing in worker processes; with an
+    `optimize_pool`, each rebuilt PNG is recompressed there and the
+    optimize_png report rows are appended to `report`.
+    """
+    from instrument import stage
+    from task_graph import TaskGraph
+
+    graph = TaskGraph()
+    names = {job["name"] for job in jobs}
+    heroes = [job for job in jobs if job["hero"]]
+    final = {job["name"]: f"sprite:{job['name']}" for job in jobs}
+    if heroes:
+        final.update({job["name"]: "canvas" for job in heroes})
+
+    for job in jobs:
+        name = job["name"]
+
+        def fetch(inputs, job=job):
+            return request_images(job["prompt"], job["name"], job["chroma"], job["target"],
+                                  job["refresh"], job["candidates"]) or None
+
+        def sprite(inputs, job=job):
+            img = choose_candidate(job, inputs[f"fetch:{job['name']}"])
+            return process_and_save(img, job["name"], job["target"], job["fingerprint"],
+                                    job["key"], procs)
+
+        deps = [graph.add(f"fetch:{name}", fetch, cost=fetch_cost(job), kind="fetch")]
+        ref = job["reference"]
+        if job["candidates"] > 1 and ref in names:
+            deps.append(f"sprite:{ref}" if job["hero"] and final[ref] == "canvas" else final[ref])
+        cost = PROCESS_COST + SCORE_COST * job["candidates"] * (job["candidates"] > 1)
+        graph.add(f"sprite:{name}", sprite, deps, cost=cost)
+
+    if heroes:
+        def canvas(inputs):
+            place_heroes({job["name"]: inputs[f"sprite:{job['name']}"] for job in heroes
+                          if inputs[f"sprite:{job['name']}"] is not None})
+            return True
+
+        graph.add("canvas", canvas, [f"sprite:{job['name']}" for job in heroes],
+                  cost=CANVAS_COST, partial=True)
+    graph.add("alias", lambda inputs: alias_outputs(), sorted(set(final.values())),
+              cost=ALIAS_COST, partial=True)
+
+    targets = {job["name"]: job["target"] for job in jobs}
+    if optimize_pool:
+        from optimize_png import optimize_file
+
+        for name, task in final.items():
+            def optimize_one(inputs, name=name):
+                path = output_dir / f"{name}.png"
+                if not path.exists():
+                    return None
+                with stage("optimize", name, bytes_in=path.stat().st_size) as span:
+                    row = optimize_file(path, optimize_pool)
+                    span["bytes_out"] = row[2]
+                report.append(row)
+                return row
+
+            graph.add(f"optimize:{name}", optimize_one, [task], kind="optimize",
+                      cost=OPTIMIZE_COST * (targets[name] / 128) ** 2)
+
+    if atlas:
+        graph.add("atlas", lambda inputs: repack_atlas(), ["alias"], cost=ATLAS_COST)
+    return graph
+
+
+def run_graph(jobs, concurrency=1, workers=1, optimize=False, atlas=False):
+    """Build every job through the task graph.
+
+    Up to `concurrency` fetches run at once. Sprites are processed `workers`
+    at a time, in worker processes when `workers` > 1 (otherwise in this
+    one, overlapping the fetches). Returns the optimize report rows.
+
+    Workers start from a forkserver (spawn where there is none), which
+    imports the main script again; a script that calls this must keep its
+    own work under `if __name__ == "__main__":`.
+    """
+    pool = None
+    if workers > 1 or optimize:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Shared by sprite processing (when workers > 1) and the PNG trials.
+        # Workers start on the first submit, from a graph thread; a fork then
+        # could copy a lock another thread holds (SharedMemory creation takes
+        # the resource tracker's), so they come from a clean forkserver.
+        methods = multiprocessing.get_all_start_methods()
+        method = "forkserver" if "forkserver" in methods else "spawn"
+        pool = ProcessPoolExecutor(max_workers=workers if workers > 1 else None,
+                                   mp_context=multiprocessing.get_context(method))
+    report = []
+    graph = build_graph(jobs, pool if workers > 1 else None, pool if optimize else None,
+                        atlas, report)
+    path, estimate = graph.critical_path()
+    print(f"\n--- {len(graph)} tasks: {len(jobs)} sprites, {concurrency} concurrent requests, "
+          f"{workers} post-processing {'workers' if workers > 1 else 'thread'} ---")
+    print(f"  Critical path (~{estimate:.0f}s estimated): {' -> '.join(path)}")
+    try:
+        graph.run({"fetch": concurrency, "cpu": workers, "optimize": max(workers, 2)})
+    finally:
+        if pool:
+            pool.shutdown()
+    return report
+
+
 # ============================================================
 # MAIN
 # ============================================================
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenerate all AI sprites at correct scale.")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Imagen requests in flight at once (default 1 = sequential)")
+    parser.add_argument("--refresh", nargs="+", default=[], metavar="NAME",
+                        help="bypass the response cache for these sprites (or 'all')")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                        help="post-process in N worker processes (0 = one per core; "
+                             "default 1 = in this process)")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild every sprite, even if the build manifest says it is fresh")
+    parser.add_argument("--backend", default=None,
+                        help="Imagen backend spec, e.g. 'fake:latency=2,fail=0.1' "
+                             "(default: IMAGEN_BACKEND or gemini)")
+    parser.add_argument("--optimize", action="store_true",
+                        help="losslessly recompress each rebuilt PNG once it is final "
+                             "(see optimize_png.py)")
+    parser.add_argument("--atlas", action="store_true",
+                        help="repack assets/atlas/ even if no sprite needs rebuilding (it is "
+                             "always repacked after a rebuild, as the game loads it)")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="Imagen calls per minute (default: IMAGEN_RPM, or 20 for gemini)")
+    parser.add_argument("--retries", type=int, default=None,
+                        help="retries per call on rate limits and server errors (default 4)")
+    parser.add_argument("--candidates", type=int, default=1, metavar="N",
+                        help="request N images per call and keep the best-scoring one "
+                             "(runners-up go to assets/candidates/)")
+    parser.add_argument("--auto-key", action="store_true",
+                        help="choose keying tolerance and fade per image for sprites "
+                             "that don't pin them (chosen values are logged)")
+    parser.add_argument("--pixel-grid", choices=["snap", "true"], default=None,
+                        help="resample onto the detected art grid: 'snap' keeps the target "
+                             "height, 'true' saves at the logical resolution (the game's "
+                             "display scales must then grow to match)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write a Chrome trace-event JSON of every stage span "
+                             "(open in chrome://tracing or ui.perfetto.dev)")
+    parser.add_argument("--profile", choices=STAGES, metavar="STAGE",
+                        help="run every span of STAGE under cProfile and print the hot spots "
+                             f"(one of: {', '.join(STAGES)})")
+    parser.add_argument("--raw-png", action="store_true",
+                        help="also write each rebuilt sprite's raw as {name}_raw.png for hand "
+                             "edits (raws are always kept in .raw_archive/)")
+    args = parser.parse_args(argv)
+
+    from imagen_backend import BackendUnavailable, create_backend
+    from imagen_client import ResilientBackend
+    from instrument import recorder
+    from raw_archive import in_manifest
+
     print("=" * 60)
     print("TANGLED TOWER - Regenerate ALL Sprites at Correct Scale")
     print("=" * 60)
 
-    # --- HERO SPRITES ---
-    print("\n--- HERO SPRITES (5 poses) ---")
-    hero_images = {}
-    for hero in HERO_SPRITES:
-        prompt = HERO_BASE + hero["pose"] + " " + HERO_SCALE_HINT
-        result = generate_and_save(prompt, hero["name"], chroma="green", target_height=HERO_TARGET)
-        if result:
-            hero_images[hero["name"]] = result
-
-    # Post-process hero frames: uniform canvas, bottom-aligned
-    if hero_images:
-        print("\n  Post-processing hero frames: uniform canvas...")
-        max_w = max(img.size[0] for img in hero_images.values())
-        max_h = max(img.size[1] for img in hero_images.values())
-        print(f"  Uniform canvas: {max_w}x{max_h}")
-
-        for name, img in hero_images.items():
-            canvas = Image.new("RGBA", (max_w, max_h), (0, 0, 0, 0))
-            # Bottom-align: place at bottom, centered horizontally
-            x_offset = (max_w - img.size[0]) // 2
-            y_offset = max_h - img.size[1]
-            canvas.paste(img, (x_offset, y_offset))
-            final_path = output_dir / f"{name}.png"
-            canvas.save(str(final_path))
-            print(f"  Placed {name} on {max_w}x{max_h} canvas (offset y={y_offset})")
-
-    # Copy hero_run1 -> hero_run
-    src = output_dir / "hero_run1.png"
-    dst = output_dir / "hero_run.png"
-    if src.exists():
-        shutil.copy2(str(src), str(dst))
-        print(f"\n  Copied hero_run1.png -> hero_run.png (fallback key)")
-
-    # --- ALL OTHER SPRITES ---
-    print("\n--- OTHER SPRITES ---")
-    for sprite in OTHER_SPRITES:
-        generate_and_save(
-            sprite["prompt"],
-            sprite["name"],
-            chroma=sprite["chroma"],
-            target_height=sprite["target"],
-        )
+    global backend, grid_mode, export_raws
+    open_stores()
+    backend = ResilientBackend(create_backend(args.backend), rpm=args.rpm, retries=args.retries)
+    grid_mode = args.pixel_grid
+    export_raws = args.raw_png
+    recorder.profile_stage = args.profile
+
+    t0 = time.perf_counter()
+    jobs = build_jobs(args.refresh, args.auto_key, args.candidates)
+    if not args.force:
+        total = len(jobs)
+        jobs = select_stale(jobs)
+        print(f"\n  Build manifest: {len(jobs)} of {total} sprites need rebuilding")
+
+    try:
+        if not jobs and not args.atlas:
+            print("  Everything is up to date.")
+        else:
+            # The game loads the atlas, so every rebuild repacks it
+            report = run_graph(jobs, args.concurrency, args.jobs or os.cpu_count(),
+                               args.optimize, atlas=True)
+            if report:
+                saved = sum(old - new for _, old, new, _ in report)
+                print(f"\n  Optimized {len(report)} PNGs, saved {saved / 1024:.1f} KB")
+    except BackendUnavailable as e:
+        print(f"\nERROR: {e} (needed for sprites that aren't in .imagen_cache/)")
+        sys.exit(1)
+
+    if raw_store.over_cap():
+        # Raws of old prompts can still be decoded from the response cache
+        freed = raw_store.compact(in_manifest(manifest.entries))
+        if freed:
+            print(f"\n  Raw archive over {raw_store.max_bytes / 1024 / 1024:.0f} MB: kept the "
+                  f"{len(raw_store.entries)} raws of current requests, "
+                  f"freed {freed / 1024 / 1024:.1f} MB")
 
+    backend.summary()
+    if wasted_calls:
+        print(f"  Wasted calls: {len(wasted_calls)} generated raws were near-duplicates "
+              f"({', '.join(f'{n} #{c}' for n, c in wasted_calls)})")
+    recorder.summary()
+    if args.trace:
+        recorder.write_trace(args.trace)
+        print(f"  Trace written to {args.trace}")
+    if args.profile:
+        recorder.report_profile(f"profile_{args.profile}.prof")
     print("\n" + "=" * 60)
-    print("REGENERATION COMPLETE — all sprites saved to assets/sprites/")
+    print(f"REGENERATION COMPLETE — all sprites saved to assets/sprites/ "
+          f"({time.perf_counter() - t0:.1f}s, {raw_store.hits} archived, {cache.hits} cached, "
+          f"{cache.stores} generated)")
     print("=" * 60)
 
 
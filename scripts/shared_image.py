@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Hand decoded images to worker processes through shared memory
+
+Submitting a decoded 1024x1024 raw to a process pool pickles its pixels and
+pushes them through a pipe, and re-encoding it as PNG would mean decoding it
+again on the far side. Instead the parent copies the pixels once into a
+SharedMemory block and sends only a small handle (block name, array shape,
+PIL mode); the worker maps the same pages.
+
+    shm, handle = share_image(img)         # parent
+    pool.submit(work, handle, ...)
+    ...                                    # once the worker is done:
+    release(shm)
+
+    with attached_image(handle) as img:    # worker
+        ...
+
+Work that must write into the shared pixels in place (tiled_key.py keys
+large masters tile by tile this way) uses shared_array() blocks instead,
+and runs through with_shared(), which maps them as arrays for one call.
+
+Run directly to check a round trip:
+    python scripts/shared_image.py assets/sprites/tower.png
+"""
+
+import argparse
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+
+def share_image(img):
+    """Copy an image's pixels into a new shared memory block. Returns (shm, handle)."""
+    if img.mode not in ("RGB", "RGBA", "L"):
+        img = img.convert("RGBA")
+    arr = np.asarray(img)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=np.uint8, buffer=shm.buf)[:] = arr
+    return shm, (shm.name, arr.shape, img.mode)
+
+
+def release(shm):
+    """Close and free a block created by share_image."""
+    shm.close()
+    shm.unlink()
+
+
+@contextmanager
+def attached_image(handle):
+    """Map a shared image (from share_image) as a PIL image for the duration of the block.
+
+    The image is a private copy (Pillow keeps its own pixel buffer), so it
+    stays valid after the block; the shared pages are only read once.
+    """
+    name, shape, mode = handle
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        arr = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        img = Image.fromarray(arr.copy(), mode)
+        del arr
+        yield img
+    finally:
+        shm.close()
+
+
+def shared_array(shape, dtype=np.uint8):
+    """A new shared memory block for an array (zeroed, as new blocks are). Returns (shm, handle)."""
+    dtype = np.dtype(dtype)
+    shape = tuple(int(n) for n in shape)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+    return shm, (shm.name, shape, dtype.str)
+
+
+def with_shared(fn, handles, *args):
+    """Call fn(*arrays, *args) with the blocks of `handles` (from shared_array)
+    mapped as writable arrays, and return its result.
+
+    The arrays are only valid during the call, so `fn` must return copies,
+    never views of them.
+    """
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in handles]
+    try:
+        return fn(*[np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                    for shm, (_, shape, dtype) in zip(blocks, handles)], *args)
+    finally:
+        for shm in blocks:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # an exception's traceback still holds views; the mapping goes with them
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Round-trip images through shared memory.")
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        img = Image.open(path)
+        shm, handle = share_image(img)
+        try:
+            with attached_image(handle) as back:
+                same = back.tobytes() == img.convert(back.mode).tobytes()
+        finally:
+            release(shm)
+        print(f"  {path}: {handle[1]} {handle[2]} {'ok' if same else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Split a keyed sprite sheet into frames by connected components
+
+Imagen rarely spaces the characters on a "sprite sheet" evenly, so cutting
+the sheet into equal columns clips capes and feet or picks up a neighbor's
+limb. Instead:
+1. Label the alpha mask into 4-connected components. Labels spread as the
+   minimum over whole horizontal and vertical runs, alternating, so it is
+   a few array passes rather than a per-pixel flood fill
+2. Components at least BODY_FRACTION the size of the largest are bodies;
+   if a frame count is given, the closest bodies merge (or the largest
+   fragments get promoted) until there are exactly that many
+3. Every other fragment (a detached sword, a cape tip, a spark) joins the
+   body whose bounding box is nearest; fragments far from every body, and
+   specks not right next to one, are dropped
+4. Each frame is cut from the union bounding box of its group, keeping only
+   that group's pixels, and frames are ordered left to right
+
+Usage:
+    python scripts/sheet_split.py assets/sprites/hero_run_sheet.png --frames 3 --out /tmp/frames
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ALPHA_MIN = 32          # fainter pixels (keying fringe) don't connect components
+BODY_FRACTION = 0.25
+MAX_GAP_FRACTION = 0.5  # fragments farther than this x body height from any body are noise
+SPECK_FRACTION = 0.002  # fragments this small (x largest area) must nearly touch a body
+SPECK_GAP = 4
+
+
+# ============================================================
+# LABELING
+# ============================================================
+
+def _run_ids(mask):
+    """Number the horizontal runs of a C-contiguous (h, w) bool mask 1..n (0 off-mask)."""
+    h, w = mask.shape
+    flat = mask.ravel()
+    starts = flat.copy()
+    starts[1:] &= ~flat[:-1]
+    starts[::w] = flat[::w]
+    return np.cumsum(starts) * flat, int(np.count_nonzero(starts))
+
+
+def label_components(mask):
+    """Label the 4-connected components of an (h, w) bool mask.
+
+    Returns (labels, n) where labels is an int32 (h, w) array, 0 off the mask
+    and 1..n on it.
+    """
+    h, w = mask.shape
+    row_ids, n_rows = _run_ids(np.ascontiguousarray(mask))
+    col_ids, n_cols = _run_ids(np.ascontiguousarray(mask.T))
+    col_ids = col_ids.reshape(w, h).T.ravel()
+
+    on = np.flatnonzero(row_ids)
+    rows, cols = row_ids[on], col_ids[on]
+    labels = rows.copy()
+    while True:
+        by_col = np.full(n_cols + 1, n_rows + 1, dtype=labels.dtype)
+        np.minimum.at(by_col, cols, labels)
+        spread = by_col[cols]
+        by_row = np.full(n_rows + 1, n_rows + 1, dtype=labels.dtype)
+        np.minimum.at(by_row, rows, spread)
+        spread = by_row[rows]
+        if np.array_equal(spread, labels):
+            break
+        labels = spread
+
+    out = np.zeros(h * w, dtype=np.int32)
+    uniq, out[on] = np.unique(labels, return_inverse=True)
+    out[on] += 1
+    return out.reshape(h, w), len(uniq)
+
+
+def component_boxes(labels, n):
+    """Per-component (areas, boxes) where boxes is an (n, 4) array of x0, y0, x1, y1 (exclusive)."""
+    ys, xs = np.nonzero(labels)
+    ids = labels[ys, xs] - 1
+    areas = np.bincount(ids, minlength=n)
+    boxes = np.empty((n, 4), dtype=np.int64)
+    boxes[:, :2] = np.iinfo(np.int64).max
+    boxes[:, 2:] = -1
+    np.minimum.at(boxes[:, 0], ids, xs)
+    np.minimum.at(boxes[:, 1], ids, ys)
+    np.maximum.at(boxes[:, 2], ids, xs + 1)
+    np.maximum.at(boxes[:, 3], ids, ys + 1)
+    return areas, boxes
+
+
+def box_gaps(a, b):
+    """Gap in px between every box in a (m, 4) and every box in b (k, 4); 0 where they overlap."""
+    dx = np.maximum(0, np.maximum(a[:, None, 0] - b[None, :, 2], b[None, :, 0] - a[:, None, 2]))
+    dy = np.maximum(0, np.maximum(a[:, None, 1] - b[None, :, 3], b[None, :, 1] - a[:, None, 3]))
+    return np.hypot(dx, dy)
+
+
+# ============================================================
+# GROUPING
+# ============================================================
+
+def group_components(areas, boxes, frames=None):
+    """Assign every component to a frame. Returns (group per component (-1 = dropped), n_groups)."""
+    n = len(areas)
+    order = np.argsort(areas)[::-1]
+    bodies = [int(i) for i in order if areas[i] >= BODY_FRACTION * areas[order[0]]]
+    if frames is not None and len(bodies) < frames:
+        bodies = [int(i) for i in order[:frames]]
+
+    # Union boxes per group, starting one group per body
+    group_boxes = boxes[bodies].copy()
+    members = [[b] for b in bodies]
+    while frames is not None and len(members) > frames:
+        gaps = box_gaps(group_boxes, group_boxes)
+        np.fill_diagonal(gaps, np.inf)
+        i, j = sorted(np.unravel_index(int(gaps.argmin()), gaps.shape))
+        members[i] += members.pop(j)
+        group_boxes[i, :2] = np.minimum(group_boxes[i, :2], group_boxes[j, :2])
+        group_boxes[i, 2:] = np.maximum(group_boxes[i, 2:], group_boxes[j, 2:])
+        group_boxes = np.delete(group_boxes, j, axis=0)
+
+    group = np.full(n, -1)
+    for g, comps in enumerate(members):
+        group[comps] = g
+
+    rest = np.flatnonzero(group < 0)
+    if len(rest):
+        gaps = box_gaps(boxes[rest], group_boxes)
+        nearest = gaps.argmin(axis=1)
+        height = group_boxes[nearest, 3] - group_boxes[nearest, 1]
+        gap = gaps[np.arange(len(rest)), nearest]
+        speck = areas[rest] < SPECK_FRACTION * areas[order[0]]
+        near = np.where(speck, gap <= SPECK_GAP, gap <= MAX_GAP_FRACTION * height)
+        group[rest[near]] = nearest[near]
+    return group, len(members)
+
+
+def split_sheet(sheet, frames=None):
+    """Split a keyed RGBA sheet into frame images ordered left to right.
+
+    With `frames`, exactly that many are returned (fewer only if the sheet
+    has fewer components than that).
+    """
+    arr = np.asarray(sheet.convert("RGBA"))
+    labels, n = label_components(arr[..., 3] >= ALPHA_MIN)
+    if n == 0:
+        return []
+    areas, boxes = component_boxes(labels, n)
+    group, n_groups = group_components(areas, boxes, frames)
+
+    # Map each pixel's component to its frame (-1 = none), then cut frames out
+    pixel_group = np.concatenate([[-1], group])[labels]
+    result = []
+    for g in range(n_groups):
+        comps = np.flatnonzero(group == g)
+        x0, y0 = boxes[comps, 0].min(), boxes[comps, 1].min()
+        x1, y1 = boxes[comps, 2].max(), boxes[comps, 3].max()
+        frame = arr[y0:y1, x0:x1].copy()
+        frame[pixel_group[y0:y1, x0:x1] != g] = 0
+        result.append((x0 + x1, Image.fromarray(frame, "RGBA")))
+    result.sort(key=lambda r: r[0])
+    return [img for _, img in result]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a keyed sprite sheet into frames.")
+    parser.add_argument("sheet", help="keyed (transparent background) sheet PNG")
+    parser.add_argument("--frames", type=int, default=None, help="expected frame count")
+    parser.add_argument("--out", default=None, help="directory for frame PNGs")
+    args = parser.parse_args()
+
+    sheet = Image.open(args.sheet)
+    frames = split_sheet(sheet, args.frames)
+    print(f"  {Path(args.sheet).name}: {len(frames)} frames")
+    out = Path(args.out) if args.out else None
+    if out:
+        out.mkdir(parents=True, exist_ok=True)
+    for i, frame in enumerate(frames, 1):
+        print(f"  frame {i}: {frame.size[0]}x{frame.size[1]}")
+        if out:
+            frame.save(str(out / f"frame{i}.png"))
+
+
+if __name__ == "__main__":
+    main()
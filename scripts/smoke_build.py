@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Offline end-to-end build from empty stores
+
+Runs regenerate_sprites.py against the fake Imagen backend with every
+store (response cache, build manifest, raw archive, hash index, sprites,
+atlas) in a fresh scratch directory, so each raw is generated, decoded,
+archived and handed to the worker processes through shared memory, as on
+a first real build. The default --jobs 2 --concurrency 4 overlaps
+requests with worker processing, the combination that once deadlocked
+when workers were forked from a graph thread.
+
+Each build runs in a child process. If it does not finish within
+--timeout seconds, every thread's stack is dumped, the child and its
+workers are killed and the run fails. It also fails if a sprite, its
+entry in hitboxes.json or the atlas is missing afterwards.
+
+Usage:
+    python scripts/smoke_build.py                         # --jobs 2 --concurrency 4
+    python scripts/smoke_build.py --runs 5                # repeat from empty stores
+    python scripts/smoke_build.py -- --jobs 3 --candidates 2
+"""
+
+import argparse
+import faulthandler
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+DEFAULT_BUILD_ARGS = ["--jobs", "2", "--concurrency", "4"]
+
+
+def build(root, build_args):
+    """Run one build with all stores under `root`. Returns a list of problems."""
+    import regenerate_sprites
+    from build_manifest import BuildManifest
+    from hitboxes import COMBINED_NAME
+    from imagen_cache import ImagenCache
+    from phash_index import PerceptualIndex
+    from raw_archive import RawArchive
+
+    r = regenerate_sprites
+    r.output_dir = root / "sprites"
+    r.atlas_dir = root / "atlas"
+    r.ARCHIVE_DIR = root / "candidates"
+    r.asset_manifest_path = root / "asset_manifest.json"
+    r.cache = ImagenCache(root / "cache")
+    r.manifest = BuildManifest(root / "build_manifest.json")
+    r.raw_store = RawArchive(root / "raw_archive")
+    r.phash_index = PerceptualIndex(root / "phash_index")
+    r.main(["--backend", "fake:latency=0"] + build_args)
+
+    problems = []
+    names = [s["name"] for s in r.HERO_SPRITES + r.OTHER_SPRITES]
+    problems += [f"{n}.png missing" for n in names if not (r.output_dir / f"{n}.png").exists()]
+    combined = r.output_dir / COMBINED_NAME
+    boxes = json.loads(combined.read_text()) if combined.exists() else {}
+    problems += [f"{n} missing from {COMBINED_NAME}" for n in names if n not in boxes]
+    if not list(r.atlas_dir.glob("*.json")):
+        problems.append(f"no atlas in {r.atlas_dir}")
+    return problems
+
+
+def run_isolated(root, args):
+    """Build in a child process with its own session, so a hang can't outlive it.
+
+    Returns True if the build passed.
+    """
+    cmd = [sys.executable, __file__, "--scratch", str(root), "--timeout", str(args.timeout),
+           "--"] + (args.build_args or DEFAULT_BUILD_ARGS)
+    proc = subprocess.Popen(cmd, start_new_session=True)
+    try:
+        # The child dumps every thread's stack at --timeout; give it time to print them
+        return proc.wait(args.timeout + 10) == 0
+    except subprocess.TimeoutExpired:
+        print(f"  FAIL: build still running after {args.timeout:.0f}s")
+        return False
+    finally:
+        # Kill any workers left behind as well
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build every sprite offline from empty stores.")
+    parser.add_argument("--runs", type=int, default=1, help="builds to run, each from scratch")
+    parser.add_argument("--timeout", type=float, default=300,
+                        help="seconds before a build counts as hung (stacks are dumped)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directories")
+    parser.add_argument("--scratch", help=argparse.SUPPRESS)  # one build in this directory
+    parser.add_argument("build_args", nargs="*",
+                        help=f"regenerate_sprites.py options after -- "
+                             f"(default: {' '.join(DEFAULT_BUILD_ARGS)})")
+    args = parser.parse_args()
+
+    if args.scratch:
+        faulthandler.dump_traceback_later(args.timeout)
+        problems = build(Path(args.scratch), args.build_args)
+        for problem in problems:
+            print(f"  FAIL: {problem}")
+        sys.exit(1 if problems else 0)
+
+    passed = 0
+    for run in range(args.runs):
+        root = Path(tempfile.mkdtemp(prefix="tangled_smoke_"))
+        print(f"\n--- Smoke build {run + 1}/{args.runs} in {root} ---", flush=True)
+        try:
+            passed += run_isolated(root, args)
+        finally:
+            if not args.keep:
+                shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n  {passed} of {args.runs} smoke builds passed")
+    sys.exit(0 if passed == args.runs else 1)
+
+
+if __name__ == "__main__":
+    main()
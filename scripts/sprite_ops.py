@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Shared sprite post-processing operations
+
+The steps that turn a keyed Imagen raw into a game sprite:
+1. Crop to content bounding box
+2. Resize proportionally to target file height
+3. (Groups of frames) place on a uniform, bottom-aligned canvas, optionally
+   scaling every frame's content to the tallest first (normalize_frames)
+"""
+
+import numpy as np
+from PIL import Image
+
+
+def crop_to_content(img):
+    """Crop image to its non-transparent content bounding box."""
+    bbox = img.getbbox()
+    if bbox:
+        return img.crop(bbox)
+    return img
+
+
+def resize_to_height(img, target_height):
+    """Resize image proportionally so height == target_height."""
+    w, h = img.size
+    if h == 0:
+        return img
+    ratio = target_height / h
+    new_w = max(1, int(w * ratio))
+    return img.resize((new_w, target_height), Image.NEAREST)
+
+
+def uniform_canvas(images):
+    """Place frames on one canvas size, bottom-aligned and centered horizontally.
+
+    Returns {name: (canvas, y_offset)} plus the shared (width, height).
+    """
+    max_w = max(img.size[0] for img in images.values())
+    max_h = max(img.size[1] for img in images.values())
+
+    placed = {}
+    for name, img in images.items():
+        canvas = Image.new("RGBA", (max_w, max_h), (0, 0, 0, 0))
+        # Bottom-align: place at bottom, centered horizontally
+        x_offset = (max_w - img.size[0]) // 2
+        y_offset = max_h - img.size[1]
+        canvas.paste(img, (x_offset, y_offset))
+        placed[name] = (canvas, y_offset)
+    return placed, (max_w, max_h)
+
+
+def content_bboxes(images):
+    """Alpha bounding boxes of many RGBA images in one pass over a padded stack.
+
+    Returns an (n, 4) int array of x0, y0, x1, y1 (exclusive), with rows of
+    zeros for fully transparent images.
+    """
+    h = max(img.size[1] for img in images)
+    w = max(img.size[0] for img in images)
+    stack = np.zeros((len(images), h, w), dtype=bool)
+    for i, img in enumerate(images):
+        stack[i, :img.size[1], :img.size[0]] = np.asarray(img.getchannel("A")) > 0
+    cols = stack.any(axis=1)
+    rows = stack.any(axis=2)
+    boxes = np.stack([cols.argmax(axis=1), rows.argmax(axis=1),
+                      w - cols[:, ::-1].argmax(axis=1), h - rows[:, ::-1].argmax(axis=1)], axis=1)
+    boxes[~cols.any(axis=1)] = 0
+    return boxes
+
+
+def normalize_frames(images, padding=0):
+    """Give a group of animation frames matching content height on one canvas.
+
+    Each frame is cropped to its content, scaled up (NEAREST, so pixel art
+    stays crisp) to the tallest frame's content height, and placed
+    bottom-aligned and centered on a canvas `padding` px larger than the
+    largest content. Empty frames are dropped. Works like uniform_canvas:
+    returns {name: (canvas, y_offset)} plus the shared (width, height).
+    """
+    names = list(images)
+    boxes = content_bboxes([images[n] for n in names])
+    sizes = boxes[:, 2:] - boxes[:, :2]
+    keep = np.flatnonzero(sizes[:, 1] > 0)
+    if len(keep) == 0:
+        return {}, (0, 0)
+    max_h = int(sizes[keep, 1].max())
+
+    scaled = {}
+    for i in keep:
+        content = images[names[i]].crop(tuple(int(v) for v in boxes[i]))
+        if sizes[i, 1] < max_h:
+            content = resize_to_height(content, max_h)
+        scaled[names[i]] = content
+    canvas_w = max(img.size[0] for img in scaled.values()) + padding
+    canvas_h = max_h + padding
+
+    placed = {}
+    for name, img in scaled.items():
+        canvas = Image.new("RGBA", (canvas_w, canvas_h), (0, 0, 0, 0))
+        x_offset = (canvas_w - img.size[0]) // 2
+        y_offset = canvas_h - img.size[1]
+        canvas.paste(img, (x_offset, y_offset))
+        placed[name] = (canvas, y_offset)
+    return placed, (canvas_w, canvas_h)
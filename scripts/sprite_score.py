@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Automatic scoring of Imagen sprite candidates
+
+Given several raws for one prompt, key each one and score how usable it is:
+- bg_connected: share of removed pixels connected to the image border.
+  Holes punched inside the sprite by the keyer pull this down.
+- bbox_fill:    share of the content bounding box that is opaque. Stray
+  specks, detached props and wide empty gaps pull this down.
+- leakage:      share of opaque sprite pixels still close to the chroma
+  color (the prompt tells Imagen to avoid it; fringes and pink/green tints
+  that survived keying show up here).
+- palette:      mean color distance between the candidate's palette and a
+  reference sprite's, both ways (0 = same colors). Only scored when a
+  reference is given.
+
+Candidates are keyed and scored in a thread pool (the NumPy work releases
+the GIL). The total is a weighted sum; higher is better.
+
+Usage:
+    python scripts/sprite_score.py raw1.png raw2.png ... [--reference assets/sprites/goblin.png]
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from chroma_key import border_connected, color_distance, remove_background
+
+# Opaque pixels closer than tolerance + fade + LEAK_MARGIN to the chroma count as leakage
+LEAK_MARGIN = 60
+PALETTE_BITS = 4
+PALETTE_SIZE = 32
+WEIGHTS = {"bg_connected": 1.0, "bbox_fill": 1.0, "leakage": -4.0, "palette": -1 / 100}
+
+
+# ============================================================
+# PALETTES
+# ============================================================
+
+def palette(arr, bits=PALETTE_BITS, size=PALETTE_SIZE):
+    """Most common opaque colors of an RGBA array, quantized. Returns (colors (k, 3), weights (k,))."""
+    opaque = arr[arr[..., 3] == 255][:, :3]
+    if len(opaque) == 0:
+        return np.zeros((0, 3)), np.zeros(0)
+    shift = 8 - bits
+    q = opaque.astype(np.int32) >> shift
+    codes = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+    counts = np.bincount(codes, minlength=1 << (3 * bits))
+    top = np.argsort(counts)[::-1][:size]
+    top = top[counts[top] > 0]
+    mask = (1 << bits) - 1
+    colors = np.stack([top >> (2 * bits), (top >> bits) & mask, top & mask], axis=1)
+    # Bin centers, back on the 0-255 scale
+    colors = (colors << shift) + (1 << shift) // 2
+    weights = counts[top] / counts[top].sum()
+    return colors.astype(np.float64), weights
+
+
+def palette_distance(pal_a, pal_b):
+    """Symmetric weighted mean distance from each palette's colors to the nearest in the other."""
+    (ca, wa), (cb, wb) = pal_a, pal_b
+    if len(ca) == 0 or len(cb) == 0:
+        return 0.0
+    d = np.sqrt(((ca[:, None, :] - cb[None, :, :]) ** 2).sum(axis=2))
+    return float((d.min(axis=1) @ wa + d.min(axis=0) @ wb) / 2)
+
+
+# ============================================================
+# SCORING
+# ============================================================
+
+def score_keyed(keyed, reference_palette=None):
+    """Score one keyed RGBA image (as returned by remove_background). Returns a dict."""
+    arr = np.asarray(keyed)
+    alpha = arr[..., 3]
+    key = keyed.info["key"]
+
+    clear = alpha == 0
+    n_clear = int(np.count_nonzero(clear))
+    bg_connected = (np.count_nonzero(border_connected(clear)) / n_clear) if n_clear else 0.0
+
+    opaque = alpha == 255
+    bbox = keyed.getchannel("A").getbbox()
+    if bbox:
+        x0, y0, x1, y1 = bbox
+        bbox_fill = float(opaque[y0:y1, x0:x1].mean())
+    else:
+        bbox_fill = 0.0
+
+    n_opaque = int(np.count_nonzero(opaque))
+    near = color_distance(arr, key["bg"]) < key["tolerance"] + key["fade"] + LEAK_MARGIN
+    leakage = np.count_nonzero(near & opaque) / n_opaque if n_opaque else 1.0
+
+    scores = {"bg_connected": bg_connected, "bbox_fill": bbox_fill, "leakage": leakage}
+    if reference_palette is not None:
+        scores["palette"] = palette_distance(palette(arr), reference_palette)
+    scores["total"] = sum(WEIGHTS[k] * v for k, v in scores.items())
+    return scores
+
+
+def rank_candidates(images, key=None, reference=None, workers=None):
+    """Key and score raws in parallel.
+
+    `key` holds remove_background keyword arguments; `reference` is an RGBA
+    image whose palette candidates should match. Returns a list of
+    (scores, index) sorted best first.
+    """
+    ref_pal = palette(np.asarray(reference.convert("RGBA"))) if reference is not None else None
+
+    def score(img):
+        keyed, _ = remove_background(img, **(key or {}))
+        return score_keyed(keyed, ref_pal)
+
+    with ThreadPoolExecutor(max_workers=workers or len(images) or 1) as pool:
+        results = list(pool.map(score, images))
+    order = sorted(range(len(images)), key=lambda i: results[i]["total"], reverse=True)
+    return [(results[i], i) for i in order]
+
+
+def format_scores(scores):
+    return "  ".join(f"{k} {v:.3f}" if k != "palette" else f"{k} {v:.1f}"
+                     for k, v in scores.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score raw sprite candidates.")
+    parser.add_argument("paths", nargs="+", help="raw Imagen PNGs")
+    parser.add_argument("--reference", help="sprite whose palette candidates should match")
+    args = parser.parse_args()
+
+    images = [Image.open(p) for p in args.paths]
+    reference = Image.open(args.reference) if args.reference else None
+    for rank, (scores, index) in enumerate(rank_candidates(images, reference=reference), 1):
+        print(f"  {rank}. {Path(args.paths[index]).name:24s} {format_scores(scores)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Dependency-aware task graph executor
+
+A build is a set of named tasks, each with the tasks whose outputs it
+needs, an estimated cost in seconds and a kind ("fetch", "cpu", ...) that
+picks which thread pool runs it. Every kind has its own limit, so network
+waits never hold up CPU work and vice versa.
+
+Tasks start as soon as all their inputs are done. When more tasks are
+ready than a kind has free slots, the one heading the longest remaining
+chain (its own cost plus the costliest path through its dependents) goes
+first, so the critical path is never left waiting behind short side jobs
+and the build ends close to the length of its longest chain.
+
+A task function gets {dependency name: result} and returns its result;
+None means "no output" (the repo-wide convention for a failed sprite) and
+skips its dependents, except those added with partial=True, which run on
+whatever inputs succeeded. Exceptions abort the build.
+
+Usage:
+    python scripts/task_graph.py    # run a small demo graph of sleeps
+"""
+
+import heapq
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Task:
+    def __init__(self, name, fn, deps, cost, kind, partial):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.cost = cost
+        self.kind = kind
+        self.partial = partial
+        self.dependents = []
+        self.rank = cost
+
+
+class TaskGraph:
+    """Tasks added in any order; dependencies are resolved when the graph runs."""
+
+    def __init__(self):
+        self.tasks = {}
+        self.results = {}
+
+    def add(self, name, fn, deps=(), cost=1.0, kind="cpu", partial=False):
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task {name!r}")
+        self.tasks[name] = Task(name, fn, deps, cost, kind, partial)
+        return name
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def _link(self):
+        """Wire dependents and compute each task's rank. Returns the tasks in topological order."""
+        for task in self.tasks.values():
+            task.dependents = []
+        for task in self.tasks.values():
+            for dep in task.deps:
+                if dep not in self.tasks:
+                    raise ValueError(f"Task {task.name!r} depends on unknown task {dep!r}")
+                self.tasks[dep].dependents.append(task)
+
+        pending = {name: len(task.deps) for name, task in self.tasks.items()}
+        order = [t for t in self.tasks.values() if not t.deps]
+        for task in order:
+            for child in task.dependents:
+                pending[child.name] -= 1
+                if pending[child.name] == 0:
+                    order.append(child)
+        if len(order) != len(self.tasks):
+            stuck = sorted(name for name, n in pending.items() if n)
+            raise ValueError(f"Dependency cycle among: {', '.join(stuck)}")
+
+        for task in reversed(order):
+            task.rank = task.cost + max((c.rank for c in task.dependents), default=0.0)
+        return order
+
+    def critical_path(self):
+        """(task names, estimated seconds) of the costliest chain through the graph."""
+        order = self._link()
+        if not order:
+            return [], 0.0
+        task = max((t for t in order if not t.deps), key=lambda t: t.rank)
+        total = task.rank
+        path = [task.name]
+        while task.dependents:
+            task = max(task.dependents, key=lambda t: t.rank)
+            path.append(task.name)
+        return path, total
+
+    def run(self, limits):
+        """Run every task, at most limits[kind] at a time per kind. Returns {name: result}."""
+        order = self._link()
+        index = {task.name: i for i, task in enumerate(order)}
+        waiting = {task.name: len(task.deps) for task in order}
+        ready = {}
+        pools = {}
+        running = {}
+        self.results = {}
+
+        def settle(task, result):
+            """Record a finished (or skipped) task and release its dependents."""
+            self.results[task.name] = result
+            for child in task.dependents:
+                waiting[child.name] -= 1
+                if waiting[child.name]:
+                    continue
+                inputs = {dep: self.results[dep] for dep in child.deps}
+                if not child.partial and any(r is None for r in inputs.values()):
+                    settle(child, None)
+                else:
+                    heapq.heappush(ready.setdefault(child.kind, []),
+                                   (-child.rank, index[child.name], child))
+
+        for task in order:
+            if not task.deps:
+                heapq.heappush(ready.setdefault(task.kind, []), (-task.rank, index[task.name], task))
+
+        try:
+            while ready or running:
+                for kind, queue in ready.items():
+                    limit = limits.get(kind, 1)
+                    if kind not in pools:
+                        pools[kind] = ThreadPoolExecutor(max_workers=limit, thread_name_prefix=kind)
+                    while queue and sum(1 for t in running.values() if t.kind == kind) < limit:
+                        _, _, task = heapq.heappop(queue)
+                        inputs = {dep: self.results[dep] for dep in task.deps}
+                        running[pools[kind].submit(task.fn, inputs)] = task
+                ready = {kind: queue for kind, queue in ready.items() if queue}
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    settle(task, future.result())
+        finally:
+            for future in running:
+                future.cancel()
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+        return self.results
+
+
+def main():
+    print("=" * 60)
+    print("TASK GRAPH - demo")
+    print("=" * 60)
+
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+
+    def sleeper(name, seconds):
+        def run(inputs):
+            time.sleep(seconds)
+            with lock:
+                print(f"  {time.perf_counter() - t0:5.2f}s  {name} done")
+            return name
+        return run
+
+    graph = TaskGraph()
+    for name, cost in (("a", 0.3), ("b", 0.1), ("c", 0.1), ("d", 0.1)):
+        graph.add(f"fetch:{name}", sleeper(f"fetch:{name}", cost), cost=cost, kind="fetch")
+        graph.add(f"process:{name}", sleeper(f"process:{name}", cost),
+                  [f"fetch:{name}"], cost=cost)
+    graph.add("group", sleeper("group", 0.2), ["process:a", "process:b"], cost=0.2)
+    path, est = graph.critical_path()
+    print(f"  Critical path ({est:.1f}s): {' -> '.join(path)}")
+    graph.run({"fetch": 2, "cpu": 1})
+    print(f"  Finished in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
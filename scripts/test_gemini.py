@@ -4,31 +4,17 @@ Test Gemini sprite generation pipeline.
 Uses flood-fill from edges to remove background — never touches interior pixels.
 """
 
-import os
-import sys
 from pathlib import Path
 
-# Load API key from .env
-env_path = Path(__file__).parent.parent / ".env"
-if env_path.exists():
-    for line in env_path.read_text().splitlines():
-        if "=" in line and not line.startswith("#"):
-            key, val = line.strip().split("=", 1)
-            os.environ[key] = val
-
-api_key = os.environ.get("GEMINI_API_KEY")
-if not api_key:
-    print("ERROR: GEMINI_API_KEY not found in .env")
-    sys.exit(1)
-
-print(f"API key loaded ({len(api_key)} chars)")
-
-from google import genai
-from google.genai import types
 from PIL import Image
 import io
+import numpy as np
 
-client = genai.Client(api_key=api_key)
+from chroma_key import key_array
+from imagen_backend import create_backend
+
+backend = create_backend()
+print(f"Imagen backend: {backend.name}")
 
 output_dir = Path(__file__).parent.parent / "assets" / "sprites"
 output_dir.mkdir(parents=True, exist_ok=True)
@@ -37,43 +23,15 @@ output_dir.mkdir(parents=True, exist_ok=True)
 def remove_background(img, tolerance=90):
     """Remove background by color matching against sampled corner color.
 
-    Since prompts tell the AI to avoid the chroma key color in the sprite,
-    we can safely use a wide tolerance. Any pixel close to the background
-    color gets removed. The AI color-avoidance instructions ensure sprite
-    content stays far from the chroma key color.
+    Only pixels connected to the image edges through background-colored
+    pixels are removed, so chroma-like colors inside the sprite survive
+    even with a wide tolerance.
     """
-    img_rgba = img.convert("RGBA")
-    pixels = img_rgba.load()
-    w, h = img_rgba.size
-
-    # Sample background color from corners
-    corner_samples = []
-    for cx, cy in [(2, 2), (w - 3, 2), (2, h - 3), (w - 3, h - 3)]:
-        r, g, b, a = pixels[cx, cy]
-        corner_samples.append((r, g, b))
-
-    bg_r = sum(s[0] for s in corner_samples) // len(corner_samples)
-    bg_g = sum(s[1] for s in corner_samples) // len(corner_samples)
-    bg_b = sum(s[2] for s in corner_samples) // len(corner_samples)
+    arr = np.array(img.convert("RGBA"))
+    removed, (bg_r, bg_g, bg_b) = key_array(arr, tolerance, mode="flood")
     print(f"  Detected background color: RGB({bg_r}, {bg_g}, {bg_b})")
-
-    removed = 0
-    for y in range(h):
-        for x in range(w):
-            r, g, b, a = pixels[x, y]
-            dist = ((r - bg_r) ** 2 + (g - bg_g) ** 2 + (b - bg_b) ** 2) ** 0.5
-
-            if dist < tolerance:
-                pixels[x, y] = (0, 0, 0, 0)
-                removed += 1
-            elif dist < tolerance + 30:
-                # Tight anti-alias fade just past the cutoff
-                alpha_factor = (dist - tolerance) / 30.0
-                new_alpha = int(a * max(0, min(1, alpha_factor)))
-                pixels[x, y] = (r, g, b, new_alpha)
-
     print(f"  Removed {removed} background pixels")
-    return img_rgba, removed
+    return Image.fromarray(arr, "RGBA"), removed
 
 
 def generate_sprite(prompt, name, chroma_color="magenta"):
@@ -89,10 +47,10 @@ def generate_sprite(prompt, name, chroma_color="magenta"):
     full_prompt = prompt + " " + bg_instruction.get(chroma_color, bg_instruction["magenta"])
 
     try:
-        response = client.models.generate_images(
+        response = backend.generate_images(
             model="imagen-4.0-generate-001",
             prompt=full_prompt,
-            config=types.GenerateImagesConfig(
+            config=backend.config(
                 number_of_images=1,
             ),
         )
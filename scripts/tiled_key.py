@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Tiled chroma keying for large master images
+
+chroma_key.remove_background keys whole-image arrays: for a 4x master of
+a 1024px raw (16 Mpx) that is a 64 MB RGBA copy plus several hundred MB of
+int32/float64 temporaries, and crop + resize add two more PIL copies.
+TiledImage instead copies a master once, in row bands, into a shared
+memory block and keys it in place, tile by tile, in worker processes (or
+in this one when no pool is given), so a worker only ever holds the
+temporaries of one tile and its halo:
+1. tolerance="auto": the border strip picks the background and cutoff as
+   before; per-tile histograms of color distance are summed for the fade
+2. mode="flood": every tile grows the border-connected background over
+   itself plus a HALO px ring, seeded with what is known so far (a shared
+   bool mask, 1 byte/px), and writes back only its own pixels. Tiles next
+   to one that changed run again until none do; the halo lets a path that
+   wanders out of a tile and back close within one round
+3. every tile keys its own pixels and reports its alpha bounding box
+
+Keying is per pixel and the connectivity is exact, so the tiles stitch
+without seams: the keyed master is identical to remove_background's.
+crop() and resize_to_height() then read only the content box of the block
+(the resize picks source pixels exactly as Pillow's NEAREST does), so the
+result matches crop_to_content + resize_to_height byte for byte.
+
+regenerate_sprites.py keys raws of TILED_MIN_PIXELS or more this way.
+
+Usage:
+    python scripts/tiled_key.py                                # synthetic 4096px master
+    python scripts/tiled_key.py raw.png --scale 4 --jobs 0     # a raw upscaled 4x, every core
+    python scripts/tiled_key.py raw.png --scale 2 --mode flood --auto
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from chroma_key import (AUTO, DEFAULT_FADE, DEFAULT_TOLERANCE, KEY_MODES, apply_key,
+                        auto_background, auto_fade, color_distance, connected_from,
+                        distance_histogram, remove_background, sample_background,
+                        synthetic_raw)
+from shared_image import release, shared_array, with_shared
+from sprite_ops import crop_to_content, resize_to_height
+
+TILE = 512              # tile side in px
+HALO = 32               # extra ring each flood tile looks at
+BAND_ROWS = 256         # rows copied into shared memory at a time
+TILED_MIN_PIXELS = 2048 * 2048   # 2x masters of the 1024px raws and up
+
+
+# ============================================================
+# TILE WORK (runs in worker processes; arrays map shared memory)
+# ============================================================
+
+def _fill(pixels, img):
+    """Copy `img` into the shared RGBA array a band of rows at a time."""
+    w, h = img.size
+    for y in range(0, h, BAND_ROWS):
+        band = img.crop((0, y, w, min(y + BAND_ROWS, h)))
+        pixels[y:y + band.size[1]] = np.asarray(band.convert("RGBA"))
+
+
+def _histogram(pixels, window, bg):
+    y0, y1, x0, x1 = window
+    return distance_histogram(color_distance(pixels[y0:y1, x0:x1], bg))
+
+
+def _flood(pixels, reached, window, halo, bg, limit):
+    """Grow the border-connected background over one tile. Returns True if the tile changed."""
+    h, w = reached.shape
+    y0, y1, x0, x1 = window
+    wy0, wy1, wx0, wx1 = max(y0 - halo, 0), min(y1 + halo, h), max(x0 - halo, 0), min(x1 + halo, w)
+    seeds = reached[wy0:wy1, wx0:wx1].copy()
+    # The image border seeds the background, as in border_connected
+    seeds[0] |= wy0 == 0
+    seeds[-1] |= wy1 == h
+    seeds[:, 0] |= wx0 == 0
+    seeds[:, -1] |= wx1 == w
+    if not seeds.any():
+        return False
+    grown = connected_from(seeds, color_distance(pixels[wy0:wy1, wx0:wx1], bg) < limit)
+    inner = grown[y0 - wy0:y1 - wy0, x0 - wx0:x1 - wx0]
+    own = reached[y0:y1, x0:x1]
+    # Reached pixels only ever grow, so a changed tile has more of them
+    if np.count_nonzero(inner) == np.count_nonzero(own):
+        return False
+    own |= inner
+    return True
+
+
+def _key_tile(pixels, region, window, bg, tolerance, fade):
+    """Key one tile in place. Returns (removed, alpha bounding box or None)."""
+    y0, y1, x0, x1 = window
+    arr = pixels[y0:y1, x0:x1]
+    removed = apply_key(arr, color_distance(arr, bg), tolerance, fade, region)
+    alpha = arr[..., 3] > 0
+    rows = np.flatnonzero(alpha.any(axis=1))
+    if not rows.size:
+        return removed, None
+    cols = np.flatnonzero(alpha.any(axis=0))
+    return removed, (x0 + int(cols[0]), y0 + int(rows[0]), x0 + int(cols[-1]) + 1,
+                     y0 + int(rows[-1]) + 1)
+
+
+def _key(pixels, window, bg, tolerance, fade):
+    return _key_tile(pixels, None, window, bg, tolerance, fade)
+
+
+def _key_flooded(pixels, reached, window, bg, tolerance, fade):
+    y0, y1, x0, x1 = window
+    return _key_tile(pixels, reached[y0:y1, x0:x1], window, bg, tolerance, fade)
+
+
+def _crop(pixels, box):
+    x0, y0, x1, y1 = box
+    return Image.fromarray(pixels[y0:y1, x0:x1].copy(), "RGBA")
+
+
+def _sample(pixels, rows, cols):
+    return Image.fromarray(pixels[rows[:, None], cols[None, :]], "RGBA")
+
+
+def nearest_indices(start, length, out):
+    """Source indices Pillow's NEAREST resize reads for `out` pixels from `length`
+    starting at `start`: it steps a double from half a step in, one step at a time."""
+    steps = np.full(out, length / out)
+    steps[0] *= 0.5
+    return start + np.cumsum(steps).astype(np.int64)
+
+
+def run_tiles(procs, fn, handles, calls):
+    """fn(*arrays, *args) for each args tuple in `calls`, on `procs` or here. Returns the results."""
+    if procs is None:
+        return [with_shared(fn, handles, *args) for args in calls]
+    futures = [procs.submit(with_shared, fn, handles, *args) for args in calls]
+    return [f.result() for f in futures]
+
+
+# ============================================================
+# TILED IMAGE
+# ============================================================
+
+class TiledImage:
+    """A large RGBA image held in shared memory and processed tile by tile.
+
+        with TiledImage(raw) as master:
+            removed, chosen = master.key(tolerance="auto", mode="flood", procs=pool)
+            sprite = master.resize_to_height(600)
+    """
+
+    def __init__(self, img, tile=TILE, halo=HALO):
+        self.size = img.size
+        self.tile = tile
+        self.halo = halo
+        self.box = None
+        self.rounds = 0
+        w, h = img.size
+        self.shm, self.handle = shared_array((h, w, 4))
+        with_shared(_fill, [self.handle], img)
+        self.tiles = [(y, min(y + tile, h), x, min(x + tile, w))
+                      for y in range(0, h, tile) for x in range(0, w, tile)]
+
+    def close(self):
+        release(self.shm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _neighbours(self, i):
+        cols = -(-self.size[0] // self.tile)
+        rows = len(self.tiles) // cols
+        r, c = divmod(i, cols)
+        return {rr * cols + cc for rr in range(max(r - 1, 0), min(r + 2, rows))
+                for cc in range(max(c - 1, 0), min(c + 2, cols)) if (rr, cc) != (r, c)}
+
+    def _flood(self, reached, bg, limit, procs):
+        """Fill the shared `reached` mask with the background connected to the border."""
+        dirty = set(range(len(self.tiles)))
+        self.rounds = 0
+        while dirty:
+            order = sorted(dirty)
+            changed = run_tiles(procs, _flood, [self.handle, reached],
+                                [(self.tiles[i], self.halo, bg, limit) for i in order])
+            dirty = set().union(*(self._neighbours(i) for i, c in zip(order, changed) if c))
+            self.rounds += 1
+
+    def key(self, tolerance=DEFAULT_TOLERANCE, fade=DEFAULT_FADE, mode="global", procs=None):
+        """Key the image in place, like chroma_key.remove_background.
+
+        Returns (removed, {"bg", "tolerance", "fade"}) with the values used.
+        """
+        if mode not in KEY_MODES:
+            raise ValueError(f"Unknown key mode {mode!r} (expected one of {', '.join(KEY_MODES)})")
+        if tolerance == AUTO:
+            bg, tolerance = with_shared(auto_background, [self.handle])
+            hists = run_tiles(procs, _histogram, [self.handle], [(t, bg) for t in self.tiles])
+            fade = auto_fade(sum(hists), tolerance)
+        else:
+            bg = with_shared(sample_background, [self.handle])
+
+        calls = [(t, bg, tolerance, fade) for t in self.tiles]
+        if mode == "flood":
+            shm, reached = shared_array(self.size[::-1], bool)
+            try:
+                # The fade band counts as background too, so anti-aliased rims connect
+                self._flood(reached, bg, tolerance + fade, procs)
+                results = run_tiles(procs, _key_flooded, [self.handle, reached], calls)
+            finally:
+                release(shm)
+        else:
+            results = run_tiles(procs, _key, [self.handle], calls)
+
+        boxes = np.array([box for _, box in results if box is not None]).reshape(-1, 4)
+        self.box = None
+        if len(boxes):
+            self.box = (*(int(v) for v in boxes[:, :2].min(axis=0)),
+                        *(int(v) for v in boxes[:, 2:].max(axis=0)))
+        removed = sum(r for r, _ in results)
+        return removed, {"bg": bg, "tolerance": tolerance, "fade": fade}
+
+    def content_box(self):
+        """Alpha bounding box after key() (the whole image if nothing is left, like crop_to_content)."""
+        return self.box or (0, 0, *self.size)
+
+    def crop(self):
+        """The keyed content as an image (crop_to_content of the keyed master)."""
+        return with_shared(_crop, [self.handle], self.content_box())
+
+    def resize_to_height(self, target_height):
+        """sprite_ops.resize_to_height(self.crop(), ...) without making the crop."""
+        x0, y0, x1, y1 = self.content_box()
+        new_w = max(1, int((x1 - x0) * (target_height / (y1 - y0))))
+        return with_shared(_sample, [self.handle], nearest_indices(y0, y1 - y0, target_height),
+                           nearest_indices(x0, x1 - x0, new_w))
+
+
+# ============================================================
+# COMPARISON
+# ============================================================
+
+def measure(fn):
+    """(result, seconds, peak MB of Python/numpy allocations) of fn()."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        result = fn()
+        return result, time.perf_counter() - t0, tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def compare(img, label, key, target, procs):
+    """Key, crop and resize `img` whole and tiled; check both give the same sprite."""
+    def whole():
+        keyed, removed = remove_background(img, **key)
+        return resize_to_height(crop_to_content(keyed), target), removed, keyed
+
+    def tiled():
+        master = TiledImage(img)
+        removed, _ = master.key(procs=procs, **key)
+        return master, master.resize_to_height(target), removed
+
+    (ref, ref_removed, ref_keyed), t_whole, m_whole = measure(whole)
+    (master, out, removed), t_tiled, m_tiled = measure(tiled)
+    with master:
+        same_keyed = with_shared(lambda arr: np.array_equal(arr, np.asarray(ref_keyed)),
+                                 [master.handle])
+        rounds = master.rounds
+    same = same_keyed and removed == ref_removed and ref.tobytes() == out.tobytes()
+    flood = f", {rounds} flood rounds" if key.get("mode") == "flood" else ""
+    print(f"  {label}: {img.size[0]}x{img.size[1]} -> {out.size[0]}x{out.size[1]}")
+    print(f"    whole  {t_whole * 1000:8.1f} ms  peak {m_whole:7.1f} MB")
+    print(f"    tiled  {t_tiled * 1000:8.1f} ms  peak {m_tiled:7.1f} MB in this process"
+          f" (+{img.size[0] * img.size[1] * 4 / 2**20:.0f} MB shared{flood})  "
+          f"{'MATCH' if same else 'MISMATCH'}")
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tiled and whole-image keying.")
+    parser.add_argument("paths", nargs="*", help="raw PNGs (default: a synthetic 4096px raw)")
+    parser.add_argument("--scale", type=int, default=1, help="upscale raws (NEAREST) into masters")
+    parser.add_argument("--mode", choices=KEY_MODES, default="global")
+    parser.add_argument("--auto", action="store_true", help="tolerance=\"auto\"")
+    parser.add_argument("--target", type=int, default=600, help="target height")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                        help="worker processes for the tiles (1: this process, 0: every core)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("TILED KEY - whole image vs tiles")
+    print("=" * 60)
+
+    key = {"mode": args.mode}
+    if args.auto:
+        key["tolerance"] = AUTO
+    procs = None
+    if args.jobs != 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        procs = ProcessPoolExecutor(max_workers=args.jobs or os.cpu_count())
+    ok = True
+    try:
+        sources = [(p, Image.open(p)) for p in args.paths] or [
+            ("synthetic magenta", synthetic_raw(4096, (255, 0, 255)))]
+        for label, img in sources:
+            if args.scale > 1:
+                img = img.resize((img.size[0] * args.scale, img.size[1] * args.scale), Image.NEAREST)
+            ok &= compare(img, label, key, args.target, procs)
+    finally:
+        if procs:
+            procs.shutdown()
+
+    if not ok:
+        print("\n  ERROR: tiled output differs from whole-image keying")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
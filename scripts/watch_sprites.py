@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Tangled Tower - Watch raws and sprite specs, reprocessing what changed
+
+A long-running companion to regenerate_sprites.py for tuning tolerances,
+fades and target heights. It polls:
+- each sprite's raw: assets/sprites/{name}_raw.png if there is one (hand
+  edits, or exported with regenerate_sprites.py --raw-png), otherwise the
+  raw in .raw_archive/ that the build manifest says the sprite was built
+  from. Saving a raw, or a regenerate_sprites.py run that archives a new
+  one, re-keys, crops and resizes that sprite
+- scripts/regenerate_sprites.py: the module is reloaded and HERO_SPRITES /
+  OTHER_SPRITES compared with the previous version; sprites whose keying
+  options or target height changed are reprocessed. Prompt changes need new
+  raws from Imagen, so those are only reported
+
+Changes are debounced: rebuilds start once nothing has changed for
+--debounce seconds, so saving a burst of edits rebuilds once. Raws and the
+latest hero frames stay in memory (archived raws as views of the archive's
+memory map, never decoded), so a rebuild only loads what changed, and any
+changed hero frame re-runs the hero canvas pass. Each rebuild ends by
+refreshing the asset manifest, hitboxes.json and the atlas, which is what
+the game loads.
+
+No network calls are made. Every sprite the watcher writes has its build
+manifest entry invalidated (only its raw is kept), so the next
+regenerate_sprites.py run rebuilds it from the cache as the specs then
+say, rather than shipping a tuning experiment.
+
+Usage:
+    python scripts/watch_sprites.py
+    python scripts/watch_sprites.py --auto-key --pixel-grid snap --debounce 0.5
+"""
+
+import argparse
+import importlib
+import time
+import traceback
+from pathlib import Path
+
+from PIL import Image
+
+import regenerate_sprites
+from build_manifest import BuildManifest
+from imagen_backend import create_backend
+from instrument import recorder
+
+POLL_INTERVAL = 0.1   # seconds between scans
+DEBOUNCE = 0.3        # quiet time after the last change before rebuilding
+# Job fields that only need a reprocess, and ones that need a new raw
+REPROCESS_FIELDS = ("key", "target")
+REGENERATE_FIELDS = ("prompt", "chroma", "candidates")
+
+
+class SpriteWatcher:
+    """Holds the warm state: current jobs, decoded raws and processed hero frames."""
+
+    def __init__(self, auto_key=False, grid=None, backend=None):
+        self.auto_key = auto_key
+        self.grid = grid
+        self.backend = backend
+        self.module = regenerate_sprites
+        regenerate_sprites.open_stores()
+        self.manifest = regenerate_sprites.manifest
+        self.manifest_stamp = self._stamp(self.manifest.path)
+        self.spec_stamp = None
+        self.jobs = {}
+        self.raw_stamps = {}
+        self.raws = {}
+        self.heroes = {}
+
+    # --- Polling ---
+
+    def _stamp(self, path):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load_jobs(self):
+        """(Re)load the sprite specs. Returns the names whose output must be rebuilt."""
+        module = self.module
+        self.spec_stamp = self._stamp(Path(module.__file__))
+        if self.jobs:
+            module = importlib.reload(module)
+            module.open_stores()
+            self.module = module
+        module.backend = self.backend
+        module.grid_mode = self.grid
+        jobs = {job["name"]: job for job in module.build_jobs(auto_key=self.auto_key)}
+
+        changed = set()
+        for name, job in jobs.items():
+            old = self.jobs.get(name)
+            if old is None:
+                continue
+            if any(job[f] != old[f] for f in REGENERATE_FIELDS):
+                print(f"  {name}: Imagen request changed; run regenerate_sprites.py for a new raw")
+            if any(job[f] != old[f] for f in REPROCESS_FIELDS):
+                changed.add(name)
+        self.jobs = jobs
+        return changed
+
+    def poll(self):
+        """Names whose raw or spec changed since the last poll."""
+        changed = set()
+        if self._stamp(Path(self.module.__file__)) != self.spec_stamp:
+            try:
+                changed |= self.load_jobs()
+            except Exception:
+                # Mid-edit syntax errors and the like: keep the old specs, retry on next save
+                print("  Could not reload sprite specs:")
+                traceback.print_exc(limit=1)
+        self.module.raw_store.refresh()
+        stamp = self._stamp(self.manifest.path)
+        if stamp != self.manifest_stamp:
+            self.manifest = BuildManifest(self.manifest.path)
+            self.manifest_stamp = stamp
+        for name in self.jobs:
+            stamp = self.raw_stamp(name)
+            if stamp != self.raw_stamps.get(name):
+                if name in self.raw_stamps:
+                    changed.add(name)
+                self.raw_stamps[name] = stamp
+        return changed
+
+    # --- Rebuilding ---
+
+    def raw_path(self, name):
+        return self.module.output_dir / f"{name}_raw.png"
+
+    def archived(self, name):
+        """Archive entry of the raw `name` was last built from (else its newest), or None."""
+        recorded = self.manifest.entries.get(name, {}).get("raw")
+        return self.module.raw_store.current(name, recorded)
+
+    def raw_stamp(self, name):
+        """Changes whenever `name`'s raw does; None if it has no raw."""
+        stamp = self._stamp(self.raw_path(name))
+        if stamp is None:
+            entry = self.archived(name)
+            stamp = entry and entry["sha256"]
+        return stamp
+
+    def raw(self, name):
+        """Raw image for `name`, loading it again only if it changed."""
+        stamp = self.raw_stamp(name)
+        cached = self.raws.get(name)
+        if cached is None or cached[0] != stamp:
+            if self.raw_path(name).exists():
+                img = Image.open(self.raw_path(name))
+                img.load()
+            else:
+                img = self.module.raw_store.image(self.archived(name))
+            self.raws[name] = cached = (stamp, img)
+        return cached[1]
+
+    def process(self, name):
+        job = self.jobs[name]
+        sprite, log = self.module.postprocess(self.raw(name), name, job["target"], job["key"],
+                                              self.grid, self.module.output_dir, save_raw=False)
+        print("\n".join(log))
+        if job["hero"]:
+            self.heroes[name] = sprite
+
+    def rebuild(self, names):
+        """Reprocess `names` (skipping sprites without a raw) and re-canvas the heroes if needed."""
+        t0 = time.perf_counter()
+        names = sorted(n for n in names if n in self.jobs and self.raw_stamp(n))
+        print(f"\n  Rebuilding {', '.join(names)}")
+        written = set()
+        for name in names:
+            try:
+                self.process(name)
+                written.add(name)
+            except Exception as e:
+                print(f"  ERROR processing {name}: {e}")
+
+        hero_names = [n for n, job in self.jobs.items() if job["hero"]]
+        if any(n in names for n in hero_names):
+            # The canvas depends on every frame; process any not yet in memory
+            for name in hero_names:
+                if name not in self.heroes and self.raw_stamp(name):
+                    self.process(name)
+            self.module.place_heroes({n: self.heroes[n] for n in hero_names if n in self.heroes})
+            written.update(n for n in hero_names if n in self.heroes)
+        # Refresh the aliases, the combined hitboxes.json and the atlas the game loads
+        self.module.alias_outputs()
+        self.module.repack_atlas()
+        # Re-read the manifest first, so entries a concurrent build recorded survive
+        self.manifest = BuildManifest(self.manifest.path)
+        self.manifest.invalidate(written)
+        self.manifest_stamp = self._stamp(self.manifest.path)
+        print(f"  Done in {time.perf_counter() - t0:.2f}s")
+        # Stage spans are only reported by regenerate_sprites.py; don't let them pile up here
+        recorder.clear()
+
+    def run(self, interval=POLL_INTERVAL, debounce=DEBOUNCE):
+        self.load_jobs()
+        self.poll()
+        print(f"  Watching {len(self.jobs)} sprites in {self.module.output_dir}, "
+              f"{self.module.raw_store.root} and {self.module.__file__} (Ctrl+C to stop)")
+        pending = set()
+        last_change = 0.0
+        while True:
+            changed = self.poll()
+            now = time.monotonic()
+            if changed:
+                pending |= changed
+                last_change = now
+            elif pending and now - last_change >= debounce:
+                self.rebuild(pending)
+                pending = set()
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocess sprites as raws or specs change.")
+    parser.add_argument("--auto-key", action="store_true",
+                        help="per-image keying for sprites that don't pin a tolerance")
+    parser.add_argument("--pixel-grid", choices=["snap", "true"], default=None,
+                        help="resample onto the detected art grid (see regenerate_sprites.py)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="poll interval (s)")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE,
+                        help="quiet time before a rebuild (s)")
+    parser.add_argument("--backend", default=None,
+                        help="backend whose cache keys the specs use (no calls are made)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("TANGLED TOWER - Watching sprites")
+    print("=" * 60)
+
+    watcher = SpriteWatcher(args.auto_key, args.pixel_grid, create_backend(args.backend))
+    try:
+        watcher.run(args.interval, args.debounce)
+    except KeyboardInterrupt:
+        print("\n  Stopped.")
+
+
+if __name__ == "__main__":
+    main()